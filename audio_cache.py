@@ -0,0 +1,341 @@
+"""Кэш предобработанного аудио: 16 кГц моно PCM, подготовленный один раз.
+
+ffmpeg декодирует и пересэмплирует контейнер (mp4, mkv, ...) один раз, результат
+хранится как сырой float32 (little-endian) рядом с описанием в JSON. Повторные
+запуски - другой моделью, с другими настройками - читают его через
+numpy.memmap без копирования и без ffmpeg. Без предобработки кэш заполняется
+по ходу первой транскрибации (CachingAudioStream), и декодер не ждет
+конца декодирования файла. При подготовке можно выровнять
+громкость речи (normalize) и вырезать длинные паузы (trim_silence); для
+обрезанного аудио хранится карта участков, по которой метки времени
+переводятся обратно на шкалу исходного файла. При превышении лимита
+размера удаляются записи, к которым дольше всего не обращались.
+"""
+import bisect
+import json
+import os
+import threading
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+from audio_stream import FfmpegAudioStream
+from batched_decoding import BLOCK_SAMPLES, detect_speech_regions
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/whisper-transcriber/audio")
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024 * 1024
+DATA_SUFFIX = ".f32"
+META_SUFFIX = ".json"
+# Версия формата: смена алгоритма подготовки не должна отдавать старые файлы
+FORMAT_VERSION = 1
+
+# Громкость речи после нормализации (RMS речевых участков) и ограничения усиления
+TARGET_SPEECH_DB = -20.0
+MAX_GAIN_DB = 30.0
+MAX_PEAK = 0.98
+# Вырезаются только паузы длиннее TRIM_MIN_SILENCE_SECONDS; вокруг речи остается запас
+TRIM_MIN_SILENCE_SECONDS = 2.0
+TRIM_PAD_SECONDS = 0.3
+
+
+class PreprocessedAudio:
+    """Подготовленное аудио: samples - np.memmap файла кэша, duration - длительность исходника.
+
+    pieces - участки обрезанного аудио (начало в samples, начало в исходнике,
+    длина) в отсчетах; None - аудио не обрезалось и шкала времени совпадает.
+    """
+
+    def __init__(self, samples, duration, gain_db=0.0, pieces=None, path=None):
+        self.samples = samples
+        self.duration = duration
+        self.gain_db = gain_db
+        self.pieces = pieces
+        self.path = path
+        self._offsets = [piece[0] for piece in pieces] if pieces else []
+
+    @property
+    def trimmed(self):
+        return self.pieces is not None
+
+    def to_source_time(self, seconds, is_end=False):
+        """Перевод времени обрезанного аудио во время исходного файла"""
+        if not self.pieces:
+            return seconds
+        sample = int(round(seconds * SAMPLE_RATE))
+        index = bisect.bisect_right(self._offsets, sample) - 1
+        # Конец ровно на стыке относится к предыдущему участку, а не к началу следующего
+        if is_end and index > 0 and sample == self._offsets[index]:
+            index -= 1
+        offset, start, size = self.pieces[max(index, 0)]
+        return (start + min(max(sample - offset, 0), size)) / SAMPLE_RATE
+
+    def remap_segment(self, segment):
+        """Метки сегмента и его слов на шкале исходного файла (на месте)"""
+        if not self.pieces:
+            return segment
+        segment["start"] = self.to_source_time(segment["start"])
+        segment["end"] = self.to_source_time(segment["end"], is_end=True)
+        for word in segment.get("words") or []:
+            word["start"] = self.to_source_time(word["start"])
+            word["end"] = self.to_source_time(word["end"], is_end=True)
+        return segment
+
+    def source_timeline(self):
+        """Аудио на шкале исходного файла: для выравнивания слов и спикеров по меткам результата"""
+        return TrimmedTimelineSource(self) if self.pieces else self.samples
+
+
+class TrimmedTimelineSource:
+    """Окна на шкале исходного файла поверх обрезанного аудио; вырезанные паузы - тишина"""
+
+    def __init__(self, audio):
+        self.audio = audio
+        self._starts = [start for _, start, _ in audio.pieces]
+        self.n_samples = int(round(audio.duration * SAMPLE_RATE))
+
+    def read_window(self, start_sample, n_samples):
+        end_sample = min(start_sample + n_samples, self.n_samples)
+        window = np.zeros(max(end_sample - start_sample, 0), dtype=np.float32)
+        index = max(bisect.bisect_right(self._starts, start_sample) - 1, 0)
+        for offset, start, size in self.audio.pieces[index:]:
+            if start >= end_sample:
+                break
+            lo, hi = max(start, start_sample), min(start + size, end_sample)
+            if lo < hi:
+                window[lo - start_sample:hi - start_sample] = \
+                    self.audio.samples[offset + lo - start:offset + hi - start]
+        return window
+
+    def close(self):
+        pass
+
+
+class AudioCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ffmpeg="ffmpeg"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ffmpeg = ffmpeg
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(audio_hash, normalize=False, trim_silence=False):
+        return f"{audio_hash}-v{FORMAT_VERSION}{'-norm' if normalize else ''}{'-trim' if trim_silence else ''}"
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def get(self, audio_hash, normalize=False, trim_silence=False):
+        key = self.key(audio_hash, normalize, trim_silence)
+        data_path = self._path(key, DATA_SUFFIX)
+        try:
+            with open(self._path(key, META_SUFFIX), encoding="utf-8") as f:
+                meta = json.load(f)
+            if os.path.getsize(data_path) != meta["samples"] * 4:
+                return None
+            # Копирование при записи: страницы общие с файлом, а torch.from_numpy не жалуется
+            # на массив только для чтения (декодеры его не меняют)
+            samples = (np.memmap(data_path, dtype="<f4", mode="c") if meta["samples"]
+                       else np.zeros(0, dtype=np.float32))
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            # Время изменения служит меткой последнего обращения для LRU
+            os.utime(data_path)
+        except OSError:
+            pass
+        return PreprocessedAudio(samples, meta["duration"], meta["gain_db"], meta["pieces"], path=data_path)
+
+    def prepare(self, path, audio_hash, normalize=False, trim_silence=False):
+        """Декодирует файл через ffmpeg в кэш (один проход) и возвращает PreprocessedAudio"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key = self.key(audio_hash, normalize, trim_silence)
+        data_path = self._path(key, DATA_SUFFIX)
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        pieces = []
+        written = 0
+        source_samples = 0
+        speech_energy = 0.0
+        speech_samples = 0
+        peak = 0.0
+        try:
+            with open(data_path + tmp_suffix, "wb") as out, FfmpegAudioStream(path, ffmpeg=self.ffmpeg) as stream:
+                while not stream.eof:
+                    block = stream.read(BLOCK_SAMPLES)
+                    if not len(block):
+                        continue
+                    if trim_silence:
+                        regions = detect_speech_regions(block, min_silence_seconds=TRIM_MIN_SILENCE_SECONDS,
+                                                        pad_seconds=TRIM_PAD_SECONDS)
+                    elif normalize:
+                        regions = detect_speech_regions(block)
+                    else:
+                        regions = [(0, len(block))]
+                    if normalize:
+                        for start, end in regions:
+                            speech_energy += float(np.dot(block[start:end], block[start:end]))
+                            speech_samples += end - start
+                    kept = regions if trim_silence else [(0, len(block))]
+                    for start, end in kept:
+                        source_start = source_samples + start
+                        if pieces and pieces[-1][1] + pieces[-1][2] == source_start:
+                            pieces[-1][2] += end - start
+                        else:
+                            pieces.append([written, source_start, end - start])
+                        chunk = block[start:end]
+                        if len(chunk):
+                            peak = max(peak, float(np.abs(chunk).max()))
+                        out.write(chunk.astype("<f4", copy=False).tobytes())
+                        written += end - start
+                    source_samples += len(block)
+
+            gain_db = 0.0
+            if normalize and speech_samples and speech_energy > 0:
+                speech_db = 10 * np.log10(speech_energy / speech_samples)
+                gain_db = min(TARGET_SPEECH_DB - speech_db, MAX_GAIN_DB)
+                if peak > 0:
+                    # Усиление не должно доводить пики до клиппинга
+                    gain_db = min(gain_db, 20 * np.log10(MAX_PEAK / peak))
+                gain_db = float(round(gain_db, 2))
+                if gain_db and written:
+                    apply_gain(data_path + tmp_suffix, written, 10 ** (gain_db / 20))
+
+            self._commit(key, tmp_suffix, written, source_samples, gain_db,
+                         pieces if trim_silence else None, normalize, trim_silence)
+        finally:
+            self._discard(key, tmp_suffix)
+        self.evict()
+        audio = self.get(audio_hash, normalize, trim_silence)
+        if audio is None:
+            raise OSError(f"Подготовленное аудио не найдено в кэше: {data_path}")
+        return audio
+
+    def open_stream(self, path, audio_hash):
+        """Поток ffmpeg для декодера, заполняющий кэш по мере чтения (без предобработки)"""
+        return CachingAudioStream(self, path, audio_hash)
+
+    def _commit(self, key, tmp_suffix, written, source_samples, gain_db=0.0, pieces=None,
+                normalize=False, trim_silence=False):
+        """Описание записи и переименование временных файлов в постоянные"""
+        data_path = self._path(key, DATA_SUFFIX)
+        meta = {"version": FORMAT_VERSION, "sample_rate": SAMPLE_RATE, "samples": written,
+                "duration": source_samples / SAMPLE_RATE, "gain_db": gain_db,
+                "pieces": pieces, "normalize": normalize, "trim_silence": trim_silence}
+        with open(self._path(key, META_SUFFIX) + tmp_suffix, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # Описание появляется последним: без него неполный файл данных не читается
+        os.replace(data_path + tmp_suffix, data_path)
+        os.replace(self._path(key, META_SUFFIX) + tmp_suffix, self._path(key, META_SUFFIX))
+
+    def _discard(self, key, tmp_suffix):
+        for suffix in (DATA_SUFFIX, META_SUFFIX):
+            try:
+                os.remove(self._path(key, suffix) + tmp_suffix)
+            except FileNotFoundError:
+                pass
+
+    def entries(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(DATA_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-len(DATA_SUFFIX)]))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Удаляет самые старые записи, пока кэш не уложится в max_bytes"""
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    # Сначала описание: запись перестает читаться до удаления данных.
+                    # В Windows открытый memmap не удаляется - запись останется до следующей очистки
+                    os.remove(self._path(key, META_SUFFIX))
+                    os.remove(self._path(key, DATA_SUFFIX))
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        for _, _, key in self.entries():
+            for suffix in (META_SUFFIX, DATA_SUFFIX):
+                try:
+                    os.remove(self._path(key, suffix))
+                except OSError:
+                    pass
+
+
+class CachingAudioStream:
+    """FfmpegAudioStream, который сохраняет прочитанные отсчеты в кэш.
+
+    Декодер получает блоки сразу, как при обычном потоковом чтении, а запись
+    кэша появляется, когда поток прочитан до конца. Закрытие раньше (отмена,
+    ошибка ffmpeg) удаляет неполный файл.
+    """
+
+    def __init__(self, cache, path, audio_hash):
+        self.cache = cache
+        self.key = cache.key(audio_hash)
+        self.tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        self.stream = FfmpegAudioStream(path, ffmpeg=cache.ffmpeg)
+        self.out = open(cache._path(self.key, DATA_SUFFIX) + self.tmp_suffix, "wb")
+        self.committed = False
+        self.closed = False
+
+    @property
+    def eof(self):
+        return self.stream.eof
+
+    @property
+    def samples_read(self):
+        return self.stream.samples_read
+
+    def read(self, n_samples):
+        block = self.stream.read(n_samples)
+        self.out.write(block.astype("<f4", copy=False).tobytes())
+        if self.stream.eof and not self.committed:
+            self.out.close()
+            self.cache._commit(self.key, self.tmp_suffix, self.stream.samples_read, self.stream.samples_read)
+            self.committed = True
+            self.cache.evict()
+        return block
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.stream.close()
+        self.out.close()
+        if not self.committed:
+            self.cache._discard(self.key, self.tmp_suffix)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def apply_gain(path, n_samples, gain, block_samples=BLOCK_SAMPLES):
+    """Умножает сохраненные отсчеты на gain на месте, блоками через memmap"""
+    samples = np.memmap(path, dtype="<f4", mode="r+", shape=(n_samples,))
+    for start in range(0, n_samples, block_samples):
+        block = samples[start:start + block_samples]
+        np.multiply(block, gain, out=block)
+        np.clip(block, -1.0, 1.0, out=block)
+    samples.flush()
+    del samples
@@ -0,0 +1,153 @@
+"""Потоковое чтение аудио через канал ffmpeg.
+
+Вместо whisper.load_audio, который декодирует весь файл в один массив float32,
+PCM читается из ffmpeg блоками, а в памяти держится только текущее окно
+декодера (скользящий буфер). Пиковое потребление памяти определяется длиной
+окна, а не длиной записи.
+"""
+import subprocess
+import tempfile
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+READ_CHUNK_SAMPLES = SAMPLE_RATE * 10
+
+
+class FfmpegAudioStream:
+    """16 кГц моно PCM из любого контейнера, который понимает ffmpeg"""
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE, ffmpeg="ffmpeg", start_sample=0):
+        self.path = path
+        cmd = [ffmpeg, "-nostdin", "-loglevel", "error", "-threads", "0"]
+        if start_sample:
+            # Быстрый переход к позиции при возобновлении, без декодирования начала файла
+            cmd += ["-ss", f"{start_sample / sample_rate:.6f}"]
+        cmd += [
+            "-i", path,
+            "-f", "s16le",
+            "-ac", "1",
+            "-acodec", "pcm_s16le",
+            "-ar", str(sample_rate),
+            "-",
+        ]
+        # stderr во временный файл: непрочитанный канал при обилии предупреждений остановил бы ffmpeg
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=self.stderr)
+        self.samples_read = 0
+        self.eof = False
+
+    def read(self, n_samples):
+        """До n_samples отсчетов float32; меньше - только в конце файла"""
+        if self.eof:
+            return np.zeros(0, dtype=np.float32)
+        data = self.process.stdout.read(n_samples * 2)
+        data = data[:len(data) - len(data) % 2]
+        self.samples_read += len(data) // 2
+        if len(data) < n_samples * 2:
+            self._finish()
+        return np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+
+    def _finish(self):
+        """Конец потока: ошибка ffmpeg и посреди файла не считается обычным концом записи"""
+        self.eof = True
+        self.process.wait()
+        if self.process.returncode != 0:
+            self.stderr.seek(0)
+            stderr = self.stderr.read().decode(errors="replace")
+            raise RuntimeError(f"Failed to load audio after {self.samples_read / SAMPLE_RATE:.1f} s: {stderr}")
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WindowedAudioSource:
+    """Скользящий буфер над потоком: окна запрашиваются только вперед по времени"""
+
+    def __init__(self, stream, read_chunk_samples=READ_CHUNK_SAMPLES, start_sample=0):
+        self.stream = stream
+        self.read_chunk_samples = read_chunk_samples
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_start = start_sample
+
+    def read_window(self, start_sample, n_samples):
+        """Отсчеты [start_sample, start_sample + n_samples); в конце файла окно короче"""
+        if start_sample < self.buffer_start:
+            raise ValueError("Окно раньше начала буфера: поток можно читать только вперед")
+
+        # Отбрасываем уже обработанную часть, чтобы буфер не рос с длиной записи
+        drop = min(start_sample - self.buffer_start, len(self.buffer))
+        if drop:
+            self.buffer = self.buffer[drop:]
+            self.buffer_start += drop
+
+        end_sample = start_sample + n_samples
+        pieces = [self.buffer]
+        available = self.buffer_start + len(self.buffer)
+        while available < end_sample and not self.stream.eof:
+            chunk = self.stream.read(max(self.read_chunk_samples, end_sample - available))
+            pieces.append(chunk)
+            available += len(chunk)
+        if len(pieces) > 1:
+            self.buffer = np.concatenate(pieces)
+
+        offset = start_sample - self.buffer_start
+        return self.buffer[offset:offset + n_samples]
+
+    def close(self):
+        self.stream.close()
+
+
+class ArrayAudioSource:
+    """Тот же интерфейс для аудио, уже загруженного в память"""
+
+    def __init__(self, audio):
+        self.audio = audio
+
+    def read_window(self, start_sample, n_samples):
+        return self.audio[start_sample:start_sample + n_samples]
+
+    def close(self):
+        pass
+
+
+def open_audio_source(audio, start_sample=0):
+    """Источник окон для пути к файлу (потоково через ffmpeg), открытого потока, массива отсчетов
+    или готового источника; открытый поток должен начинаться с start_sample"""
+    if isinstance(audio, str):
+        return WindowedAudioSource(FfmpegAudioStream(audio, start_sample=start_sample), start_sample=start_sample)
+    if hasattr(audio, "read"):
+        return WindowedAudioSource(audio, start_sample=start_sample)
+    if hasattr(audio, "read_window"):
+        return audio
+    return ArrayAudioSource(audio)
+
+
+def iter_audio_blocks(audio, block_samples, start_sample=0):
+    """Последовательные блоки аудио длиной block_samples: (смещение в отсчетах, массив).
+
+    audio - путь к файлу, открытый поток (начинается с start_sample) или массив отсчетов.
+    """
+    if isinstance(audio, str):
+        audio = FfmpegAudioStream(audio, start_sample=start_sample)
+    elif not hasattr(audio, "read"):
+        for offset in range(start_sample, len(audio), block_samples):
+            yield offset, audio[offset:offset + block_samples]
+        return
+    with audio as stream:
+        offset = start_sample
+        while not stream.eof:
+            block = stream.read(block_samples)
+            if len(block):
+                yield offset, block
+            offset += len(block)
@@ -0,0 +1,93 @@
+"""Подбор размера батча и ширины луча по свободной памяти устройства.
+
+BatchSizer оценивает пик памяти каждого батча и, если удвоенный батч
+помещается в запас памяти GPU, увеличивает его. При нехватке памяти (OOM)
+батч уменьшается вдвое, а на батче из одного окна - ширина луча, и батч
+повторяется: задание не падает, пока есть что уменьшать. Размер, на
+котором случилась нехватка, больше не пробуется.
+"""
+from contextlib import contextmanager, nullcontext
+
+import torch
+
+from memory_profiler import memory_headroom
+
+# Доля запаса памяти, которую может занять рост батча: остальное - на фрагментацию и пики декодера
+HEADROOM_FRACTION = 0.8
+MAX_GROWTH = 4
+
+
+def is_out_of_memory(error):
+    if isinstance(error, (torch.OutOfMemoryError, MemoryError)):
+        return True
+    # Аллокатор CPU сообщает о нехватке обычным RuntimeError
+    message = str(error).lower()
+    return isinstance(error, RuntimeError) and ("out of memory" in message or "can't allocate memory" in message)
+
+
+class BatchSizer:
+    """Текущие batch_size и beam_size декодера; adaptive - расти по запасу памяти (только CUDA)"""
+
+    def __init__(self, device, batch_size=8, beam_size=None, max_batch_size=None, adaptive=True, log_callback=None):
+        self.device = torch.device(device)
+        self.initial = (batch_size, beam_size)
+        self.batch_size = max(1, batch_size)
+        self.beam_size = beam_size
+        self.adaptive = adaptive and self.device.type == "cuda"
+        self.max_batch_size = max_batch_size or (self.batch_size * MAX_GROWTH if self.adaptive else self.batch_size)
+        # Наименьший размер батча, на котором не хватило памяти
+        self.ceiling = None
+        self.log_callback = log_callback
+        self.changes = []
+
+    def log(self, text):
+        if self.log_callback:
+            self.log_callback(text)
+
+    def _record(self, reason):
+        self.changes.append({"batch_size": self.batch_size, "beam_size": self.beam_size, "reason": reason})
+
+    def measure(self, n_items):
+        """Контекст вокруг батча из n_items окон: по его пику памяти решается, можно ли расти"""
+        if not self.adaptive:
+            return nullcontext()
+        return self._measure(n_items)
+
+    @contextmanager
+    def _measure(self, n_items):
+        # Пик не сбрасывается: его же читают MemoryProfiler и бенчмарк. Пик после батча минус занятое
+        # до него - память батча, если батч поднял пик, и оценка сверху, если пик был раньше
+        baseline = torch.cuda.memory_allocated(self.device)
+        yield
+        # Рост оценивается только по полному батчу: по неполному нельзя судить о памяти на окно
+        if n_items < self.batch_size:
+            return
+        per_item = (torch.cuda.max_memory_allocated(self.device) - baseline) / n_items
+        limit = self.max_batch_size if self.ceiling is None else min(self.max_batch_size, self.ceiling - 1)
+        next_size = min(self.batch_size * 2, limit)
+        if next_size <= self.batch_size:
+            return
+        headroom = memory_headroom(self.device)
+        if headroom is not None and per_item * (next_size - self.batch_size) < HEADROOM_FRACTION * headroom:
+            self.batch_size = next_size
+            self._record("headroom")
+            self.log(f"📈 Размер батча увеличен до {self.batch_size} (запас памяти {headroom / 1024**3:.1f} GB)\n")
+
+    def can_step_down(self):
+        return self.batch_size > 1 or (self.beam_size or 1) > 1
+
+    def step_down(self):
+        """После нехватки памяти: батч вдвое, затем луч вдвое; вызывать вне блока except,
+        чтобы трассировка исключения уже не держала тензоры"""
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
+        if self.batch_size > 1:
+            self.ceiling = self.batch_size
+            self.batch_size //= 2
+        elif (self.beam_size or 1) > 1:
+            self.beam_size = self.beam_size // 2 if self.beam_size > 2 else None
+        else:
+            raise ValueError("Уменьшать батч и луч некуда")
+        self._record("out_of_memory")
+        self.log(f"⚠️ Не хватило памяти: повторяю с batch_size={self.batch_size}, "
+                 f"beam_size={self.beam_size or 1}\n")
@@ -0,0 +1,245 @@
+"""Пакетное декодирование длинных записей.
+
+Аудио делится на речевые участки простым энергетическим детектором (VAD),
+участки упаковываются в 30-секундные окна без тишины, а окна декодируются
+батчами за один проход модели. Временные метки сегментов переносятся
+обратно на исходную шкалу времени файла.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import SAMPLE_RATE, N_SAMPLES, HOP_LENGTH, log_mel_spectrogram, pad_or_trim
+from whisper.tokenizer import get_tokenizer
+
+from audio_stream import iter_audio_blocks
+from batch_sizing import BatchSizer, is_out_of_memory
+from precision import model_autocast
+from stage_timer import NULL_TIMER
+
+# Точность временных меток Whisper: один токен = 2 кадра мел-спектрограммы (20 мс)
+TIME_PRECISION = 2 * HOP_LENGTH / SAMPLE_RATE
+# Файл читается из ffmpeg блоками по 10 минут: VAD и упаковка работают внутри блока
+BLOCK_SAMPLES = 20 * N_SAMPLES
+
+
+@dataclass
+class PackedChunk:
+    """Окно до 30 секунд, склеенное из нескольких речевых участков"""
+    pieces: list = field(default_factory=list)  # (начало в окне, начало в файле, длина) в сэмплах
+    length: int = 0
+
+    def add(self, start, end):
+        self.pieces.append((self.length, start, end - start))
+        self.length += end - start
+
+    def audio(self, source):
+        return np.concatenate([source[start:start + size] for _, start, size in self.pieces])
+
+    def to_source_time(self, seconds, is_end=False):
+        """Перевод времени внутри окна во время исходного файла"""
+        sample = int(round(seconds * SAMPLE_RATE))
+        for offset, start, size in self.pieces:
+            if sample < offset + size or (is_end and sample == offset + size):
+                return (start + max(sample - offset, 0)) / SAMPLE_RATE
+        offset, start, size = self.pieces[-1]
+        return (start + size) / SAMPLE_RATE
+
+
+def detect_speech_regions(audio, frame_seconds=0.03, energy_margin_db=10.0, min_speech_seconds=0.25,
+                          min_silence_seconds=0.5, pad_seconds=0.2):
+    """Речевые участки по энергии кадров: список (начало, конец) в сэмплах"""
+    frame_size = int(frame_seconds * SAMPLE_RATE)
+    n_frames = len(audio) // frame_size
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame_size].reshape(n_frames, frame_size)
+    energy_db = 10 * np.log10(np.mean(frames.astype(np.float32) ** 2, axis=1) + 1e-10)
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + energy_margin_db, energy_db.max() - 50.0)
+    voiced = energy_db > threshold
+
+    regions = []
+    start = None
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced and start is None:
+            start = i
+        elif not is_voiced and start is not None:
+            regions.append([start, i])
+            start = None
+    if start is not None:
+        regions.append([start, n_frames])
+
+    min_silence = int(min_silence_seconds / frame_seconds)
+    merged = []
+    for region in regions:
+        if merged and region[0] - merged[-1][1] < min_silence:
+            merged[-1][1] = region[1]
+        else:
+            merged.append(region)
+
+    min_speech = int(min_speech_seconds / frame_seconds)
+    pad = int(pad_seconds * SAMPLE_RATE)
+    result = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start_sample = max(start * frame_size - pad, 0)
+        end_sample = min(end * frame_size + pad, len(audio))
+        if result and start_sample <= result[-1][1]:
+            result[-1] = (result[-1][0], end_sample)
+        else:
+            result.append((start_sample, end_sample))
+    return result
+
+
+def pack_regions(regions, max_samples=N_SAMPLES):
+    """Жадная упаковка участков в окна не длиннее max_samples"""
+    chunks = []
+    current = PackedChunk()
+    for start, end in regions:
+        while end - start > 0:
+            if current.length >= max_samples:
+                chunks.append(current)
+                current = PackedChunk()
+            size = min(end - start, max_samples - current.length)
+            # Длинный участок не дробим, если он целиком помещается в новое окно
+            if size < end - start and current.length > 0 and end - start <= max_samples:
+                chunks.append(current)
+                current = PackedChunk()
+                continue
+            current.add(start, start + size)
+            start += size
+    if current.length:
+        chunks.append(current)
+    return chunks
+
+
+def split_timestamped_tokens(tokens, tokenizer, chunk_seconds):
+    """Разбивает токены окна на (начало, конец, текстовые токены) по парам меток времени"""
+    timestamp_begin = tokenizer.timestamp_begin
+    spans = []
+    start_time = 0.0
+    text_tokens = []
+    for token in tokens:
+        if token >= timestamp_begin:
+            position = (token - timestamp_begin) * TIME_PRECISION
+            if text_tokens:
+                spans.append((start_time, position, text_tokens))
+                text_tokens = []
+            start_time = position
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        spans.append((start_time, chunk_seconds, text_tokens))
+    return spans
+
+
+def decode_chunks(model, chunks, block, options, dtype, timer):
+    with timer.stage("mel"):
+        mel = torch.stack([
+            log_mel_spectrogram(pad_or_trim(chunk.audio(block)), model.dims.n_mels)
+            for chunk in chunks
+        ]).to(model.device).to(dtype)
+    with torch.no_grad(), timer.stage("encoder"), model_autocast(model):
+        audio_features = model.embed_audio(mel).to(dtype)
+    with timer.stage("decoder"), model_autocast(model):
+        return whisper.decode(model, audio_features, options)
+
+
+def transcribe_batched(model, audio, language=None, task="transcribe", batch_size=8, fp16=False,
+                       beam_size=None, no_speech_threshold=0.6, logprob_threshold=-1.0, on_segment=None,
+                       block_samples=BLOCK_SAMPLES, timer=None, resume_state=None, on_checkpoint=None,
+                       batch_sizer=None, control=None):
+    """Транскрибация с VAD и батчевым декодированием; формат результата как у model.transcribe.
+
+    Файл читается из ffmpeg блоками по block_samples отсчетов, VAD и упаковка
+    выполняются внутри блока. on_segment вызывается для каждого сегмента сразу
+    после декодирования его батча, on_checkpoint(segments, state) - после каждого
+    блока; resume_state продолжает работу с начала следующего блока.
+    batch_sizer (BatchSizer) подбирает батч и луч по памяти вместо batch_size и beam_size;
+    control (JobControl) проверяется перед каждым батчем: пауза и отмена между батчами.
+    """
+    timer = timer or NULL_TIMER
+    dtype = torch.float16 if fp16 else torch.float32
+    if batch_sizer is None:
+        batch_sizer = BatchSizer(model.device, batch_size, beam_size, adaptive=False)
+
+    segments = []
+    languages = list(resume_state["languages"]) if resume_state else []
+    segment_id = resume_state["next_segment_id"] if resume_state else 0
+    start_sample = resume_state["block_offset"] if resume_state else 0
+    duration = start_sample / SAMPLE_RATE
+    blocks = iter_audio_blocks(audio, block_samples, start_sample=start_sample)
+    for block_offset, block in timer.timed_iter(blocks, "audio_decode"):
+        block_segments = []
+        block_start = block_offset / SAMPLE_RATE
+        duration = (block_offset + len(block)) / SAMPLE_RATE
+        with timer.stage("vad"):
+            chunks = pack_regions(detect_speech_regions(block))
+        position = 0
+        while position < len(chunks):
+            if control is not None:
+                control.check()
+            batch = chunks[position:position + batch_sizer.batch_size]
+            options = whisper.DecodingOptions(language=language, task=task, fp16=fp16,
+                                              beam_size=batch_sizer.beam_size)
+            out_of_memory = False
+            try:
+                with batch_sizer.measure(len(batch)):
+                    results = decode_chunks(model, batch, block, options, dtype, timer)
+            except Exception as e:
+                if not is_out_of_memory(e) or not batch_sizer.can_step_down():
+                    raise
+                out_of_memory = True
+            if out_of_memory:
+                # Тот же батч повторяется меньшим размером или лучом
+                batch_sizer.step_down()
+                continue
+            position += len(batch)
+
+            for chunk, result in zip(batch, results):
+                # Как в whisper: без порога logprob тишина определяется только по no_speech_prob
+                if (no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold
+                        and (logprob_threshold is None or result.avg_logprob < logprob_threshold)):
+                    continue
+                languages.append(result.language)
+                tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                          language=result.language, task=task)
+                chunk_seconds = chunk.length / SAMPLE_RATE
+                for start, end, text_tokens in split_timestamped_tokens(result.tokens, tokenizer, chunk_seconds):
+                    text = tokenizer.decode(text_tokens)
+                    if not text.strip():
+                        continue
+                    segment = {
+                        "id": segment_id,
+                        "seek": 0,
+                        "start": block_start + chunk.to_source_time(start),
+                        "end": block_start + chunk.to_source_time(min(end, chunk_seconds), is_end=True),
+                        "text": text,
+                        "tokens": text_tokens,
+                        "temperature": result.temperature,
+                        "avg_logprob": result.avg_logprob,
+                        "compression_ratio": result.compression_ratio,
+                        "no_speech_prob": result.no_speech_prob,
+                        "language": result.language,
+                    }
+                    segment_id += 1
+                    block_segments.append(segment)
+                    if on_segment is not None:
+                        on_segment(segment)
+
+        segments.extend(block_segments)
+        if on_checkpoint is not None:
+            on_checkpoint(block_segments, {"block_offset": block_offset + len(block),
+                                           "next_segment_id": segment_id, "languages": languages})
+
+    detected_language = language or (max(set(languages), key=languages.count) if languages else "en")
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": detected_language,
+        "duration": duration,
+    }
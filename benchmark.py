@@ -0,0 +1,374 @@
+"""Бенчмарк транскрибации: фактор реального времени (RTF) и время по этапам.
+
+Корпус генерируется синтетически (псевдоречь с паузами), поэтому бенчмарк
+работает без сети и дает одинаковый вход на любой машине. Результаты
+сохраняются в JSON для сравнения между версиями и подбора оборудования.
+"""
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import SAMPLE_RATE
+
+import transcriber_core
+from model_pool import ModelPool
+from precision import available_precisions, default_precision
+from stage_timer import StageTimer
+
+DEFAULT_DURATIONS = (30, 120, 600)
+DEFAULT_CORPUS_DIR = os.path.expanduser("~/.cache/whisper-transcriber/bench-corpus")
+CORPUS_SEED = 1234
+WARMUP_SECONDS = 10
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Точки входа, которые должны импортироваться без torch и whisper
+LIGHT_MODULES = ("transcriber_cli", "transcriber_app")
+STARTUP_MODULES = LIGHT_MODULES + ("transcriber_core",)
+
+
+def synthesize_speech_like(duration, seed):
+    """Псевдоречь: гармонический сигнал с плавающим тоном, слоговой модуляцией и паузами"""
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * SAMPLE_RATE)
+    audio = np.zeros(n_samples, dtype=np.float64)
+    position = 0
+    while position < n_samples:
+        end = min(position + int(rng.uniform(1.5, 6.0) * SAMPLE_RATE), n_samples)
+        t = np.arange(end - position) / SAMPLE_RATE
+        f0 = rng.uniform(100, 220) * (1 + 0.15 * np.sin(2 * np.pi * rng.uniform(0.2, 0.8) * t))
+        phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+        syllables = 0.5 * (1 - np.cos(2 * np.pi * rng.uniform(3, 6) * t))
+        audio[position:end] = 0.2 * voice * syllables
+        position = end + int(rng.uniform(0.3, 1.2) * SAMPLE_RATE)
+    audio += rng.normal(0, 0.003, n_samples)
+    return np.clip(audio, -1.0, 1.0).astype(np.float32)
+
+
+def write_wav(path, audio):
+    tmp_path = path + ".tmp"
+    with wave.open(tmp_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((audio * 32767).astype("<i2").tobytes())
+    os.replace(tmp_path, path)
+
+
+def make_corpus(corpus_dir=DEFAULT_CORPUS_DIR, durations=DEFAULT_DURATIONS, seed=CORPUS_SEED):
+    """Детерминированный набор WAV-файлов; уже созданные файлы переиспользуются"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    paths = []
+    for index, duration in enumerate(durations):
+        path = os.path.join(corpus_dir, f"synthetic_{duration}s_seed{seed + index}.wav")
+        if not os.path.exists(path):
+            write_wav(path, synthesize_speech_like(duration, seed + index))
+        paths.append(path)
+    return paths
+
+
+def make_warmup_clip(corpus_dir=DEFAULT_CORPUS_DIR):
+    """Короткий файл для прогрева: первая транскрибация включает компиляцию ядер и аллокации"""
+    return make_corpus(corpus_dir, (WARMUP_SECONDS,), seed=CORPUS_SEED - 1)[0]
+
+
+def available_devices():
+    return ["cpu"] + [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+
+
+def environment_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cuda": torch.version.cuda,
+        "whisper": whisper.__version__,
+        "gpus": [torch.cuda.get_device_name(i) for i in range(torch.cuda.device_count())],
+    }
+
+
+def summarize(runs):
+    audio_seconds = sum(run["audio_seconds"] for run in runs)
+    wall_seconds = sum(run["wall_seconds"] for run in runs)
+    stages = {}
+    for run in runs:
+        for name, stage in run["stages"].items():
+            stages[name] = round(stages.get(name, 0.0) + stage["seconds"], 4)
+    summary = {
+        "audio_seconds": round(audio_seconds, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "rtf": round(wall_seconds / audio_seconds, 4) if audio_seconds else None,
+        "stages": stages,
+    }
+    # Скорость декодера в токенах/с и доля принятых токенов черновика (пакетный режим их не считает)
+    decoding = [run["decoding"] for run in runs if run.get("decoding")]
+    if decoding:
+        tokens = sum(stats["tokens"] for stats in decoding)
+        seconds = sum(stats["seconds"] for stats in decoding)
+        drafted = sum(stats["drafted"] for stats in decoding)
+        summary["decoding"] = {
+            "tokens": tokens,
+            "tokens_per_second": round(tokens / seconds, 2) if seconds else None,
+            "acceptance_rate": round(sum(stats["accepted"] for stats in decoding) / drafted, 4) if drafted else None,
+        }
+    return summary
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s]", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """WER по словам (расстояние Левенштейна / число слов эталона)"""
+    reference = normalize_words(reference)
+    hypothesis = normalize_words(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def benchmark_model(model_name, device, paths, language="ru", word_timestamps=False, batched=False,
+                    repeat=1, warmup_path=None, log_callback=None, precision=None, draft_model=None):
+    """Загружает модель на устройство и прогоняет корпус; время загрузки считается отдельно.
+
+    word_timestamps добавляет отложенное выравнивание слов после декодирования
+    (этап alignment), его время входит в общее время прогона. draft_model -
+    черновая модель спекулятивного декодирования, загружается вместе с основной.
+    """
+    engine = transcriber_core.TranscriptionEngine(
+        model_name=model_name, device=device, language=language, batched=batched, precision=precision, use_cache=False, use_journal=False,
+        model_pool=ModelPool(max_models=2 if draft_model else 1, log_callback=log_callback),
+        log_callback=log_callback, draft_model_name=draft_model)
+
+    start = time.perf_counter()
+    engine.load_model()
+    load_seconds = time.perf_counter() - start
+
+    if warmup_path:
+        engine.transcribe(warmup_path)
+
+    runs = []
+    texts = {}
+    for path in paths:
+        for run in range(repeat):
+            timer = StageTimer(device)
+            engine.stage_timer = timer
+            if engine.use_gpu:
+                torch.cuda.reset_peak_memory_stats(engine._device_index())
+            start = time.perf_counter()
+            result = engine.transcribe(path)
+            if word_timestamps:
+                engine.align_words(path, result)
+            wall_seconds = time.perf_counter() - start
+            texts[os.path.basename(path)] = result["text"]
+            audio_seconds = result.get("duration", 0.0)
+            stages = timer.as_dict()
+            runs.append({
+                "file": os.path.basename(path),
+                "run": run,
+                "audio_seconds": round(audio_seconds, 3),
+                "wall_seconds": round(wall_seconds, 4),
+                "rtf": round(wall_seconds / audio_seconds, 4) if audio_seconds else None,
+                "segments": len(result["segments"]),
+                "decoding": engine.last_decoding_stats,
+                "stages": stages,
+                "other_seconds": round(wall_seconds - sum(stage["seconds"] for stage in stages.values()), 4),
+                "peak_gpu_memory_gb": (round(torch.cuda.max_memory_allocated(engine._device_index()) / 1024**3, 3)
+                                       if engine.use_gpu else None),
+            })
+
+    report = {
+        "model": model_name,
+        "device": device,
+        "device_name": engine.device_name(),
+        "precision": engine.precision,
+        "batched": batched,
+        "draft_model": engine.draft_model_name if engine.draft_model is not None else None,
+        "word_timestamps": word_timestamps,
+        "load_seconds": round(load_seconds, 3),
+        "runs": runs,
+        "summary": summarize(runs),
+        "texts": texts,
+    }
+    engine.model = None
+    engine.model_pool.clear()
+    return report
+
+
+def compare_precisions(results):
+    """WER и ускорение каждой точности относительно fp32 той же модели на том же устройстве"""
+    references = {(result["model"], result["device"]): result for result in results
+                  if result.get("precision") == "fp32" and "error" not in result}
+    for result in results:
+        reference = references.get((result["model"], result["device"]))
+        if reference is None or reference is result or "error" in result:
+            continue
+        errors = [word_error_rate(reference["texts"][name], text) for name, text in result["texts"].items()
+                  if name in reference["texts"]]
+        result["vs_fp32"] = {
+            "wer": round(sum(errors) / len(errors), 4) if errors else None,
+            "speedup": round(reference["summary"]["wall_seconds"] / result["summary"]["wall_seconds"], 3)
+            if result["summary"]["wall_seconds"] else None,
+        }
+
+
+def run_benchmark(models, devices, paths, output_path=None, warmup_path=None, log_callback=None,
+                  precisions=None, keep_texts=False, **options):
+    """Все сочетания модель x устройство x точность; ошибка одной конфигурации не останавливает остальные.
+
+    Недоступные на устройстве точности (fp16 на CPU, int8 на GPU) пропускаются.
+    """
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "corpus": [{"file": os.path.basename(path), "bytes": os.path.getsize(path)} for path in paths],
+        "results": [],
+    }
+    for model_name in models:
+        for device in devices:
+            device_precisions = [precision for precision in precisions or [default_precision(device)]
+                                 if precision in available_precisions(device)]
+            for precision in device_precisions:
+                message = f"⏱️ Бенчмарк: {model_name} на {device} ({precision})\n"
+                if log_callback:
+                    log_callback(message)
+                else:
+                    print(message, end="", flush=True)
+                try:
+                    result = benchmark_model(model_name, device, paths, warmup_path=warmup_path,
+                                             log_callback=log_callback, precision=precision, **options)
+                except Exception as e:
+                    result = {"model": model_name, "device": device, "precision": precision, "error": str(e)}
+                report["results"].append(result)
+                compare_precisions(report["results"])
+                if output_path:
+                    # Промежуточное сохранение: длинный прогон не теряется при сбое
+                    save_report(report, output_path, keep_texts)
+    return report
+
+
+def save_report(report, output_path, keep_texts=False):
+    if not keep_texts:
+        report = dict(report, results=[{key: value for key, value in result.items() if key != "texts"}
+                                       for result in report["results"]])
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
+
+
+def _run_python(code, timeout):
+    completed = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True,
+                               timeout=timeout)
+    if completed.returncode != 0:
+        raise Exception(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                        f"код выхода {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure_import(module, repeat=3, timeout=300):
+    """Время импорта модуля в новом процессе (медиана) и загружает ли он torch"""
+    code = (f"import json, sys, time; start = time.perf_counter(); import {module}; "
+            f"print(json.dumps({{'seconds': time.perf_counter() - start, 'torch': 'torch' in sys.modules}}))")
+    runs = [_run_python(code, timeout) for _ in range(repeat)]
+    seconds = sorted(run["seconds"] for run in runs)[len(runs) // 2]
+    return {"seconds": round(seconds, 4), "loads_torch": runs[0]["torch"]}
+
+
+def measure_engine_startup(model_name, device="cpu", timeout=600):
+    """Без интерфейса: импорт ядра, создание движка и загрузка модели в новом процессе"""
+    code = (f"import json, time; start = time.perf_counter(); import transcriber_core; "
+            f"imported = time.perf_counter(); "
+            f"engine = transcriber_core.TranscriptionEngine(model_name={model_name!r}, device={device!r}, "
+            f"log_callback=lambda text: None); engine.load_model(); "
+            f"print(json.dumps({{'import_seconds': imported - start, "
+            f"'model_ready_seconds': time.perf_counter() - start}}))")
+    return {key: round(value, 3) for key, value in _run_python(code, timeout).items()}
+
+
+def measure_gui_startup(model_name, timeout=600):
+    """Запуск окна: время до первой отрисовки, до загрузки torch и до готовности модели.
+
+    Приложение запускается с --startup-report, записывает отметки времени
+    и закрывается само. Нужен дисплей.
+    """
+    fd, report_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        start = time.time()
+        completed = subprocess.run(
+            [sys.executable, os.path.join(APP_DIR, "transcriber_app.py"), "--model", model_name,
+             "--startup-report", report_path],
+            cwd=APP_DIR, capture_output=True, text=True, timeout=timeout)
+        with open(report_path, encoding="utf-8") as f:
+            content = f.read()
+        if not content:
+            stderr = completed.stderr.strip().splitlines()
+            raise Exception(stderr[-1] if stderr else f"код выхода {completed.returncode}")
+        marks = json.loads(content)
+    finally:
+        os.remove(report_path)
+    result = {f"{name}_seconds": round(value - start, 3) for name, value in marks.items() if name != "error"}
+    if "error" in marks:
+        result["error"] = marks["error"]
+    return result
+
+
+def run_startup_benchmark(model_name="base", device="cpu", repeat=3, gui=True, timeout=600, output_path=None):
+    """Время запуска: импорт точек входа, готовность модели без интерфейса и запуск окна"""
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "model": model_name,
+        "device": device,
+        "imports": {},
+    }
+    for module in STARTUP_MODULES:
+        try:
+            report["imports"][module] = measure_import(module, repeat, timeout)
+        except Exception as e:
+            report["imports"][module] = {"error": str(e)}
+    try:
+        report["engine"] = measure_engine_startup(model_name, device, timeout)
+    except Exception as e:
+        report["engine"] = {"error": str(e)}
+    if gui:
+        try:
+            report["gui"] = measure_gui_startup(model_name, timeout)
+        except Exception as e:
+            report["gui"] = {"error": str(e)}
+    if output_path:
+        save_report(report, output_path, keep_texts=True)
+    return report
+
+
+def check_startup_budget(report, max_import_seconds=None, max_first_paint_seconds=None):
+    """Нарушения бюджета запуска: тяжелые импорты в точках входа и превышение лимитов времени"""
+    problems = []
+    for module in LIGHT_MODULES:
+        measurement = report["imports"].get(module, {})
+        if measurement.get("loads_torch"):
+            problems.append(f"{module} импортирует torch при запуске")
+        if max_import_seconds is not None and measurement.get("seconds", 0) > max_import_seconds:
+            problems.append(f"импорт {module}: {measurement['seconds']:.2f} с > {max_import_seconds:.2f} с")
+    first_paint = report.get("gui", {}).get("first_paint_seconds")
+    if max_first_paint_seconds is not None and first_paint is not None and first_paint > max_first_paint_seconds:
+        problems.append(f"первая отрисовка окна: {first_paint:.2f} с > {max_first_paint_seconds:.2f} с")
+    return problems
@@ -0,0 +1,281 @@
+"""Разделение спикеров (диаризация) для готовых сегментов.
+
+Для каждого сегмента считается вектор голоса (эмбеддинг), сегменты
+кластеризуются, и номер кластера записывается в поле speaker. Аудио
+читается потоково по тем же 30-секундным окнам, что и у декодера.
+
+Эмбеддер подключаемый: любой объект с полями name, metric ("rms" или
+"cosine"), threshold (расстояние, дальше которого кластеры считаются разными
+спикерами) и методом embed(список массивов отсчетов 16 кГц) -> массив (n, d). По умолчанию
+используются статистики лог-мел спектра: они считаются на CPU пакетами за
+доли процента длительности записи и не требуют дополнительных моделей.
+Эмбеддинги сохраняются на диск по хэшу аудио, повторная диаризация того же
+файла (например, с другим числом спикеров) аудио не читает.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+from whisper.audio import SAMPLE_RATE, N_SAMPLES, N_FFT, HOP_LENGTH, FRAMES_PER_SECOND, mel_filters
+
+from audio_stream import open_audio_source
+from stage_timer import NULL_TIMER
+from word_alignment import group_windows
+
+DEFAULT_EMBEDDING_DIR = os.path.expanduser("~/.cache/whisper-transcriber/embeddings")
+EMBED_BATCH_SIZE = 64
+# Середина длинного сегмента: для голоса хватает нескольких секунд, а время ограничено
+MAX_EMBED_SECONDS = 4.0
+# Более короткие сегменты не участвуют в кластеризации и получают ближайшего спикера
+MIN_CLUSTER_SECONDS = 1.0
+# Кластеризация квадратична по числу сегментов: сверх лимита кластеризуется равномерная выборка
+MAX_CLUSTER_SEGMENTS = 1500
+MAX_SPEAKERS = 10
+# Кластер с меньшей долей речи - обычно часть голоса другого спикера (смех, шепот, шум)
+MIN_SPEAKER_SHARE = 0.05
+SPEAKER_LABEL = "Спикер {}"
+
+
+class DiarizationTimeout(Exception):
+    pass
+
+
+class MelStatsEmbedder:
+    """Форма спектра (средний лог-мел без общего уровня) и его разброс по громким кадрам сегмента.
+
+    Расстояние - среднеквадратичная разница в единицах log10 мощности:
+    0.1 соответствует 1 дБ на полосу, поэтому порог не зависит от записи.
+    """
+    name = "melstats-1"
+    metric = "rms"
+    threshold = 0.35
+
+    def __init__(self, n_mels=40, loud_fraction=0.7):
+        self.n_mels = n_mels
+        self.loud_fraction = loud_fraction
+        self._filters = mel_filters("cpu", 80)
+        # 80 полос whisper огрубляются до n_mels: тонкая структура спектра - это звуки речи, а не голос
+        self._pool = torch.nn.functional.interpolate(torch.eye(80)[None], size=n_mels, mode="area")[0].T
+
+    def embed(self, clips):
+        lengths = [max(1, len(clip) // HOP_LENGTH) for clip in clips]
+        batch = np.zeros((len(clips), max(len(clip) for clip in clips) + N_FFT), dtype=np.float32)
+        for row, clip in zip(batch, clips):
+            row[:len(clip)] = clip
+        audio = torch.from_numpy(batch)
+        stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=torch.hann_window(N_FFT), return_complex=True)
+        mel = self._filters @ stft[..., :-1].abs() ** 2
+        log_mel = (self._pool @ torch.clamp(mel, min=1e-10).log10()).numpy()
+
+        embeddings = np.zeros((len(clips), 2 * self.n_mels), dtype=np.float32)
+        for index, length in enumerate(lengths):
+            frames = log_mel[index, :, :length]
+            energy = frames.mean(axis=0)
+            keep = max(1, int(round(len(energy) * self.loud_fraction)))
+            frames = frames[:, np.argsort(energy)[-keep:]]
+            spectrum = frames.mean(axis=1)
+            # Общий уровень зависит от расстояния до микрофона, а не от голоса
+            embeddings[index] = np.concatenate([spectrum - spectrum.mean(), frames.std(axis=1)])
+        return embeddings
+
+
+EMBEDDERS = {"melstats": MelStatsEmbedder}
+
+
+class EmbeddingCache:
+    """Эмбеддинги сегментов на диске (.npy); ключ - хэш аудио, эмбеддер и границы сегментов"""
+
+    def __init__(self, cache_dir=DEFAULT_EMBEDDING_DIR):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def make_key(audio_hash, embedder_name, segments):
+        spans = [(round(segment["start"], 3), round(segment["end"], 3)) for segment in segments]
+        payload = json.dumps({"audio": audio_hash, "embedder": embedder_name, "spans": spans})
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def get(self, key):
+        try:
+            return np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, embeddings):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, embeddings)
+        os.replace(tmp_path, self._path(key))
+
+
+def segment_clip(window, window_start, segment):
+    """Отсчеты сегмента из окна; у длинных сегментов - середина длиной MAX_EMBED_SECONDS"""
+    start, end = segment["start"], segment["end"]
+    if end - start > MAX_EMBED_SECONDS:
+        middle = (start + end) / 2
+        start, end = middle - MAX_EMBED_SECONDS / 2, middle + MAX_EMBED_SECONDS / 2
+    first = max(0, int((start - window_start) * SAMPLE_RATE))
+    last = max(first + HOP_LENGTH, int((end - window_start) * SAMPLE_RATE))
+    return window[first:last]
+
+
+def extract_embeddings(audio, segments, embedder, batch_size=EMBED_BATCH_SIZE, timer=None, deadline=None):
+    """Эмбеддинги сегментов в исходном порядке; окна читаются потоково, эмбеддер вызывается пакетами"""
+    timer = timer or NULL_TIMER
+    order = {id(segment): index for index, segment in enumerate(segments)}
+    embeddings = [None] * len(segments)
+    pending = []
+
+    def flush():
+        vectors = embedder.embed([clip for _, clip in pending])
+        for (index, _), vector in zip(pending, vectors):
+            embeddings[index] = vector
+        pending.clear()
+
+    windows = group_windows(segments)
+    source = open_audio_source(audio, start_sample=windows[0][0] * HOP_LENGTH)
+    try:
+        for seek, window_segments in windows:
+            if deadline is not None and time.perf_counter() > deadline:
+                raise DiarizationTimeout()
+            with timer.stage("diarization"):
+                window = source.read_window(seek * HOP_LENGTH, N_SAMPLES)
+                for segment in window_segments:
+                    pending.append((order[id(segment)], segment_clip(window, seek / FRAMES_PER_SECOND, segment)))
+                    if len(pending) >= batch_size:
+                        flush()
+        if pending:
+            with timer.stage("diarization"):
+                flush()
+    finally:
+        source.close()
+    return np.stack(embeddings)
+
+
+def pairwise_distances(a, b, metric="rms"):
+    if metric == "cosine":
+        a = a / (np.linalg.norm(a, axis=1, keepdims=True) + 1e-9)
+        b = b / (np.linalg.norm(b, axis=1, keepdims=True) + 1e-9)
+        return 1.0 - a @ b.T
+    squared = (a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - 2 * a @ b.T
+    return np.sqrt(np.maximum(squared, 0.0) / a.shape[1])
+
+
+def first_seen_order(labels):
+    """Перенумерация кластеров 0..k-1 по первому появлению"""
+    _, first_seen = np.unique(labels, return_index=True)
+    renumber = {labels[index]: number for number, index in enumerate(sorted(first_seen))}
+    return np.array([renumber[label] for label in labels], dtype=int)
+
+
+def agglomerative_clusters(distances, num_speakers=None, threshold=0.35, max_speakers=MAX_SPEAKERS, deadline=None):
+    """Иерархическая кластеризация со средней связью; без num_speakers - до порога расстояния.
+
+    Каждое слияние ищет минимум по матрице n x n, а слияний до n, поэтому
+    deadline (time.perf_counter) проверяется на каждом шаге.
+    """
+    count = len(distances)
+    if count == 0:
+        return np.zeros(0, dtype=int)
+    distances = np.array(distances, dtype=np.float64)
+    np.fill_diagonal(distances, np.inf)
+    sizes = np.ones(count)
+    labels = np.arange(count)
+    clusters = count
+    target = num_speakers or 1
+    while clusters > target:
+        if deadline is not None and time.perf_counter() > deadline:
+            raise DiarizationTimeout()
+        i, j = divmod(int(np.argmin(distances)), count)
+        if num_speakers is None and distances[i, j] > threshold and clusters <= max_speakers:
+            break
+        # Формула Ланса-Уильямса для средней связи
+        merged = (sizes[i] * distances[i] + sizes[j] * distances[j]) / (sizes[i] + sizes[j])
+        distances[i, :] = merged
+        distances[:, i] = merged
+        distances[i, i] = np.inf
+        distances[j, :] = np.inf
+        distances[:, j] = np.inf
+        sizes[i] += sizes[j]
+        labels[labels == j] = i
+        clusters -= 1
+    return first_seen_order(labels)
+
+
+def merge_minor_clusters(labels, embeddings, durations, metric="rms"):
+    """Присоединяет кластеры с долей речи меньше MIN_SPEAKER_SHARE к ближайшему кластеру"""
+    labels = labels.copy()
+    while len(np.unique(labels)) > 1:
+        present = np.unique(labels)
+        totals = np.array([durations[labels == label].sum() for label in present])
+        smallest = int(np.argmin(totals))
+        if totals[smallest] >= MIN_SPEAKER_SHARE * durations.sum():
+            break
+        centroids = np.stack([embeddings[labels == label].mean(axis=0) for label in present])
+        distances = pairwise_distances(centroids[smallest:smallest + 1], centroids, metric)[0]
+        distances[smallest] = np.inf
+        labels[labels == present[smallest]] = present[int(np.argmin(distances))]
+    return first_seen_order(labels)
+
+
+def cluster_segments(segments, embeddings, num_speakers=None, metric="rms", threshold=0.35, deadline=None):
+    """Номер спикера для каждого сегмента; короткие сегменты - по ближайшему центру кластера"""
+    durations = np.array([segment["end"] - segment["start"] for segment in segments])
+    reliable = np.flatnonzero(durations >= MIN_CLUSTER_SECONDS)
+    if len(reliable) < 2:
+        reliable = np.arange(len(segments))
+    if len(reliable) > MAX_CLUSTER_SEGMENTS:
+        reliable = reliable[np.linspace(0, len(reliable) - 1, MAX_CLUSTER_SEGMENTS).astype(int)]
+
+    reliable_embeddings = embeddings[reliable]
+    reliable_labels = agglomerative_clusters(pairwise_distances(reliable_embeddings, reliable_embeddings, metric),
+                                             num_speakers, threshold, deadline=deadline)
+    if num_speakers is None:
+        reliable_labels = merge_minor_clusters(reliable_labels, reliable_embeddings, durations[reliable], metric)
+    centroids = np.stack([reliable_embeddings[reliable_labels == label].mean(axis=0)
+                          for label in range(reliable_labels.max() + 1)])
+    labels = np.argmin(pairwise_distances(embeddings, centroids, metric), axis=1)
+    labels[reliable] = reliable_labels
+    return first_seen_order(labels)
+
+
+def diarize(audio, segments, num_speakers=None, embedder=None, cache=None, audio_hash=None,
+            time_budget=None, timer=None):
+    """Записывает поле speaker в сегменты (на месте) и возвращает список меток спикеров.
+
+    time_budget ограничивает в секундах всю стадию: чтение аудио, расчет
+    эмбеддингов и кластеризацию; при превышении бросается DiarizationTimeout,
+    сегменты не меняются.
+    """
+    if not segments:
+        return []
+    embedder = embedder or MelStatsEmbedder()
+    deadline = time.perf_counter() + time_budget if time_budget else None
+    key = None
+    embeddings = None
+    if cache is not None and audio_hash:
+        key = cache.make_key(audio_hash, embedder.name, segments)
+        embeddings = cache.get(key)
+        if embeddings is not None and len(embeddings) != len(segments):
+            embeddings = None
+    if embeddings is None:
+        embeddings = extract_embeddings(audio, segments, embedder, timer=timer, deadline=deadline)
+        if key is not None:
+            try:
+                cache.put(key, embeddings)
+            except OSError as e:
+                logging.error(f"Не удалось сохранить эмбеддинги в кэш: {e}")
+
+    with (timer or NULL_TIMER).stage("diarization"):
+        labels = cluster_segments(segments, embeddings, num_speakers, embedder.metric, embedder.threshold,
+                                  deadline=deadline)
+    for segment, label in zip(segments, labels):
+        segment["speaker"] = SPEAKER_LABEL.format(label + 1)
+    return [SPEAKER_LABEL.format(number + 1) for number in range(max(labels) + 1)]
@@ -0,0 +1,187 @@
+"""Экспорт результата в SRT, WebVTT, JSON и TSV.
+
+Экспортер пишет сегменты в файлы по мере их поступления (подходит как
+on_segment для транскрибации), поэтому весь текст в памяти не собирается,
+а несколько форматов получаются за одно декодирование. Файлы пишутся во
+временные и переименовываются только после finish: прерванный экспорт не
+оставляет обрезанных субтитров.
+"""
+import json
+import os
+import threading
+
+EXPORT_FORMATS = ("srt", "vtt", "json", "tsv")
+
+
+def format_subtitle_timestamp(seconds, decimal_marker=","):
+    milliseconds = max(0, round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def segment_text(segment, with_speaker=True):
+    # Пустая строка завершает блок субтитров, поэтому переводы строк внутри текста схлопываются
+    text = " ".join(segment.get("text", "").split())
+    if text and with_speaker and segment.get("speaker"):
+        return f"{segment['speaker']}: {text}"
+    return text
+
+
+class SrtWriter:
+    extension = "srt"
+
+    def __init__(self, f):
+        self.f = f
+        self.index = 0
+
+    def write_header(self):
+        pass
+
+    def write_segment(self, segment):
+        text = segment_text(segment)
+        if not text:
+            return
+        self.index += 1
+        self.f.write(f"{self.index}\n"
+                     f"{format_subtitle_timestamp(segment['start'])} --> {format_subtitle_timestamp(segment['end'])}\n"
+                     f"{text}\n\n")
+
+    def write_footer(self, result):
+        pass
+
+
+class VttWriter(SrtWriter):
+    extension = "vtt"
+
+    def write_header(self):
+        self.f.write("WEBVTT\n\n")
+
+    def write_segment(self, segment):
+        text = segment_text(segment, with_speaker=False)
+        if text and segment.get("speaker"):
+            # Голос в WebVTT - тег <v>, плееры показывают его отдельно от текста
+            text = f"<v {segment['speaker']}>{text}"
+        if text:
+            self.f.write(f"{format_subtitle_timestamp(segment['start'], '.')} --> "
+                         f"{format_subtitle_timestamp(segment['end'], '.')}\n{text}\n\n")
+
+
+class TsvWriter(SrtWriter):
+    """Как TSV whisper: начало и конец в миллисекундах, текст без табуляций"""
+    extension = "tsv"
+
+    def write_header(self):
+        self.f.write("start\tend\ttext\n")
+
+    def write_segment(self, segment):
+        text = segment_text(segment).replace("\t", " ")
+        if text:
+            self.f.write(f"{round(segment['start'] * 1000)}\t{round(segment['end'] * 1000)}\t{text}\n")
+
+
+class JsonWriter(SrtWriter):
+    """{"segments": [...], "language": ..., "text": ...}; массив сегментов пишется по одному элементу"""
+    extension = "json"
+    SEGMENT_FIELDS = ("id", "start", "end", "language", "speaker", "text", "words")
+
+    def write_header(self):
+        self.f.write('{"segments": [')
+
+    def write_segment(self, segment):
+        record = {field: segment[field] for field in self.SEGMENT_FIELDS if field in segment}
+        self.f.write(("\n  " if self.index == 0 else ",\n  ") +
+                     json.dumps(record, ensure_ascii=False, default=float))
+        self.index += 1
+
+    def write_footer(self, result):
+        language = json.dumps((result or {}).get("language"), ensure_ascii=False)
+        text = json.dumps((result or {}).get("text", ""), ensure_ascii=False)
+        speakers = ""
+        if (result or {}).get("speakers"):
+            speakers = f"\"speakers\": {json.dumps(result['speakers'], ensure_ascii=False)},\n"
+        self.f.write(f"\n],\n\"language\": {language},\n{speakers}\"text\": {text}\n}}\n")
+
+
+WRITERS = {writer.extension: writer for writer in (SrtWriter, VttWriter, JsonWriter, TsvWriter)}
+
+
+class TranscriptExporter:
+    """Пишет сегменты сразу в несколько форматов: {формат: путь}"""
+
+    def __init__(self, paths):
+        unknown = [name for name in paths if name not in WRITERS]
+        if unknown:
+            raise Exception(f"Неизвестный формат экспорта {', '.join(unknown)}; "
+                            f"доступны: {', '.join(EXPORT_FORMATS)}")
+        self.paths = dict(paths)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._writers = []
+        try:
+            for name, path in self.paths.items():
+                f = open(self._tmp_path(path), "w", encoding="utf-8")
+                self._files[name] = f
+                writer = WRITERS[name](f)
+                writer.write_header()
+                self._writers.append(writer)
+        except BaseException:
+            self.abort()
+            raise
+
+    @staticmethod
+    def _tmp_path(path):
+        return f"{path}.{os.getpid()}.tmp"
+
+    def write_segment(self, segment):
+        with self._lock:
+            for writer in self._writers:
+                writer.write_segment(segment)
+
+    def finish(self, result=None):
+        """Дописывает концовки файлов и переносит их на место; возвращает {формат: путь}"""
+        with self._lock:
+            for writer in self._writers:
+                writer.write_footer(result)
+            for name, f in self._files.items():
+                f.close()
+                os.replace(self._tmp_path(self.paths[name]), self.paths[name])
+            self._files = {}
+            self._writers = []
+        return self.paths
+
+    def abort(self):
+        with self._lock:
+            for name, f in self._files.items():
+                f.close()
+                try:
+                    os.remove(self._tmp_path(self.paths[name]))
+                except FileNotFoundError:
+                    pass
+            self._files = {}
+            self._writers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Без finish (ошибка транскрибации) временные файлы удаляются
+        self.abort()
+
+
+def write_result(result, export_format, f):
+    """Готовый результат в открытый текстовый поток (например, ответ HTTP), по сегменту за раз"""
+    writer = WRITERS[export_format](f)
+    writer.write_header()
+    for segment in result.get("segments", []):
+        writer.write_segment(segment)
+    writer.write_footer(result)
+
+
+def export_result(result, paths):
+    """Экспорт готового результата (например, после выравнивания слов)"""
+    with TranscriptExporter(paths) as exporter:
+        for segment in result.get("segments", []):
+            exporter.write_segment(segment)
+        return exporter.finish(result)
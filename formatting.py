@@ -0,0 +1,273 @@
+"""Форматирование результатов транскрибации в текст"""
+import re
+import textwrap
+import threading
+from collections import OrderedDict
+
+FORMAT_MODES = ["segments", "paragraphs", "continuous"]
+DEFAULT_LINE_LENGTH = 80
+
+
+def format_timestamp(seconds):
+    return f"{int(seconds//60):02d}:{seconds%60:06.3f}"
+
+
+def segment_text(segment):
+    """Текст сегмента с меткой спикера, если результат прошел разделение спикеров"""
+    text = segment.get("text", "").strip()
+    if text and segment.get("speaker"):
+        return f"{segment['speaker']}: {text}"
+    return text
+
+
+def render_segment_line(segment, max_line_length=DEFAULT_LINE_LENGTH):
+    """Строки одного сегмента с меткой времени; пустая строка для сегмента без текста"""
+    text = segment_text(segment)
+    if not text:
+        return ""
+
+    timestamp = f"[{format_timestamp(segment.get('start', 0))} --> {format_timestamp(segment.get('end', 0))}]"
+
+    available_width = max_line_length - len(timestamp) - 1
+    if available_width > 20 and len(text) > available_width:
+        indent = ' ' * len(timestamp)
+        text_lines = textwrap.wrap(text, width=available_width)
+        return '\n'.join([f"{timestamp} {text_lines[0]}"] + [f"{indent} {line}" for line in text_lines[1:]])
+    return f"{timestamp} {text}"
+
+
+def render_segment_plain(segment, max_line_length=DEFAULT_LINE_LENGTH):
+    text = segment_text(segment)
+    if len(text) > max_line_length:
+        return textwrap.fill(text, width=max_line_length)
+    return text
+
+
+def iter_paragraphs(segments, max_line_length=DEFAULT_LINE_LENGTH):
+    current_paragraph = []
+    current_speaker = None
+    for segment in segments:
+        text = segment.get("text", "").strip()
+        if text:
+            speaker = segment.get("speaker")
+            # Реплика другого спикера начинает новый абзац; абзац начинается с метки спикера
+            if speaker != current_speaker and current_paragraph:
+                yield textwrap.fill(' '.join(current_paragraph), width=max_line_length)
+                current_paragraph = []
+            current_speaker = speaker
+            if speaker and not current_paragraph:
+                current_paragraph.append(f"{speaker}:")
+            current_paragraph.append(text)
+            if (segment.get("end", 0) - segment.get("start", 0) > 2.0 or
+                    text.rstrip().endswith(('.', '!', '?'))):
+                yield textwrap.fill(' '.join(current_paragraph), width=max_line_length)
+                current_paragraph = []
+    if current_paragraph:
+        yield textwrap.fill(' '.join(current_paragraph), width=max_line_length)
+
+
+def format_segments_as_lines(segments, max_line_length=DEFAULT_LINE_LENGTH):
+    return '\n'.join(filter(None, (render_segment_line(segment, max_line_length) for segment in segments)))
+
+
+def iter_text_lines(text, max_line_length=DEFAULT_LINE_LENGTH):
+    """Строки сплошного текста: предложения набираются в строку до max_line_length"""
+    sentences = re.split(r'([.!?]+\s*)', ' '.join(text.split()))
+    # Текущая строка копится списком частей с длиной, без повторной конкатенации
+    current_parts = []
+    current_length = 0
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+
+        if sentence in '.!?' or (len(sentence) <= 3 and re.match(r'[.!?]+', sentence)):
+            if current_parts:
+                current_parts.append(sentence)
+                current_length += len(sentence)
+            continue
+
+        separator_length = 1 if current_parts else 0
+        if current_length + separator_length + len(sentence) <= max_line_length:
+            if current_parts:
+                current_parts.append(" ")
+            current_parts.append(sentence)
+            current_length += separator_length + len(sentence)
+        else:
+            if current_parts:
+                yield ''.join(current_parts)
+
+            if len(sentence) > max_line_length:
+                yield from textwrap.wrap(sentence, width=max_line_length)
+                current_parts = []
+                current_length = 0
+            else:
+                current_parts = [sentence]
+                current_length = len(sentence)
+
+    if current_parts:
+        yield ''.join(current_parts)
+
+
+def format_text_with_line_breaks(text, max_line_length=DEFAULT_LINE_LENGTH):
+    if not text or not text.strip():
+        return text
+
+    normalized = ' '.join(text.split())
+    if len(normalized) <= max_line_length:
+        return normalized
+    return '\n'.join(iter_text_lines(normalized, max_line_length))
+
+
+def format_segments_plain(segments, max_line_length=DEFAULT_LINE_LENGTH):
+    return "\n\n".join(filter(None, (render_segment_plain(segment, max_line_length) for segment in segments)))
+
+
+def format_paragraphs(segments, max_line_length=DEFAULT_LINE_LENGTH):
+    return '\n\n'.join(iter_paragraphs(segments, max_line_length))
+
+
+def effective_mode(result, format_mode):
+    """Режим, в котором реально выводится результат: без сегментов - сплошной текст"""
+    if format_mode in ("segments", "paragraphs") and result.get("segments"):
+        return format_mode
+    return "continuous"
+
+
+def block_separator(format_mode, show_timestamps=True):
+    """Разделитель между блоками (сегментами, абзацами, строками) режима"""
+    if format_mode == "segments":
+        return "\n" if show_timestamps else "\n\n"
+    if format_mode == "paragraphs":
+        return "\n\n"
+    return "\n"
+
+
+def iter_blocks(result, format_mode="segments", max_line_length=DEFAULT_LINE_LENGTH, show_timestamps=True,
+                start_segment=0):
+    """Блоки результата по одному, без сборки всего текста; сплошной текст - один блок.
+
+    start_segment позволяет дорендерить только новые сегменты (режим segments).
+    """
+    mode = effective_mode(result, format_mode)
+    if mode == "segments":
+        render = render_segment_line if show_timestamps else render_segment_plain
+        for index in range(start_segment, len(result["segments"])):
+            block = render(result["segments"][index], max_line_length)
+            if block:
+                yield block
+    elif mode == "paragraphs":
+        yield from iter_paragraphs(result["segments"], max_line_length)
+    else:
+        yield format_text_with_line_breaks(result["text"], max_line_length)
+
+
+class RenderCache:
+    """Кэш отрендеренных блоков по ключу (режим, длина строки, метки времени).
+
+    Смена настроек отображения возвращает уже готовые блоки, если такой
+    вид уже показывался, а при появлении новых сегментов (потоковый вывод)
+    рендерятся только они. Блоки рендерятся лениво: интерфейс забирает их
+    по мере вывода и может не дойти до конца длинного результата.
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._source = None
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._source = None
+
+    def _entry(self, result, key):
+        segments = result.get("segments") or []
+        # Результат сравнивается по идентичности: новый результат - новые списки сегментов и текст,
+        # разделение спикеров - новый список speakers. Кэш держит ссылки на сами объекты: id собранного
+        # результата может достаться новому, и сравнение id показало бы страницу другого файла
+        source = (result.get("segments"), result.get("text"), result.get("speakers"))
+        if self._source is None or any(new is not old for new, old in zip(source, self._source)):
+            self._entries.clear()
+            self._source = source
+
+        entry = self._entries.get(key)
+        if entry is not None and entry["n_segments"] != len(segments):
+            if key[0] == "segments" and entry["done"]:
+                # Дописаны новые сегменты: рендерим только хвост
+                entry["iterator"] = iter_blocks(result, *key, start_segment=entry["n_segments"])
+                entry["done"] = False
+                entry["n_segments"] = len(segments)
+            else:
+                entry = None
+        if entry is None:
+            entry = {"blocks": [], "iterator": iter_blocks(result, *key), "done": False,
+                     "n_segments": len(segments)}
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+        return entry
+
+    def iter_blocks(self, result, format_mode="segments", max_line_length=DEFAULT_LINE_LENGTH,
+                    show_timestamps=True):
+        key = (effective_mode(result, format_mode), max_line_length, show_timestamps)
+        with self._lock:
+            entry = self._entry(result, key)
+        index = 0
+        while True:
+            with self._lock:
+                if index >= len(entry["blocks"]):
+                    if entry["done"]:
+                        return
+                    block = next(entry["iterator"], None)
+                    if block is None:
+                        entry["done"] = True
+                        return
+                    entry["blocks"].append(block)
+                block = entry["blocks"][index]
+            index += 1
+            yield block
+
+
+def format_result(result, format_mode="segments", max_line_length=DEFAULT_LINE_LENGTH, show_timestamps=True,
+                  cache=None):
+    """Текст результата в выбранном режиме форматирования"""
+    if cache is not None:
+        blocks = cache.iter_blocks(result, format_mode, max_line_length, show_timestamps)
+    else:
+        blocks = iter_blocks(result, format_mode, max_line_length, show_timestamps)
+    return block_separator(effective_mode(result, format_mode), show_timestamps).join(blocks)
+
+
+def result_languages(result):
+    """Языки результата: основной первым, затем языки отдельных фрагментов"""
+    languages = [result["language"]] if result.get("language") else []
+    for segment in result.get("segments", []):
+        language = segment.get("language")
+        if language and language not in languages:
+            languages.append(language)
+    return languages
+
+
+def build_result_header(result, device_name, filename, processing_time):
+    text_length = len(result['text'])
+    lines = [
+        "=== ⚡ РЕЗУЛЬТАТ ТРАНСКРИБАЦИИ ===",
+        f"🚀 Устройство: {device_name}",
+        f"📁 Файл: {filename}",
+        f"⏱️ Время: {processing_time:.1f} секунд",
+        f"🌍 Язык: {', '.join(result_languages(result)) or 'не определен'}",
+        f"📝 Символов: {text_length}",
+    ]
+    if result.get("speakers"):
+        lines.append(f"👥 Спикеров: {len(result['speakers'])}")
+    if processing_time > 0:
+        lines.append(f"🚀 Скорость: {text_length/processing_time:.0f} символов/сек")
+        if result.get("duration"):
+            lines.append(f"⏳ RTF: {processing_time/result['duration']:.3f} "
+                         f"({result['duration']/processing_time:.1f}x быстрее реального времени)")
+    lines.append("=" * 60)
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,219 @@
+"""Управление выполняемыми транскрибациями: отмена, пауза и очередь с приоритетами.
+
+Декодер вызывает JobControl.check() между окнами (пакетный режим - между
+батчами): на паузе поток ждет там же, а отмена поднимает
+TranscriptionCancelled, и движок сохраняет готовые сегменты как частичный
+результат. Модуль не зависит от torch и интерфейса.
+"""
+import itertools
+import threading
+import time
+
+
+class TranscriptionCancelled(Exception):
+    """Задание отменено (пользователем или вытеснено заданием с большим приоритетом)"""
+
+
+class JobControl:
+    """Флаги отмены и паузы одного задания; on_pause() вызывается в потоке декодера при входе в паузу"""
+
+    def __init__(self, on_pause=None):
+        self.on_pause = on_pause
+        # Вытесненное задание возвращается в очередь, а не отменяется
+        self.requeue = False
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self, requeue=False):
+        self.requeue = requeue
+        self._cancelled.set()
+        # Задание на паузе должно проснуться, чтобы увидеть отмену
+        self._running.set()
+
+    def pause(self):
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def check(self):
+        """Точка остановки между окнами: ждет снятия паузы, при отмене бросает TranscriptionCancelled"""
+        if not self._running.is_set() and not self.cancelled:
+            if self.on_pause is not None:
+                self.on_pause()
+            self._running.wait()
+        if self.cancelled:
+            raise TranscriptionCancelled("Транскрибация отменена")
+
+
+class PriorityJobQueue:
+    """Задания одного движка в отдельном потоке: больший приоритет - раньше, при равном - по порядку.
+
+    run_job(job, control) выполняет задание (словарь с path, priority,
+    options) и возвращает результат; ошибка помечает задание failed. Если
+    preempt, задание с большим приоритетом, чем у выполняемого, вытесняет его:
+    выполняемое отменяется между окнами и возвращается в очередь, а журнал
+    движка продолжит его с контрольной точки. on_change() вызывается в потоке
+    очереди при смене статуса заданий.
+    """
+
+    def __init__(self, run_job, on_change=None, on_pause=None, preempt=True):
+        self.run_job = run_job
+        self.on_change = on_change
+        self.on_pause = on_pause
+        self.preempt = preempt
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._running = None
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Отменяет выполняемое задание и останавливает поток; очередь не выполняется"""
+        with self._cond:
+            self._stopped = True
+            if self._running is not None:
+                self._running["control"].cancel()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def add(self, path, priority=0, options=None):
+        with self._cond:
+            job_id = next(self._ids)
+            self._jobs[job_id] = {"id": job_id, "path": path, "priority": priority, "options": dict(options or {}),
+                                  "status": "queued", "added": time.time(), "seq": job_id, "position": 0.0}
+            self._preempt_if_needed()
+            self._cond.notify_all()
+        self._changed()
+        return job_id
+
+    def _preempt_if_needed(self):
+        running = self._running
+        if not self.preempt or running is None or running["control"].cancelled:
+            return
+        if any(job["status"] == "queued" and job["priority"] > running["priority"] for job in self._jobs.values()):
+            running["control"].cancel(requeue=True)
+
+    def _next_job(self):
+        queued = [job for job in self._jobs.values() if job["status"] == "queued"]
+        return min(queued, key=lambda job: (-job["priority"], job["seq"])) if queued else None
+
+    def set_priority(self, job_id, priority):
+        with self._cond:
+            job = self._jobs[job_id]
+            job["priority"] = priority
+            self._preempt_if_needed()
+        self._changed()
+
+    def pause(self, job_id):
+        """Пауза выполняемого задания (поток ждет, пока его не продолжат) или задержка задания в очереди"""
+        with self._cond:
+            job = self._jobs[job_id]
+            if job["status"] == "running":
+                job["control"].pause()
+                job["status"] = "paused"
+            elif job["status"] == "queued":
+                job["status"] = "paused"
+        self._changed()
+
+    def resume(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            if job["status"] == "paused":
+                if job is self._running:
+                    job["control"].resume()
+                    job["status"] = "running"
+                else:
+                    job["status"] = "queued"
+                    self._preempt_if_needed()
+                    self._cond.notify_all()
+        self._changed()
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            if job is self._running:
+                job["control"].cancel()
+            elif job["status"] in ("queued", "paused"):
+                job.update(status="cancelled", finished=time.time())
+        self._changed()
+
+    def remove(self, job_id):
+        """Убирает задание из списка; выполняемое сначала нужно отменить"""
+        with self._cond:
+            if self._jobs[job_id] is self._running:
+                raise ValueError("Задание выполняется: сначала отмените его")
+            del self._jobs[job_id]
+        self._changed()
+
+    def job(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def running_job(self):
+        with self._cond:
+            return self._running
+
+    def jobs(self):
+        """Копии заданий: выполняемое, затем очередь в порядке запуска, затем завершенные (новые выше)"""
+        def order(job):
+            if job is self._running:
+                return (0, 0, 0)
+            if job["status"] in ("queued", "paused"):
+                return (1, -job["priority"], job["seq"])
+            return (2, -job.get("finished", 0), 0)
+
+        with self._cond:
+            return [{key: value for key, value in job.items() if key != "control"}
+                    for job in sorted(self._jobs.values(), key=order)]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None and not self._stopped:
+                    self._cond.wait()
+                    job = self._next_job()
+                if self._stopped:
+                    return
+                control = JobControl(on_pause=self.on_pause)
+                job.update(status="running", started=time.time(), control=control, error=None)
+                self._running = job
+            self._changed()
+
+            status = "finished"
+            try:
+                job["result"] = self.run_job(job, control)
+            except TranscriptionCancelled:
+                status = "queued" if control.requeue else "cancelled"
+            except Exception as e:
+                status = "failed"
+                job["error"] = str(e)
+            with self._cond:
+                self._running = None
+                del job["control"]
+                job["status"] = status
+                if status != "queued":
+                    job["finished"] = time.time()
+            self._changed()
@@ -0,0 +1,81 @@
+"""Журнал заданий для возобновления долгой транскрибации.
+
+После каждого декодированного окна в журнал (JSON Lines) дописываются готовые
+сегменты и состояние декодера: позиция, токены контекста, метка последней
+речи. При повторном запуске того же задания (тот же файл и те же параметры)
+декодирование продолжается с последней контрольной точки. После успешного
+завершения журнал удаляется.
+"""
+import json
+import os
+import threading
+import time
+
+DEFAULT_JOURNAL_DIR = os.path.expanduser("~/.cache/whisper-transcriber/jobs")
+JOURNAL_SUFFIX = ".jsonl"
+
+
+class JobJournal:
+    def __init__(self, journal_dir=DEFAULT_JOURNAL_DIR):
+        self.journal_dir = journal_dir
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.journal_dir, job_id + JOURNAL_SUFFIX)
+
+    def load(self, job_id):
+        """{"filename", "segments", "state"} последней контрольной точки или None"""
+        path = self._path(job_id)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        header = None
+        segments = []
+        state = None
+        valid_bytes = 0
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Оборванная последняя запись после сбоя
+                if not line.endswith(b"\n"):
+                    break
+                valid_bytes += len(line)
+                if record["type"] == "header":
+                    header = record
+                elif record["type"] == "checkpoint":
+                    segments.extend(record["segments"])
+                    state = record["state"]
+
+        if os.path.getsize(path) != valid_bytes:
+            # Отрезаем мусор, чтобы следующие записи не склеились с оборванной строкой
+            with open(path, "r+b") as f:
+                f.truncate(valid_bytes)
+        if header is None or state is None:
+            return None
+        return {"filename": header.get("filename"), "segments": segments, "state": state}
+
+    def _append(self, job_id, record):
+        with self._lock:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with open(self._path(job_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=float) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self, job_id, filename, params=None):
+        if not os.path.exists(self._path(job_id)):
+            self._append(job_id, {"type": "header", "filename": filename, "params": params or {},
+                                  "created": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    def checkpoint(self, job_id, segments, state):
+        self._append(job_id, {"type": "checkpoint", "segments": segments, "state": state})
+
+    def finish(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,253 @@
+"""Параллельная транскрибация файлов: отдельный процесс с собственной моделью на каждое устройство.
+
+Рабочие процессы берут задания из общей очереди и сообщают о ходе работы
+через очередь событий. Без GPU запускается заданное число CPU-процессов,
+между которыми делятся потоки процессора. С group_languages рабочие сначала
+определяют язык каждого файла, и транскрибация ставится в очередь по языкам.
+"""
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import torch
+
+from language_detection import group_by_language
+
+WORKER_POLL_SECONDS = 0.5
+
+
+def default_devices(cpu_workers=None):
+    """Все доступные GPU или cpu_workers CPU-процессов"""
+    if torch.cuda.is_available() and torch.cuda.device_count() > 0:
+        return [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+    return ["cpu"] * max(1, cpu_workers or 1)
+
+
+def parse_devices(spec, cpu_workers=None):
+    """'all' или список через запятую: cuda:0,cuda:1 / cpu,cpu"""
+    if not spec or spec == "all":
+        return default_devices(cpu_workers)
+    return [device.strip() for device in spec.split(",") if device.strip()]
+
+
+def worker_engine_options(engine_options):
+    """Параметры TranscriptionEngine рабочего процесса.
+
+    Кэши не передаются между процессами: вместо них в engine_options лежат
+    пределы размера transcript_cache_bytes и audio_cache_bytes, а сами кэши
+    (общие каталоги на диске) создаются внутри процесса.
+    """
+    from audio_cache import AudioCache
+    from transcript_cache import TranscriptCache
+
+    options = dict(engine_options)
+    transcript_cache_bytes = options.pop("transcript_cache_bytes", None)
+    audio_cache_bytes = options.pop("audio_cache_bytes", None)
+    if options.get("use_cache", True):
+        if transcript_cache_bytes is not None:
+            options["transcript_cache"] = TranscriptCache(max_bytes=transcript_cache_bytes)
+        if audio_cache_bytes is not None:
+            options["audio_cache"] = AudioCache(max_bytes=audio_cache_bytes)
+    return options
+
+
+def _worker_main(worker_id, device, engine_options, cpu_threads, jobs, events):
+    # Импорт внутри процесса: при spawn модуль ядра загружается заново в каждом рабочем
+    import transcriber_core
+
+    if device == "cpu" and cpu_threads:
+        torch.set_num_threads(cpu_threads)
+
+    def log(text):
+        events.put({"type": "log", "worker": worker_id, "device": device, "text": text})
+
+    try:
+        engine = transcriber_core.TranscriptionEngine(device=device, log_callback=log,
+                                                      **worker_engine_options(engine_options))
+        engine.load_model()
+    except Exception as e:
+        events.put({"type": "worker_failed", "worker": worker_id, "device": device, "error": str(e)})
+        return
+    events.put({"type": "worker_ready", "worker": worker_id, "device": device})
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id = job["job_id"]
+        if job.get("detect_language"):
+            events.put({"type": "detecting", "worker": worker_id, "device": device, "job_id": job_id})
+            # Движок запоминает язык файла: при транскрибации он не определяется повторно
+            try:
+                language = engine.detect_language(job["path"])
+            except Exception as e:
+                log(f"⚠️ Не удалось определить язык {job['path']}: {e}\n")
+                language = None
+            events.put({"type": "language", "worker": worker_id, "device": device, "job_id": job_id,
+                        "language": language})
+            continue
+        events.put({"type": "started", "worker": worker_id, "device": device, "job_id": job_id})
+
+        def progress(segment, job_id=job_id):
+            events.put({"type": "progress", "worker": worker_id, "job_id": job_id, "position": segment["end"]})
+
+        if job.get("language"):
+            # Язык определил другой рабочий на этапе группировки
+            engine.remember_language(job["path"], job["language"])
+        try:
+            result = engine.transcribe(job["path"], on_segment=progress, word_timestamps=job.get("align_words"))
+            if job.get("align_words"):
+                engine.align_words(job["path"], result)
+            if job.get("diarize"):
+                engine.diarize(job["path"], result, job.get("num_speakers"))
+            events.put({"type": "finished", "worker": worker_id, "device": device, "job_id": job_id,
+                        "result": result, "processing_time": engine.last_processing_time,
+                        "memory_profile": engine.last_memory_profile})
+        except Exception as e:
+            events.put({"type": "failed", "worker": worker_id, "device": device, "job_id": job_id,
+                        "error": str(e)})
+    events.put({"type": "worker_exit", "worker": worker_id, "device": device})
+
+
+class JobScheduler:
+    def __init__(self, devices, engine_options=None, on_event=None):
+        self.devices = list(devices)
+        self.engine_options = engine_options or {}
+        self.on_event = on_event
+
+    def _emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def run(self, paths, align_words=False, diarize=False, num_speakers=None, group_languages=False):
+        """Обрабатывает файлы и возвращает {job_id: состояние задания}.
+
+        align_words - досчитать метки слов, diarize - разделить спикеров (num_speakers, если известно).
+        group_languages - сначала определить язык файлов и транскрибировать их по языкам
+        (событие "languages" с {язык: [job_id]}); файлы без определенного языка идут последними.
+        """
+        context = mp.get_context("spawn")
+        jobs = context.Queue()
+        events = context.Queue()
+
+        job_states = {}
+        for job_id, path in enumerate(paths):
+            job_states[job_id] = {"job_id": job_id, "path": path, "status": "queued", "device": None,
+                                  "result": None, "error": None, "processing_time": 0.0, "position": 0.0,
+                                  "memory_profile": None, "language": None}
+
+        def enqueue(job_ids):
+            for job_id in job_ids:
+                jobs.put({"job_id": job_id, "path": job_states[job_id]["path"], "align_words": align_words,
+                          "diarize": diarize, "num_speakers": num_speakers,
+                          "language": job_states[job_id]["language"]})
+            for _ in self.devices:
+                jobs.put(None)
+
+        # Задания, язык которых еще определяется; None - транскрибация уже в очереди
+        detecting = None
+        if group_languages and len(paths) > 1:
+            detecting = set(job_states)
+            for job_id, path in enumerate(paths):
+                jobs.put({"job_id": job_id, "path": path, "detect_language": True})
+        else:
+            enqueue(job_states)
+
+        def release_grouped():
+            # Файлы без языка (ошибка определения, рабочий упал) group_by_language ставит последними
+            detected = {job_id: state["language"] for job_id, state in job_states.items() if state["language"]}
+            groups = group_by_language(job_states, detected.__getitem__)
+            self._emit({"type": "languages", "groups": groups})
+            enqueue([job_id for job_ids in groups.values() for job_id in job_ids])
+
+        cpu_workers = sum(1 for device in self.devices if device == "cpu")
+        cpu_threads = max(1, (os.cpu_count() or 1) // cpu_workers) if cpu_workers else None
+
+        workers = {}
+        for worker_id, device in enumerate(self.devices):
+            process = context.Process(target=_worker_main, daemon=True,
+                                      args=(worker_id, device, self.engine_options, cpu_threads, jobs, events))
+            process.start()
+            workers[worker_id] = {"process": process, "device": device, "job_id": None, "alive": True,
+                                  "detecting": None}
+
+        start_time = time.time()
+        while any(state["status"] in ("queued", "running") for state in job_states.values()):
+            try:
+                event = events.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                if not self._check_workers(workers, job_states):
+                    break
+                if detecting is not None:
+                    # Язык файла, на котором упал рабочий, не придет: файл идет без группы.
+                    # Остальные файлы определяют живые рабочие, их ответы ждем
+                    for worker in workers.values():
+                        if not worker["alive"] and worker["detecting"] is not None:
+                            detecting.discard(worker["detecting"])
+                            worker["detecting"] = None
+                    if not detecting:
+                        release_grouped()
+                        detecting = None
+                continue
+            if event["type"] == "detecting":
+                workers[event["worker"]]["detecting"] = event["job_id"]
+                continue
+            if event["type"] == "language":
+                workers[event["worker"]]["detecting"] = None
+                if detecting is not None:
+                    job_states[event["job_id"]]["language"] = event["language"]
+                    detecting.discard(event["job_id"])
+                    if not detecting:
+                        release_grouped()
+                        detecting = None
+                continue
+            self._apply_event(event, workers, job_states)
+            self._emit(event)
+
+        for worker in workers.values():
+            worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+
+        self._emit({"type": "done", "elapsed": time.time() - start_time})
+        return job_states
+
+    def _apply_event(self, event, workers, job_states):
+        kind = event["type"]
+        worker = workers[event["worker"]]
+        if kind == "started":
+            worker["job_id"] = event["job_id"]
+            job_states[event["job_id"]].update(status="running", device=event["device"])
+        elif kind == "progress":
+            job_states[event["job_id"]]["position"] = event["position"]
+        elif kind == "finished":
+            worker["job_id"] = None
+            job_states[event["job_id"]].update(status="finished", result=event["result"],
+                                               processing_time=event["processing_time"],
+                                               memory_profile=event.get("memory_profile"))
+        elif kind == "failed":
+            worker["job_id"] = None
+            job_states[event["job_id"]].update(status="failed", error=event["error"])
+        elif kind in ("worker_failed", "worker_exit"):
+            worker["alive"] = False
+
+    def _check_workers(self, workers, job_states):
+        """Помечает задания упавших процессов; False, если рабочих больше не осталось"""
+        for worker in workers.values():
+            if worker["alive"] and not worker["process"].is_alive():
+                worker["alive"] = False
+                job_id = worker["job_id"]
+                if job_id is not None and job_states[job_id]["status"] == "running":
+                    job_states[job_id].update(
+                        status="failed",
+                        error=f"Рабочий процесс {worker['device']} завершился с кодом {worker['process'].exitcode}")
+                    self._emit({"type": "failed", "job_id": job_id, "device": worker["device"],
+                                "error": job_states[job_id]["error"]})
+        if any(worker["alive"] for worker in workers.values()):
+            return True
+        for state in job_states.values():
+            if state["status"] == "queued":
+                # Задание могло быть взято процессом, упавшим до отправки события "started"
+                state.update(status="failed", error="Задание не выполнено: все рабочие процессы завершились")
+        return False
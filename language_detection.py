@@ -0,0 +1,68 @@
+"""Определение языка записи детектором whisper.
+
+Язык файла определяется один раз по первым секундам записи, до
+декодирования: декодер получает готовый язык, а пакет файлов можно
+упорядочить по языкам. Для записей со сменой языка декодер определяет
+язык каждого окна (StreamingTranscriber(language_per_window=True)).
+"""
+import torch
+from whisper.audio import SAMPLE_RATE, N_SAMPLES, log_mel_spectrogram, pad_or_trim
+
+from audio_stream import open_audio_source
+from precision import model_autocast
+from stage_timer import NULL_TIMER
+
+# Детектор whisper смотрит на одно окно: больше 30 секунд он не использует
+LANGUAGE_DETECT_SECONDS = 30
+
+
+def detect_mel_language(model, mel_segment, timer=None):
+    """Самый вероятный язык окна (мел-спектрограмма 30 секунд) и его вероятность"""
+    if not model.is_multilingual:
+        return "en", 1.0
+    with (timer or NULL_TIMER).stage("language_detection"), model_autocast(model):
+        _, probs = model.detect_language(mel_segment)
+    language = max(probs, key=probs.get)
+    return language, probs[language]
+
+
+def detect_language(model, audio, seconds=LANGUAGE_DETECT_SECONDS, fp16=False, timer=None):
+    """Язык записи по первым seconds секундам: (язык, вероятность).
+
+    audio - путь к файлу (читается только начало) или массив отсчетов 16 кГц.
+    """
+    if not model.is_multilingual:
+        return "en", 1.0
+    timer = timer or NULL_TIMER
+    source = open_audio_source(audio)
+    try:
+        with timer.stage("audio_decode"):
+            window = source.read_window(0, min(N_SAMPLES, int(seconds * SAMPLE_RATE)))
+    finally:
+        source.close()
+    dtype = torch.float16 if fp16 and model.device.type != "cpu" else torch.float32
+    with timer.stage("mel"):
+        mel = log_mel_spectrogram(pad_or_trim(window, N_SAMPLES), model.dims.n_mels)
+        mel = mel.to(model.device).to(dtype)
+    with torch.no_grad():
+        return detect_mel_language(model, mel, timer)
+
+
+def group_by_language(paths, detect):
+    """Файлы, упорядоченные по языку: {язык: [пути]} в порядке первого появления языка.
+
+    detect(path) возвращает язык; файл, язык которого определить не удалось,
+    попадает в группу None и обрабатывается последним.
+    """
+    groups = {}
+    failed = []
+    for path in paths:
+        try:
+            language = detect(path)
+        except Exception:
+            failed.append(path)
+            continue
+        groups.setdefault(language, []).append(path)
+    if failed:
+        groups.setdefault(None, []).extend(failed)
+    return groups
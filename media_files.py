@@ -0,0 +1,102 @@
+"""Медиафайлы и FFmpeg: поиск файлов, путь к ffmpeg, тип файла.
+
+Модуль не импортирует torch и whisper, поэтому интерфейс и консольный режим
+могут пользоваться им до загрузки тяжелых библиотек.
+"""
+import glob
+import logging
+import os
+import shutil
+import sys
+import warnings
+
+AUDIO_EXTENSIONS = ['.mp3', '.wav', '.m4a', '.webm', '.ogg', '.flac']
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.3gp']
+MEDIA_EXTENSIONS = AUDIO_EXTENSIONS + VIDEO_EXTENSIONS
+
+FFMPEG_BINARY = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
+
+
+def get_resource_path(relative_path):
+    """Получение пути к ресурсам для PyInstaller"""
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+
+def _prepend_to_path(directory):
+    current_path = os.environ.get("PATH", "")
+    if directory not in current_path:
+        os.environ["PATH"] = directory + os.pathsep + current_path
+
+
+def setup_ffmpeg_path():
+    """Настройка пути к FFmpeg для разных режимов запуска"""
+    if getattr(sys, 'frozen', False):
+        application_path = os.path.dirname(sys.executable)
+        ffmpeg_dir = os.path.join(application_path, "bin")
+        ffmpeg_path = os.path.join(ffmpeg_dir, FFMPEG_BINARY)
+
+        if os.path.exists(ffmpeg_path):
+            _prepend_to_path(ffmpeg_dir)
+            return True
+        try:
+            ffmpeg_dir_alt = os.path.join(sys._MEIPASS, "bin")
+            if os.path.exists(os.path.join(ffmpeg_dir_alt, FFMPEG_BINARY)):
+                _prepend_to_path(ffmpeg_dir_alt)
+                return True
+        except AttributeError:
+            pass
+
+        logging.error(f"FFmpeg not found at: {ffmpeg_path}")
+        return False
+
+    local_ffmpeg = os.path.join("bin", FFMPEG_BINARY)
+    if os.path.exists(local_ffmpeg):
+        _prepend_to_path(os.path.abspath("bin"))
+    return True
+
+
+def find_ffmpeg():
+    """Полный путь к ffmpeg из PATH или None"""
+    return shutil.which(FFMPEG_BINARY) or shutil.which("ffmpeg")
+
+
+def suppress_warnings():
+    warnings.filterwarnings("ignore", category=FutureWarning, module="whisper")
+    warnings.filterwarnings("ignore", message=".*Triton kernels.*")
+    warnings.filterwarnings("ignore", message=".*DTW implementation.*")
+
+
+def get_file_type(filename):
+    file_ext = os.path.splitext(filename)[1].lower()
+    return "видео" if file_ext in VIDEO_EXTENSIONS else "аудио"
+
+
+def collect_media_files(inputs):
+    """Разворачивает список каталогов, масок и файлов в упорядоченный список медиафайлов"""
+    files = []
+    seen = set()
+
+    def add(path):
+        path = os.path.abspath(path)
+        if path not in seen and os.path.splitext(path)[1].lower() in MEDIA_EXTENSIONS:
+            seen.add(path)
+            files.append(path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, dirnames, filenames in os.walk(item):
+                # Порядок обхода подкаталогов зависит от файловой системы: сортируем, как и файлы
+                dirnames.sort()
+                for name in sorted(filenames):
+                    add(os.path.join(dirpath, name))
+        elif os.path.isfile(item):
+            add(item)
+        else:
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path):
+                    add(path)
+    return files
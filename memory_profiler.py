@@ -0,0 +1,158 @@
+"""Профилировщик памяти: временной ряд памяти и загрузки устройства во время задания.
+
+Фоновый поток раз в interval секунд записывает выделенную, зарезервированную
+и пиковую память CUDA и загрузку GPU, а без GPU - RSS процесса и загрузку
+CPU. Ряд ограничен max_samples точками: при переполнении он прореживается
+вдвое, а интервал удваивается, поэтому длинное задание не копит память.
+"""
+import os
+import threading
+import time
+
+import torch
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_INTERVAL = 0.5
+MAX_SAMPLES = 2000
+
+
+def _windows_rss_bytes():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+
+def process_rss_bytes():
+    """Резидентная память процесса; psutil, если установлен, иначе средствами ОС; None - неизвестно"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        if os.name == "nt":
+            return _windows_rss_bytes()
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def process_cpu_seconds():
+    times = os.times()
+    return times.user + times.system
+
+
+def gpu_utilization(device):
+    """Загрузка GPU в процентах; нужен pynvml, без него None"""
+    try:
+        return torch.cuda.utilization(device)
+    except Exception:
+        return None
+
+
+def memory_headroom(device):
+    """Сколько памяти устройства еще можно занять (свободная и зарезервированная кэшем PyTorch).
+
+    None - неизвестно (CPU): адаптивный батч тогда не растет.
+    """
+    device = torch.device(device)
+    if device.type != "cuda":
+        return None
+    free, _ = torch.cuda.mem_get_info(device)
+    return free + torch.cuda.memory_reserved(device) - torch.cuda.memory_allocated(device)
+
+
+class MemoryProfiler:
+    def __init__(self, device="cpu", interval=DEFAULT_INTERVAL, max_samples=MAX_SAMPLES):
+        self.device = torch.device(device)
+        self.backend = "cuda" if self.device.type == "cuda" else "rss"
+        self.interval = interval
+        self.max_samples = max(2, max_samples)
+        self.samples = []
+        self._peak = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_time = 0.0
+        self._last_time = 0.0
+        self._last_cpu = 0.0
+
+    def start(self):
+        if self.backend == "cuda":
+            torch.cuda.reset_peak_memory_stats(self.device)
+        self.samples = []
+        self._peak = 0
+        self._start_time = self._last_time = time.perf_counter()
+        self._last_cpu = process_cpu_seconds()
+        self._stop.clear()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает замеры и возвращает ряд (as_dict)"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.sample()
+        return self.as_dict()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        now = time.perf_counter()
+        if self.backend == "cuda":
+            allocated = torch.cuda.memory_allocated(self.device)
+            reserved = torch.cuda.memory_reserved(self.device)
+            peak = torch.cuda.max_memory_allocated(self.device)
+            utilization = gpu_utilization(self.device)
+        else:
+            allocated = process_rss_bytes()
+            reserved = None
+            peak = max(self._peak, allocated or 0)
+            cpu = process_cpu_seconds()
+            # Процент одного ядра, как в top: многопоточный декодер дает больше 100
+            elapsed = now - self._last_time
+            utilization = round(100 * (cpu - self._last_cpu) / elapsed, 1) if elapsed > 0 else None
+            self._last_cpu = cpu
+        self._last_time = now
+        with self._lock:
+            self._peak = max(self._peak, peak)
+            self.samples.append({"time": round(now - self._start_time, 3), "allocated": allocated,
+                                 "reserved": reserved, "peak": peak, "utilization": utilization})
+            if len(self.samples) > self.max_samples:
+                self.samples = self.samples[::2]
+                self.interval *= 2
+
+    def peak_bytes(self):
+        return self._peak
+
+    def as_dict(self):
+        with self._lock:
+            return {"backend": self.backend, "device": str(self.device), "interval": self.interval,
+                    "peak_bytes": self._peak, "samples": list(self.samples)}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
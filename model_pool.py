@@ -0,0 +1,142 @@
+"""Пул загруженных моделей Whisper с вытеснением давно не используемых (LRU)"""
+import gc
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+# Примерное число параметров моделей, чтобы освободить память до загрузки
+MODEL_PARAMETERS = {
+    "tiny": 39_000_000,
+    "base": 74_000_000,
+    "small": 244_000_000,
+    "medium": 769_000_000,
+    "large": 1_550_000_000,
+    "turbo": 809_000_000,
+}
+
+BYTES_PER_PARAMETER = {"fp32": 4, "fp16": 2, "bf16": 2, "int8": 1}
+
+
+def estimate_model_bytes(model_name, precision="fp32"):
+    base_name = model_name.split("-")[0].split(".")[0]
+    parameters = MODEL_PARAMETERS.get(base_name, MODEL_PARAMETERS["large"])
+    return parameters * BYTES_PER_PARAMETER.get(precision, 4)
+
+
+def model_bytes(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class PooledModel:
+    def __init__(self, model, size_bytes, load_time):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.load_time = load_time
+        self.hits = 0
+
+
+class ModelPool:
+    """Держит до max_models моделей, ключ - (имя, устройство, точность).
+
+    memory_budget_gb ограничивает суммарный размер моделей на одном устройстве;
+    для CUDA по умолчанию берется 80% памяти карты.
+    """
+
+    def __init__(self, max_models=2, memory_budget_gb=None, log_callback=None):
+        self.max_models = max(1, max_models)
+        self.memory_budget_gb = memory_budget_gb
+        self.log_callback = log_callback
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def log(self, text):
+        if self.log_callback:
+            self.log_callback(text)
+
+    def budget_bytes(self, device):
+        if self.memory_budget_gb is not None:
+            return int(self.memory_budget_gb * 1024**3)
+        if device.startswith("cuda") and torch.cuda.is_available():
+            index = int(device.split(":", 1)[1]) if ":" in device else 0
+            return int(torch.cuda.get_device_properties(index).total_memory * 0.8)
+        return None
+
+    def used_bytes(self, device):
+        return sum(entry.size_bytes for key, entry in self._models.items() if key[1] == device)
+
+    def get(self, model_name, device, precision, loader):
+        """Модель из пула или загрузка через loader(model_name, device, precision)"""
+        key = (model_name, device, precision)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                entry.hits += 1
+                self.log(f"⚡ Модель {model_name} ({precision}) уже в памяти {device}, переключение мгновенное\n")
+                return entry.model
+
+            self._make_room(device, estimate_model_bytes(model_name, precision))
+
+            start_time = time.time()
+            model = loader(model_name, device, precision)
+            load_time = time.time() - start_time
+
+            self._models[key] = PooledModel(model, model_bytes(model), load_time)
+            self.log(f"⏱️ Модель {model_name} ({precision}) загружена на {device} за {load_time:.1f} секунд\n")
+            return model
+
+    def _make_room(self, device, required_bytes):
+        budget = self.budget_bytes(device)
+        while self._models:
+            over_count = len(self._models) >= self.max_models
+            over_budget = budget is not None and self.used_bytes(device) + required_bytes > budget
+            if not over_count and not over_budget:
+                break
+            if over_count:
+                victim = next(iter(self._models))
+            else:
+                victim = next((key for key in self._models if key[1] == device), None)
+                if victim is None:
+                    break
+            self._evict(victim)
+
+    def _evict(self, key):
+        entry = self._models.pop(key)
+        self.log(f"♻️ Выгружаю модель {key[0]} ({key[2]}) с {key[1]}, "
+                 f"освобождается {entry.size_bytes / 1024**3:.2f} GB\n")
+        del entry
+        gc.collect()
+        if key[1].startswith("cuda"):
+            torch.cuda.empty_cache()
+
+    def unload(self, model_name, device, precision):
+        with self._lock:
+            if (model_name, device, precision) in self._models:
+                self._evict((model_name, device, precision))
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._models):
+                self._evict(key)
+
+    def loaded(self):
+        return list(self._models)
+
+    def stats(self):
+        """Сведения о загруженных моделях, от давно использованной к последней"""
+        with self._lock:
+            return [
+                {
+                    "model": key[0],
+                    "device": key[1],
+                    "precision": key[2],
+                    "size_gb": entry.size_bytes / 1024**3,
+                    "load_time": entry.load_time,
+                    "hits": entry.hits,
+                }
+                for key, entry in self._models.items()
+            ]
+
@@ -0,0 +1,107 @@
+"""Поиск чекпойнтов Whisper: сначала локальный кэш, сеть - только если файла нет.
+
+Контрольная сумма SHA256 файла считается один раз и сохраняется рядом с
+моделями, по файлу записи на чекпойнт; при следующих запусках достаточно
+сверить размер и время изменения файла.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import whisper
+
+MANIFEST_DIR = "checksums"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path, chunk_size=HASH_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelResolver:
+    def __init__(self, cache_dir, log_callback=None):
+        self.cache_dir = cache_dir
+        self.log_callback = log_callback
+        self.manifest_dir = os.path.join(cache_dir, MANIFEST_DIR)
+        self._lock = threading.Lock()
+
+    def log(self, text):
+        if self.log_callback:
+            self.log_callback(text)
+
+    def checkpoint_path(self, model_name):
+        return os.path.join(self.cache_dir, os.path.basename(whisper._MODELS[model_name]))
+
+    @staticmethod
+    def expected_sha256(model_name):
+        return whisper._MODELS[model_name].split("/")[-2]
+
+    def entry_path(self, path):
+        return os.path.join(self.manifest_dir, os.path.basename(path) + ".json")
+
+    def _load_entry(self, path):
+        try:
+            with open(self.entry_path(path), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _record(self, path, sha256):
+        # У каждого чекпойнта своя запись: параллельные рабочие процессы, проверяющие разные модели,
+        # не перезаписывают чужие записи, а запись одной модели заменяется целиком
+        stat = os.stat(path)
+        entry_path = self.entry_path(path)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}, f, indent=2)
+            os.replace(tmp_path, entry_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def verify(self, model_name, path):
+        """Проверка чекпойнта по манифесту; хэш пересчитывается, только если файл изменился"""
+        expected = self.expected_sha256(model_name)
+        stat = os.stat(path)
+        entry = self._load_entry(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"] == expected
+
+        self.log(f"🔍 Проверяю контрольную сумму {os.path.basename(path)} (один раз)...\n")
+        sha256 = file_sha256(path)
+        self._record(path, sha256)
+        return sha256 == expected
+
+    def resolve(self, model_name):
+        """Путь к проверенному чекпойнту, при необходимости скачивает его"""
+        if model_name not in whisper._MODELS:
+            if os.path.isfile(model_name):
+                return model_name
+            raise Exception(f"Модель {model_name} не найдена; доступные модели: {whisper.available_models()}")
+
+        with self._lock:
+            path = self.checkpoint_path(model_name)
+            if os.path.isfile(path):
+                if self.verify(model_name, path):
+                    self.log(f"📦 Модель {model_name} найдена в локальном кэше: {path}\n")
+                    return path
+                self.log(f"⚠️ Контрольная сумма {path} не совпадает, скачиваю заново\n")
+            return self._download(model_name)
+
+    def _download(self, model_name):
+        self.log(f"⬇️ Модели {model_name} нет в кэше, скачиваю в {self.cache_dir}...\n")
+        try:
+            path = whisper._download(whisper._MODELS[model_name], self.cache_dir, False)
+        except OSError as e:
+            raise Exception(f"Модели {model_name} нет в кэше {self.cache_dir}, "
+                            f"а скачать ее не удалось: {e}")
+        # whisper._download уже сверил SHA256 после загрузки
+        self._record(path, self.expected_sha256(model_name))
+        return path
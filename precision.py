@@ -0,0 +1,101 @@
+"""Режимы точности вычислений: fp32, fp16, bf16 и int8 (динамическая квантизация на CPU).
+
+fp16 - как в whisper: веса fp32, вычисления в половинной точности (только GPU).
+bf16 - автокаст матричных операций модели в bfloat16 (GPU с поддержкой bf16 и CPU).
+int8 - линейные слои квантуются torch.ao.quantization.quantize_dynamic (только CPU);
+квантованная модель сохраняется на диск, поэтому квантизация выполняется один раз.
+
+torch и whisper импортируются внутри функций: список точностей нужен
+интерфейсу и разбору аргументов до загрузки тяжелых библиотек.
+"""
+import os
+import warnings
+from contextlib import nullcontext
+
+PRECISIONS = ("fp32", "fp16", "bf16", "int8")
+QUANTIZED_DIR_NAME = "quantized"
+
+
+def default_precision(device):
+    return "fp16" if device.startswith("cuda") else "fp32"
+
+
+def available_precisions(device):
+    if device.startswith("cuda"):
+        import torch
+
+        precisions = ["fp16", "fp32"]
+        if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+            precisions.append("bf16")
+        return precisions
+    return ["fp32", "int8", "bf16"]
+
+
+def check_precision(precision, device):
+    if precision not in PRECISIONS:
+        raise Exception(f"Неизвестная точность {precision}; доступны: {', '.join(PRECISIONS)}")
+    if precision not in available_precisions(device):
+        raise Exception(f"Точность {precision} недоступна на {device}; "
+                        f"доступны: {', '.join(available_precisions(device))}")
+
+
+def model_autocast(model):
+    """Контекст для вызовов модели: автокаст в bfloat16 для моделей в режиме bf16"""
+    if getattr(model, "compute_precision", None) == "bf16":
+        import torch
+
+        return torch.autocast(model.device.type, dtype=torch.bfloat16)
+    return nullcontext()
+
+
+def quantize_int8(model):
+    """Динамическая int8-квантизация линейных слоев (веса int8, активации квантуются на лету)"""
+    import torch
+    import whisper
+    from torch import nn
+
+    # whisper.model.Linear отличается от nn.Linear только приведением типа весов,
+    # а quantize_dynamic заменяет модули по точному типу
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = nn.Linear
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_checkpoint_path(cache_dir, model_name, checkpoint_tag):
+    import torch
+
+    torch_version = torch.__version__.split("+")[0]
+    name = os.path.basename(model_name).split(".")[0]
+    return os.path.join(cache_dir, QUANTIZED_DIR_NAME, f"{name}-int8-{checkpoint_tag[:16]}-torch{torch_version}.pt")
+
+
+def load_int8_model(checkpoint_path, quantized_path, log=None):
+    """Квантованная модель из кэша или квантизация чекпойнта с сохранением результата.
+
+    Имя файла кэша включает хэш исходного чекпойнта и версию PyTorch: формат
+    квантованных модулей между версиями не гарантирован.
+    """
+    import torch
+    import whisper
+
+    if os.path.exists(quantized_path):
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                # Собственный кэш приложения: модуль сохраняется целиком вместе с упакованными весами
+                return torch.load(quantized_path, map_location="cpu", weights_only=False)
+        except Exception as e:
+            if log:
+                log(f"⚠️ Не удалось прочитать квантованную модель ({e}), квантую заново\n")
+
+    if log:
+        log("🧮 Квантую модель в int8 (один раз, результат сохранится на диск)...\n")
+    model = quantize_int8(whisper.load_model(checkpoint_path, device="cpu"))
+    os.makedirs(os.path.dirname(quantized_path), exist_ok=True)
+    tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, quantized_path)
+    return model
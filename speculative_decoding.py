@@ -0,0 +1,210 @@
+"""Спекулятивное декодирование: черновая модель предлагает токены, основная проверяет их одним проходом.
+
+Жадное декодирование большой моделью тратит полный проход декодера на
+каждый токен. Здесь маленькая модель с тем же словарем (base или small для
+large-v2) предлагает до draft_tokens токенов подряд, а основная модель
+считает логиты для всех них за один проход поверх кэша ключей и значений.
+Принимаются предложенные токены, пока они совпадают с выбором основной
+модели, и затем один токен самой основной модели. Фильтры логитов, метки
+времени, no_speech_prob и avg_logprob считаются так же, как в
+whisper.decode, поэтому текст совпадает с обычным жадным декодированием.
+"""
+import torch
+import torch.nn.functional as F
+from whisper.decoding import DecodingResult, DecodingTask
+from whisper.utils import compression_ratio
+
+# Сколько токенов черновая модель предлагает за один проход основной
+DRAFT_TOKENS = 5
+
+
+def check_draft_model(model, draft_model):
+    """Черновая модель должна иметь тот же словарь и те же мел-полосы, что и основная"""
+    if draft_model.dims.n_vocab != model.dims.n_vocab or draft_model.dims.n_mels != model.dims.n_mels:
+        raise Exception("Черновая модель несовместима с основной: нужны тот же словарь и те же мел-полосы "
+                        "(например, base или small для large-v2)")
+
+
+class DecodingStats:
+    """Токены и время декодера; в спекулятивном режиме еще предложенные и принятые токены"""
+
+    def __init__(self):
+        self.tokens = 0
+        self.seconds = 0.0
+        self.drafted = 0
+        self.accepted = 0
+        self.target_passes = 0
+
+    @property
+    def tokens_per_second(self):
+        return self.tokens / self.seconds if self.seconds else None
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.drafted if self.drafted else None
+
+    def as_dict(self):
+        return {
+            "tokens": self.tokens,
+            "seconds": round(self.seconds, 4),
+            "tokens_per_second": round(self.tokens_per_second, 2) if self.tokens_per_second else None,
+            "drafted": self.drafted,
+            "accepted": self.accepted,
+            "acceptance_rate": round(self.acceptance_rate, 4) if self.acceptance_rate is not None else None,
+            "target_passes": self.target_passes,
+        }
+
+
+def attention(module, q, k, v, mask=None, is_causal=False):
+    """Внимание MultiHeadAttention whisper по готовым q, k, v"""
+    q = q.view(*q.shape[:2], module.n_head, -1).permute(0, 2, 1, 3)
+    k = k.view(*k.shape[:2], module.n_head, -1).permute(0, 2, 1, 3)
+    v = v.view(*v.shape[:2], module.n_head, -1).permute(0, 2, 1, 3)
+    out = F.scaled_dot_product_attention(q, k, v, attn_mask=mask, is_causal=is_causal)
+    return module.out(out.permute(0, 2, 1, 3).flatten(start_dim=2))
+
+
+class CachedTextDecoder:
+    """Декодер whisper с кэшем ключей и значений, принимающий несколько новых токенов за проход.
+
+    TextDecoder.forward с kv_cache рассчитан на один новый токен (маска
+    внимания не учитывает смещение), поэтому блоки вызываются здесь
+    напрямую. Кэш можно откатить (truncate) после отклоненных токенов.
+    """
+
+    def __init__(self, model, audio_features):
+        self.decoder = model.decoder
+        self.audio_features = audio_features
+        self.keys = [None] * len(self.decoder.blocks)
+        self.values = [None] * len(self.decoder.blocks)
+        self.cross = [None] * len(self.decoder.blocks)
+        self.length = 0
+
+    def truncate(self, length):
+        if length < self.length:
+            self.keys = [key[:, :length] for key in self.keys]
+            self.values = [value[:, :length] for value in self.values]
+            self.length = length
+
+    def forward(self, tokens):
+        """Логиты (len(tokens), n_vocab) для новых токенов; кэш пополняется ими"""
+        decoder = self.decoder
+        device = self.audio_features.device
+        offset, n_tokens = self.length, len(tokens)
+        x = decoder.token_embedding(torch.tensor([tokens], device=device))
+        x = (x + decoder.positional_embedding[offset:offset + n_tokens]).to(self.audio_features.dtype)
+        # Первый проход - обычная причинная маска (как у whisper), дальше новые токены видят весь кэш
+        mask = None
+        if offset and n_tokens > 1:
+            mask = torch.ones(n_tokens, offset + n_tokens, dtype=torch.bool, device=device).tril(offset)
+        for index, block in enumerate(decoder.blocks):
+            x = x + self._self_attention(index, block.attn, block.attn_ln(x), mask,
+                                         is_causal=not offset and n_tokens > 1)
+            if block.cross_attn is not None:
+                x = x + self._cross_attention(index, block.cross_attn, block.cross_attn_ln(x))
+            x = x + block.mlp(block.mlp_ln(x))
+        x = decoder.ln(x)
+        self.length += n_tokens
+        return (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()[0]
+
+    def _self_attention(self, index, module, x, mask, is_causal):
+        key, value = module.key(x), module.value(x)
+        if self.keys[index] is not None:
+            key = torch.cat([self.keys[index], key], dim=1)
+            value = torch.cat([self.values[index], value], dim=1)
+        self.keys[index], self.values[index] = key, value
+        return attention(module, module.query(x), key, value, mask, is_causal)
+
+    def _cross_attention(self, index, module, x):
+        if self.cross[index] is None:
+            self.cross[index] = (module.key(self.audio_features), module.value(self.audio_features))
+        key, value = self.cross[index]
+        return attention(module, module.query(x), key, value)
+
+
+def apply_logit_filters(task, logits, tokens):
+    """Фильтры whisper (подавление токенов, правила меток времени) для строки логитов (1, n_vocab)"""
+    tokens = torch.tensor([tokens], device=logits.device)
+    for logit_filter in task.logit_filters:
+        logit_filter.apply(logits, tokens)
+
+
+@torch.no_grad()
+def speculative_decode(model, draft_model, audio_features, draft_features, options, draft_tokens=DRAFT_TOKENS,
+                       stats=None):
+    """Жадное декодирование окна (temperature 0, без луча) с черновой моделью.
+
+    audio_features и draft_features - выходы энкодеров основной и черновой
+    моделей для одного окна (1, n_audio_ctx, n_audio_state). Возвращает
+    DecodingResult, как whisper.decode(model, audio_features, options)[0].
+    """
+    task = DecodingTask(model, options)
+    tokenizer = task.tokenizer
+    tokens = torch.tensor([task.initial_tokens], device=audio_features.device)
+    # Без заданного языка токен языка выбирает основная модель, как в whisper.decode
+    languages, _ = task._detect_language(audio_features, tokens)
+    tokens = tokens[0].tolist()
+
+    target = CachedTextDecoder(model, audio_features)
+    draft = CachedTextDecoder(draft_model, draft_features)
+    sum_logprobs = torch.zeros(1, device=audio_features.device)
+    no_speech_prob = float("nan")
+    generated = 0
+    finished = False
+    while not finished:
+        # Проход выдает до k + 1 токенов: не больше sample_len за окно и не дальше контекста декодера
+        budget = min(task.sample_len - generated, task.n_ctx + 1 - len(tokens))
+        proposals = []
+        sequence = list(tokens)
+        for _ in range(min(draft_tokens, budget - 1)):
+            logits = draft.forward(sequence[draft.length:])[-1:]
+            apply_logit_filters(task, logits, sequence)
+            proposals.append(int(logits.argmax(dim=-1)))
+            sequence.append(proposals[-1])
+            if proposals[-1] == tokenizer.eot:
+                break
+
+        fed = tokens[target.length:] + proposals
+        first_pass = target.length == 0
+        logits = target.forward(fed)
+        if first_pass and tokenizer.no_speech is not None:
+            no_speech_prob = logits[task.sot_index].float().softmax(dim=-1)[tokenizer.no_speech].item()
+        base_length = len(tokens)
+        accepted = 0
+        for row in logits[len(fed) - len(proposals) - 1:]:
+            row = row[None]
+            apply_logit_filters(task, row, tokens)
+            next_token = int(row.argmax(dim=-1))
+            sum_logprobs += F.log_softmax(row.float(), dim=-1)[0, next_token]
+            tokens.append(next_token)
+            generated += 1
+            matched = accepted < len(proposals) and next_token == proposals[accepted]
+            if matched:
+                accepted += 1
+            if next_token == tokenizer.eot or generated == task.sample_len or len(tokens) > task.n_ctx:
+                finished = True
+                break
+            if not matched:
+                break
+        # В кэше остаются только токены, совпавшие с принятой последовательностью
+        target.truncate(len(tokens) - 1)
+        draft.truncate(min(draft.length, base_length + accepted))
+        if stats is not None:
+            stats.drafted += len(proposals)
+            stats.accepted += accepted
+            stats.target_passes += 1
+
+    sampled = tokens[task.sample_begin:]
+    if tokenizer.eot in sampled:
+        sampled = sampled[:sampled.index(tokenizer.eot)]
+    text = tokenizer.decode(sampled).strip()
+    return DecodingResult(
+        audio_features=audio_features[0],
+        language=languages[0],
+        tokens=sampled,
+        text=text,
+        avg_logprob=sum_logprobs.item() / (len(sampled) + 1),
+        no_speech_prob=no_speech_prob,
+        temperature=options.temperature,
+        compression_ratio=compression_ratio(text),
+    )
@@ -0,0 +1,61 @@
+"""Замер времени по этапам конвейера: чтение аудио, мел-спектрограмма, энкодер, декодер, выравнивание слов.
+
+На GPU перед началом и в конце этапа выполняется синхронизация CUDA, иначе
+асинхронные ядра попадали бы в чужой этап.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+import torch
+
+
+class StageTimer:
+    def __init__(self, device=None):
+        self.device = torch.device(device) if device is not None else None
+        self.synchronize = self.device is not None and self.device.type == "cuda"
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def _sync(self):
+        if self.synchronize:
+            torch.cuda.synchronize(self.device)
+
+    @contextmanager
+    def stage(self, name):
+        self._sync()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._sync()
+            self.totals[name] += time.perf_counter() - start
+            self.counts[name] += 1
+
+    def timed_iter(self, iterable, name):
+        """Итерация, где время получения каждого элемента относится к этапу name"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self):
+        return {name: {"seconds": round(total, 4), "calls": self.counts[name]}
+                for name, total in self.totals.items()}
+
+
+class NullTimer:
+    """Заглушка без накладных расходов для обычной работы"""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def timed_iter(self, iterable, name):
+        return iterable
+
+
+NULL_TIMER = NullTimer()
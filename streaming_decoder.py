@@ -0,0 +1,339 @@
+"""Покадровое (по 30-секундным окнам) декодирование с выдачей сегментов по мере готовности.
+
+Повторяет основной цикл whisper.transcribe (сдвиг окна по меткам времени,
+откат по температуре, контекст из предыдущего текста), но отдает сегменты
+сразу после каждого окна, а не одним словарем в конце файла. Аудио не
+загружается целиком: окна читаются из потока ffmpeg через скользящий буфер.
+"""
+import time
+
+import torch
+import whisper
+from whisper.audio import SAMPLE_RATE, N_SAMPLES, N_FRAMES, HOP_LENGTH, FRAMES_PER_SECOND, \
+    log_mel_spectrogram, pad_or_trim
+from whisper.timing import add_word_timestamps
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import get_end
+
+from audio_stream import open_audio_source
+from batch_sizing import BatchSizer, is_out_of_memory
+from language_detection import detect_mel_language
+from precision import model_autocast
+from speculative_decoding import DRAFT_TOKENS, DecodingStats, speculative_decode
+from stage_timer import NULL_TIMER
+
+DEFAULT_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+
+
+class StreamingTranscriber:
+    def __init__(self, model, language=None, task="transcribe", fp16=False, word_timestamps=False,
+                 temperatures=DEFAULT_TEMPERATURES, beam_size=None, best_of=None,
+                 compression_ratio_threshold=2.4, logprob_threshold=-1.0, no_speech_threshold=0.6,
+                 condition_on_previous_text=True, initial_prompt=None, timer=None,
+                 resume_state=None, on_checkpoint=None, language_per_window=False, batch_sizer=None,
+                 control=None, draft_model=None, draft_tokens=DRAFT_TOKENS):
+        self.model = model
+        self.language = language
+        # Язык определяется для каждого окна (речь на нескольких языках), если он не задан явно
+        self.language_per_window = language_per_window and language is None
+        self.task = task
+        self.fp16 = fp16 and model.device.type != "cpu"
+        self.dtype = torch.float16 if self.fp16 else torch.float32
+        self.word_timestamps = word_timestamps
+        self.temperatures = temperatures
+        self.beam_size = beam_size
+        self.best_of = best_of
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.logprob_threshold = logprob_threshold
+        self.no_speech_threshold = no_speech_threshold
+        self.condition_on_previous_text = condition_on_previous_text
+        self.initial_prompt = initial_prompt
+        self.timer = timer or NULL_TIMER
+        self.audio_duration = 0.0
+        # Состояние из журнала задания и обработчик контрольных точек (segments, state) после окна
+        self.resume_state = resume_state
+        self.on_checkpoint = on_checkpoint
+        # JobControl: пауза и отмена проверяются перед каждым окном
+        self.control = control
+        # Черновая модель для спекулятивного жадного декодирования (только temperature 0 без луча)
+        self.draft_model = draft_model
+        self.draft_tokens = draft_tokens
+        self.decoding_stats = DecodingStats()
+        # Окна декодируются по одному: при нехватке памяти уменьшается только луч
+        self.batch_sizer = batch_sizer or BatchSizer(model.device, 1, beam_size, adaptive=False)
+        self.beam_size = self.batch_sizer.beam_size
+        # Шаг окна в кадрах мел-спектрограммы на один выходной токен (2) и его длительность (0.02 с)
+        self.input_stride = N_FRAMES // model.dims.n_audio_ctx
+        self.time_precision = self.input_stride * HOP_LENGTH / SAMPLE_RATE
+
+    def window_mel(self, source, seek):
+        """Мел-спектрограмма окна с позиции seek и его длина в кадрах (0 - аудио закончилось)"""
+        with self.timer.stage("audio_decode"):
+            window = source.read_window(seek * HOP_LENGTH, N_SAMPLES)
+        if len(window):
+            self.audio_duration = max(self.audio_duration, (seek * HOP_LENGTH + len(window)) / SAMPLE_RATE)
+        segment_size = min(N_FRAMES, len(window) // HOP_LENGTH)
+        with self.timer.stage("mel"):
+            mel = log_mel_spectrogram(pad_or_trim(window, N_SAMPLES), self.model.dims.n_mels)
+            mel = mel.to(self.model.device).to(self.dtype)
+        return mel, segment_size
+
+    def detect_language(self, mel_segment):
+        return detect_mel_language(self.model, mel_segment, self.timer)[0]
+
+    def decode_with_fallback(self, mel_segment, prompt):
+        """Декодирует окно, повышая температуру при повторах или низкой уверенности"""
+        # Энкодер считается один раз на окно и переиспользуется при откате по температуре
+        with self.timer.stage("encoder"), model_autocast(self.model):
+            # В режиме bf16 выход энкодера приводится к типу, который ожидает whisper.decode
+            audio_features = self.model.embed_audio(mel_segment.unsqueeze(0)).to(self.dtype)
+        draft_features = None
+        if self.draft_model is not None and not self.beam_size:
+            with self.timer.stage("encoder"), model_autocast(self.draft_model):
+                draft_features = self.draft_model.embed_audio(mel_segment.unsqueeze(0)).to(self.dtype)
+        decode_result = attempt_stats = None
+        for temperature in self.temperatures:
+            options = whisper.DecodingOptions(
+                task=self.task,
+                language=self.language,
+                temperature=temperature,
+                beam_size=self.beam_size if temperature == 0 else None,
+                best_of=self.best_of if temperature > 0 else None,
+                prompt=prompt,
+                fp16=self.fp16,
+            )
+            started = time.perf_counter()
+            attempt_stats = DecodingStats()
+            with self.timer.stage("decoder"), model_autocast(self.model):
+                if draft_features is not None and temperature == 0:
+                    decode_result = speculative_decode(self.model, self.draft_model, audio_features, draft_features,
+                                                       options, self.draft_tokens, attempt_stats)
+                else:
+                    decode_result = whisper.decode(self.model, audio_features, options)[0]
+            self.decoding_stats.seconds += time.perf_counter() - started
+
+            needs_fallback = False
+            if (self.compression_ratio_threshold is not None
+                    and decode_result.compression_ratio > self.compression_ratio_threshold):
+                needs_fallback = True
+            if self.logprob_threshold is not None and decode_result.avg_logprob < self.logprob_threshold:
+                needs_fallback = True
+            if (self.no_speech_threshold is not None
+                    and decode_result.no_speech_prob > self.no_speech_threshold
+                    and self.logprob_threshold is not None
+                    and decode_result.avg_logprob < self.logprob_threshold):
+                needs_fallback = False
+            if not needs_fallback:
+                break
+        # Время декодера учитывает все попытки, токены - только принятый результат
+        self.decoding_stats.tokens += len(decode_result.tokens) + 1
+        self.decoding_stats.drafted += attempt_stats.drafted
+        self.decoding_stats.accepted += attempt_stats.accepted
+        self.decoding_stats.target_passes += attempt_stats.target_passes
+        return decode_result
+
+    def decode_window(self, mel_segment, prompt):
+        """decode_with_fallback, повторяемый с меньшим лучом при нехватке памяти"""
+        while True:
+            try:
+                return self.decode_with_fallback(mel_segment, prompt)
+            except Exception as e:
+                if not is_out_of_memory(e) or not self.batch_sizer.can_step_down():
+                    raise
+            self.batch_sizer.step_down()
+            self.beam_size = self.batch_sizer.beam_size
+
+    def split_segments(self, tokens, tokenizer, result, seek, time_offset, segment_size):
+        """Сегменты окна по парам меток времени и следующая позиция seek"""
+        def new_segment(start, end, segment_tokens):
+            segment_tokens = segment_tokens.tolist()
+            text_tokens = [token for token in segment_tokens if token < tokenizer.eot]
+            return {
+                "seek": seek,
+                "start": start,
+                "end": end,
+                "text": tokenizer.decode(text_tokens),
+                "tokens": segment_tokens,
+                "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob,
+                "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            }
+
+        segments = []
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+        single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0]
+        consecutive.add_(1)
+
+        if len(consecutive) > 0:
+            slices = consecutive.tolist()
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+            last_slice = 0
+            for current_slice in slices:
+                sliced_tokens = tokens[last_slice:current_slice]
+                start_position = sliced_tokens[0].item() - tokenizer.timestamp_begin
+                end_position = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                segments.append(new_segment(time_offset + start_position * self.time_precision,
+                                            time_offset + end_position * self.time_precision,
+                                            sliced_tokens))
+                last_slice = current_slice
+            if single_timestamp_ending:
+                next_seek = seek + segment_size
+            else:
+                last_position = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+                next_seek = seek + last_position * self.input_stride
+        else:
+            duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+                duration = (timestamps[-1].item() - tokenizer.timestamp_begin) * self.time_precision
+            segments.append(new_segment(time_offset, time_offset + duration, tokens))
+            next_seek = seek + segment_size
+
+        return segments, next_seek, single_timestamp_ending
+
+    def iter_segments(self, audio):
+        """Генератор сегментов в формате whisper (start, end, text, tokens, words...).
+
+        audio - путь к файлу (читается потоково через ffmpeg) или массив отсчетов 16 кГц.
+        """
+        start_seek = self.resume_state["seek"] if self.resume_state else 0
+        source = open_audio_source(audio, start_sample=start_seek * HOP_LENGTH)
+        try:
+            yield from self._iter_source_segments(source)
+        finally:
+            source.close()
+
+    def _iter_source_segments(self, source):
+        state = self.resume_state
+        if state:
+            self.language = state["language"]
+        if self.language is None and not self.language_per_window:
+            self.language = self.detect_language(self.window_mel(source, 0)[0])
+
+        def make_tokenizer():
+            return get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages,
+                                 language=self.language, task=self.task)
+
+        tokenizer = make_tokenizer()
+
+        all_tokens = []
+        prompt_reset_since = 0
+        if state:
+            all_tokens.extend(state["prompt_tokens"])
+            segment_id = state["next_segment_id"]
+            last_speech_timestamp = state["last_speech_timestamp"]
+            seek = state["seek"]
+        else:
+            if self.initial_prompt:
+                all_tokens.extend(tokenizer.encode(" " + self.initial_prompt.strip()))
+            segment_id = 0
+            last_speech_timestamp = 0.0
+            seek = 0
+
+        def checkpoint(segments):
+            if self.on_checkpoint is not None:
+                # Декодер все равно берет только последние n_text_ctx // 2 - 1 токенов контекста
+                max_prompt = self.model.dims.n_text_ctx // 2 - 1
+                self.on_checkpoint(segments, {
+                    "seek": seek,
+                    "language": self.language,
+                    "prompt_tokens": all_tokens[prompt_reset_since:][-max_prompt:],
+                    "next_segment_id": segment_id,
+                    "last_speech_timestamp": last_speech_timestamp,
+                })
+
+        with torch.no_grad():
+            while True:
+                if self.control is not None:
+                    self.control.check()
+                time_offset = seek * HOP_LENGTH / SAMPLE_RATE
+                mel_segment, segment_size = self.window_mel(source, seek)
+                if segment_size == 0:
+                    break
+
+                if self.language_per_window:
+                    window_language = self.detect_language(mel_segment)
+                    if window_language != self.language:
+                        self.language = window_language
+                        tokenizer = make_tokenizer()
+                        # Контекст на другом языке подталкивает декодер к переводу
+                        prompt_reset_since = len(all_tokens)
+
+                prompt = all_tokens[prompt_reset_since:]
+                result = self.decode_window(mel_segment, prompt)
+                tokens = torch.tensor(result.tokens)
+
+                if self.no_speech_threshold is not None and result.no_speech_prob > self.no_speech_threshold:
+                    if self.logprob_threshold is None or result.avg_logprob <= self.logprob_threshold:
+                        seek += segment_size
+                        checkpoint([])
+                        continue
+
+                segments, next_seek, single_timestamp_ending = self.split_segments(
+                    tokens, tokenizer, result, seek, time_offset, segment_size)
+
+                if self.word_timestamps:
+                    with self.timer.stage("alignment"), model_autocast(self.model):
+                        add_word_timestamps(
+                            segments=segments,
+                            model=self.model,
+                            tokenizer=tokenizer,
+                            mel=mel_segment,
+                            num_frames=segment_size,
+                            prepend_punctuations=PREPEND_PUNCTUATIONS,
+                            append_punctuations=APPEND_PUNCTUATIONS,
+                            last_speech_timestamp=last_speech_timestamp,
+                        )
+                    if not single_timestamp_ending:
+                        last_word_end = get_end(segments)
+                        if last_word_end is not None and last_word_end > time_offset:
+                            next_seek = round(last_word_end * FRAMES_PER_SECOND)
+                    last_word_end = get_end(segments)
+                    if last_word_end is not None:
+                        last_speech_timestamp = last_word_end
+
+                # Защита от зацикливания, если модель не сдвинула окно
+                seek = next_seek if next_seek > seek else seek + segment_size
+                for segment in segments:
+                    if segment["start"] == segment["end"] or not segment["text"].strip():
+                        segment["text"] = ""
+                        segment["tokens"] = []
+                        segment["words"] = []
+                    segment["id"] = segment_id
+                    segment["language"] = self.language
+                    segment_id += 1
+                    all_tokens.extend(segment["tokens"])
+                    yield segment
+
+                if not self.condition_on_previous_text or result.temperature > 0.5:
+                    prompt_reset_since = len(all_tokens)
+                checkpoint(segments)
+
+    def transcribe(self, audio, on_segment=None):
+        """Полный результат в формате whisper.transcribe; on_segment вызывается для каждого сегмента"""
+        segments = []
+        for segment in self.iter_segments(audio):
+            segments.append(segment)
+            if on_segment is not None:
+                on_segment(segment)
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": dominant_language(segments) or self.language,
+            "duration": self.audio_duration,
+        }
+
+
+def dominant_language(segments):
+    """Язык, на котором сказано больше всего (по длительности сегментов с текстом)"""
+    durations = {}
+    for segment in segments:
+        if segment.get("language") and segment["text"].strip():
+            durations[segment["language"]] = (durations.get(segment["language"], 0.0)
+                                              + segment["end"] - segment["start"])
+    return max(durations, key=durations.get) if durations else None
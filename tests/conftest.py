@@ -0,0 +1,148 @@
+"""Общие фикстуры: маленькая модель whisper со случайными весами и WAV-файлы вместо ffmpeg"""
+import os
+import sys
+import wave
+
+import numpy as np
+import pytest
+import torch
+from whisper.audio import SAMPLE_RATE
+from whisper.model import ModelDimensions, Whisper
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio_cache
+import audio_stream
+import transcriber_core
+from audio_cache import AudioCache
+from job_journal import JobJournal
+from transcript_cache import TranscriptCache
+
+TINY_DIMS = dict(n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=1,
+                 n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=1)
+# Имена моделей в тестах: у черновой другие веса
+MODEL_SEEDS = {"tiny-random": 0, "tiny-draft": 1}
+
+
+def tiny_whisper(seed=0, **dims):
+    """Whisper с размерами tiny-заглушки и случайными весами; словарь и мел-полосы как у настоящих моделей"""
+    torch.manual_seed(seed)
+    model = Whisper(ModelDimensions(**{**TINY_DIMS, **dims})).eval()
+    # Позиционные эмбеддинги декодера whisper создает пустыми: их заполняет чекпойнт
+    with torch.no_grad():
+        for name, parameter in model.named_parameters():
+            if "positional" in name or not torch.isfinite(parameter).all():
+                parameter.copy_(torch.randn_like(parameter) * 0.02)
+    return model
+
+
+def synth_speech(seconds, seed=0, pauses=()):
+    """Тоновые посылки с шумом, похожие на речь по энергии; pauses - [(начало, конец)] тишины в секундах"""
+    rng = np.random.default_rng(seed)
+    n_samples = int(seconds * SAMPLE_RATE)
+    t = np.arange(n_samples) / SAMPLE_RATE
+    pitch = 150 + 50 * np.sin(2 * np.pi * 0.3 * t)
+    # Фразы по 2 секунды с короткими паузами, внутри фразы - слоги
+    envelope = (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2) * (t % 2.6 < 2.0)
+    samples = 0.3 * envelope * np.sin(2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE)
+    samples += 0.02 * rng.standard_normal(n_samples)
+    for start, end in pauses:
+        samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0.0
+    return samples.astype(np.float32)
+
+
+def write_wav(path, samples):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return str(path)
+
+
+def read_wav(path):
+    with wave.open(str(path)) as f:
+        return np.frombuffer(f.readframes(f.getnframes()), "<i2").astype(np.float32) / 32768.0
+
+
+class WavAudioStream:
+    """FfmpegAudioStream для WAV 16 кГц моно без ffmpeg"""
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE, ffmpeg="ffmpeg", start_sample=0):
+        self.path = path
+        self.samples = read_wav(path)
+        self.position = start_sample
+        self.samples_read = 0
+        self.eof = False
+
+    def read(self, n_samples):
+        block = self.samples[self.position:self.position + n_samples]
+        self.position += len(block)
+        self.samples_read += len(block)
+        if len(block) < n_samples:
+            self.eof = True
+        return block
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@pytest.fixture
+def no_ffmpeg(monkeypatch):
+    """Аудио читается из WAV напрямую: в тестовом окружении ffmpeg может не быть"""
+    monkeypatch.setattr(audio_stream, "FfmpegAudioStream", WavAudioStream)
+    monkeypatch.setattr(audio_cache, "FfmpegAudioStream", WavAudioStream)
+    monkeypatch.setattr(transcriber_core, "find_ffmpeg", lambda: "ffmpeg")
+
+
+@pytest.fixture
+def wav_file(tmp_path):
+    """Фабрика WAV-файлов: wav_file(seconds, seed=0, pauses=(), name=None)"""
+    def make(seconds, seed=0, pauses=(), name=None):
+        return write_wav(tmp_path / (name or f"speech_{seconds}s_{seed}.wav"), synth_speech(seconds, seed, pauses))
+    return make
+
+
+@pytest.fixture
+def tiny_models(tmp_path, monkeypatch, no_ffmpeg):
+    """TranscriptionEngine загружает tiny-модели со случайными весами вместо скачивания чекпойнтов"""
+    monkeypatch.setattr(transcriber_core, "MODEL_CACHE_DIR", str(tmp_path / "models"))
+    monkeypatch.setenv("WHISPER_CACHE_DIR", str(tmp_path / "models"))
+
+    def load_checked_model(self, model_name, device, precision):
+        model = tiny_whisper(MODEL_SEEDS[model_name])
+        model.compute_precision = precision
+        return model
+
+    monkeypatch.setattr(transcriber_core.TranscriptionEngine, "_load_checked_model", load_checked_model)
+
+
+@pytest.fixture
+def engine_options(tmp_path, tiny_models):
+    """Параметры движка на CPU с кэшами и журналом во временном каталоге"""
+    return {
+        "model_name": "tiny-random",
+        "device": "cpu",
+        "language": "en",
+        "transcript_cache": TranscriptCache(str(tmp_path / "transcripts")),
+        "job_journal": JobJournal(str(tmp_path / "jobs")),
+        "audio_cache": AudioCache(str(tmp_path / "audio")),
+        # Кэши по умолчанию лежат в домашнем каталоге: тесты используют только переданные явно
+        "use_cache": False,
+    }
+
+
+@pytest.fixture
+def make_engine(engine_options):
+    """Фабрика загруженных TranscriptionEngine; параметры дополняют engine_options"""
+    def make(**options):
+        engine = transcriber_core.TranscriptionEngine(**{**engine_options, **options})
+        engine.load_model()
+        return engine
+    return make
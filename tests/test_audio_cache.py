@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from whisper.audio import SAMPLE_RATE
+
+import audio_cache
+from audio_cache import TRIM_PAD_SECONDS, AudioCache, PreprocessedAudio
+from conftest import WavAudioStream, read_wav
+
+PAUSES = [(10.0, 25.0), (35.0, 50.0)]
+# Поля вокруг речи плюс шаг кадров детектора речи
+MARGIN = TRIM_PAD_SECONDS + 0.1
+
+
+def inside_pause(seconds):
+    return any(start + MARGIN < seconds < end - MARGIN for start, end in PAUSES)
+
+
+@pytest.fixture
+def trimmed(tmp_path, wav_file, no_ffmpeg):
+    path = wav_file(60, pauses=PAUSES)
+    return path, AudioCache(str(tmp_path / "audio")).prepare(path, "hash", trim_silence=True)
+
+
+def test_trim_silence_keeps_speech_on_source_timeline(trimmed):
+    path, audio = trimmed
+    source = read_wav(path)
+    assert audio.trimmed and audio.duration == pytest.approx(60.0)
+    assert len(audio.samples) / SAMPLE_RATE == pytest.approx(60.0 - 30.0 + 4 * TRIM_PAD_SECONDS, abs=0.5)
+    for offset, start, size in audio.pieces:
+        assert audio.to_source_time(offset / SAMPLE_RATE) == pytest.approx(start / SAMPLE_RATE)
+        np.testing.assert_allclose(audio.samples[offset:offset + size], source[start:start + size], atol=1e-4)
+        assert not inside_pause(start / SAMPLE_RATE) and not inside_pause((start + size) / SAMPLE_RATE)
+
+
+def test_remap_segment_across_cut():
+    # Два участка: 0-10 с исходника и 25-35 с, в обрезанном аудио они идут подряд
+    pieces = [(0, 0, 10 * SAMPLE_RATE), (10 * SAMPLE_RATE, 25 * SAMPLE_RATE, 10 * SAMPLE_RATE)]
+    audio = PreprocessedAudio(np.zeros(20 * SAMPLE_RATE, np.float32), 35.0, pieces=pieces)
+    segment = audio.remap_segment({"start": 8.0, "end": 12.0,
+                                   "words": [{"start": 8.0, "end": 10.0}, {"start": 10.0, "end": 12.0}]})
+    assert (segment["start"], segment["end"]) == (8.0, 27.0)
+    # Конец на стыке остается в конце первого участка, начало следующего слова - в начале второго
+    assert [(word["start"], word["end"]) for word in segment["words"]] == [(8.0, 10.0), (25.0, 27.0)]
+
+
+def test_trimmed_timeline_reads_silence_in_cuts(trimmed):
+    _, audio = trimmed
+    window = audio.source_timeline().read_window(0, 30 * SAMPLE_RATE)
+    assert len(window) == 30 * SAMPLE_RATE
+    assert not window[12 * SAMPLE_RATE:23 * SAMPLE_RATE].any()
+    assert np.abs(window[:9 * SAMPLE_RATE]).max() > 0.1
+
+
+def test_engine_timestamps_follow_source_file(make_engine, wav_file):
+    path = wav_file(60, pauses=PAUSES)
+    result = make_engine(trim_silence=True).transcribe(path)
+    assert result["duration"] == pytest.approx(60.0)
+    assert result["segments"]
+    for segment in result["segments"]:
+        assert 0.0 <= segment["start"] <= segment["end"] <= 60.0
+        assert not inside_pause(segment["start"])
+
+
+def test_default_engine_streams_first_run_and_fills_cache(make_engine, engine_options, wav_file, monkeypatch):
+    streams = []
+
+    class RecordingStream(WavAudioStream):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            streams.append(self)
+
+    monkeypatch.setattr(audio_cache, "FfmpegAudioStream", RecordingStream)
+    path = wav_file(120)
+    progress = []
+    engine = make_engine()
+    engine.transcribe(path, on_segment=lambda segment: progress.append((streams[-1].eof, streams[-1].samples_read)))
+    # Первый сегмент выдан, когда файл прочитан только на первое окно
+    assert progress and not progress[0][0]
+    assert progress[0][1] < 60 * SAMPLE_RATE
+    cached = engine_options["audio_cache"].get(engine._file_hash(path))
+    assert cached is not None and not cached.trimmed
+    np.testing.assert_allclose(cached.samples, read_wav(path))
+    assert engine.prepare_audio(path) is not None
+
+
+def test_cancelled_stream_leaves_no_cache_entry(tmp_path, wav_file, no_ffmpeg):
+    cache = AudioCache(str(tmp_path / "audio"))
+    with cache.open_stream(wav_file(30), "hash") as stream:
+        stream.read(SAMPLE_RATE)
+    assert cache.get("hash") is None
+    assert not list((tmp_path / "audio").iterdir())
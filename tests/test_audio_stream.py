@@ -0,0 +1,49 @@
+import os
+import stat
+import sys
+
+import numpy as np
+import pytest
+from whisper.audio import SAMPLE_RATE
+
+from audio_stream import FfmpegAudioStream
+
+FAKE_FFMPEG = """#!{python}
+import sys
+sys.stderr.write("warning: damaged frame\\n" * {warnings})
+sys.stderr.flush()
+sys.stdout.buffer.write(b"\\x00\\x10" * {samples})
+sys.stdout.flush()
+sys.exit({returncode})
+"""
+
+
+def fake_ffmpeg(tmp_path, samples, warnings=0, returncode=0):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable, warnings=warnings, samples=samples,
+                                       returncode=returncode))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def read_all(stream, block=SAMPLE_RATE):
+    blocks = []
+    while not stream.eof:
+        blocks.append(stream.read(block))
+    return np.concatenate(blocks)
+
+
+def test_many_warnings_do_not_block_the_stream(tmp_path):
+    ffmpeg = fake_ffmpeg(tmp_path, samples=3 * SAMPLE_RATE, warnings=20000)
+    with FfmpegAudioStream("input.mp3", ffmpeg=ffmpeg) as stream:
+        samples = read_all(stream)
+    assert len(samples) == 3 * SAMPLE_RATE
+    assert stream.samples_read == 3 * SAMPLE_RATE
+
+
+def test_failure_mid_stream_is_an_error(tmp_path):
+    ffmpeg = fake_ffmpeg(tmp_path, samples=SAMPLE_RATE + 100, warnings=1, returncode=1)
+    with FfmpegAudioStream("input.mp3", ffmpeg=ffmpeg) as stream:
+        with pytest.raises(RuntimeError, match="damaged frame"):
+            read_all(stream)
+        assert stream.samples_read == SAMPLE_RATE + 100
@@ -0,0 +1,57 @@
+import pytest
+import torch
+
+import batch_sizing
+from batch_sizing import BatchSizer
+
+GB = 1024**3
+
+
+class FakeCudaMemory:
+    """Счетчики памяти CUDA: allocated - занято сейчас, peak - максимум с начала работы"""
+
+    def __init__(self, monkeypatch, headroom):
+        self.allocated = 1 * GB
+        self.peak = self.allocated
+        monkeypatch.setattr(torch.cuda, "memory_allocated", lambda device=None: self.allocated)
+        monkeypatch.setattr(torch.cuda, "max_memory_allocated", lambda device=None: self.peak)
+        monkeypatch.setattr(torch.cuda, "reset_peak_memory_stats", self.reset)
+        monkeypatch.setattr(batch_sizing, "memory_headroom", lambda device: headroom)
+
+    def reset(self, device=None):
+        raise AssertionError("Сброс пика стер бы пик MemoryProfiler")
+
+    def run_batch(self, used):
+        self.peak = max(self.peak, self.allocated + used)
+
+
+@pytest.mark.parametrize("headroom, expected", [(10 * GB, 8), (1 * GB, 4)])
+def test_batch_grows_by_headroom_without_resetting_peak(monkeypatch, headroom, expected):
+    memory = FakeCudaMemory(monkeypatch, headroom)
+    sizer = BatchSizer("cuda:0", batch_size=4)
+    with sizer.measure(4):
+        memory.run_batch(2 * GB)
+    assert sizer.batch_size == expected
+
+
+def test_earlier_peak_makes_the_estimate_conservative(monkeypatch):
+    memory = FakeCudaMemory(monkeypatch, headroom=5 * GB)
+    # Пик от другой работы (например, выравнивания слов) выше, чем нужно батчу
+    memory.run_batch(8 * GB)
+    sizer = BatchSizer("cuda:0", batch_size=4)
+    with sizer.measure(4):
+        memory.run_batch(1 * GB)
+    assert sizer.batch_size == 4
+
+
+def test_out_of_memory_steps_down_batch_then_beam():
+    sizer = BatchSizer("cpu", batch_size=2, beam_size=4)
+    assert not sizer.adaptive
+    sizer.step_down()
+    assert (sizer.batch_size, sizer.beam_size, sizer.ceiling) == (1, 4, 2)
+    sizer.step_down()
+    sizer.step_down()
+    assert (sizer.batch_size, sizer.beam_size) == (1, None)
+    assert not sizer.can_step_down()
+    with pytest.raises(ValueError):
+        sizer.step_down()
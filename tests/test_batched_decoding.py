@@ -0,0 +1,58 @@
+import dataclasses
+
+import pytest
+import torch
+
+import batched_decoding
+from batch_sizing import BatchSizer
+from batched_decoding import transcribe_batched
+from conftest import synth_speech, tiny_whisper
+
+
+@pytest.fixture(scope="module")
+def model():
+    return tiny_whisper(0)
+
+
+def with_no_speech_prob(monkeypatch, no_speech_prob):
+    decode_chunks = batched_decoding.decode_chunks
+
+    def patched(*args, **kwargs):
+        return [dataclasses.replace(result, no_speech_prob=no_speech_prob) for result in decode_chunks(*args, **kwargs)]
+
+    monkeypatch.setattr(batched_decoding, "decode_chunks", patched)
+
+
+@pytest.mark.parametrize("logprob_threshold", [-1.0, None])
+def test_speech_is_kept(model, monkeypatch, logprob_threshold):
+    with_no_speech_prob(monkeypatch, 0.01)
+    result = transcribe_batched(model, synth_speech(30), language="en", batch_size=2,
+                                logprob_threshold=logprob_threshold)
+    assert result["segments"]
+
+
+def test_silence_is_skipped_without_logprob_threshold(model, monkeypatch):
+    with_no_speech_prob(monkeypatch, 0.99)
+    result = transcribe_batched(model, synth_speech(30), language="en", batch_size=2, logprob_threshold=None)
+    assert result["segments"] == []
+
+
+def test_out_of_memory_retries_same_chunks_with_smaller_batch(model, monkeypatch):
+    decode_chunks = batched_decoding.decode_chunks
+    calls = []
+
+    def out_of_memory_once(model, batch, *args, **kwargs):
+        calls.append([chunk.length for chunk in batch])
+        if len(calls) == 1:
+            raise torch.OutOfMemoryError("CUDA out of memory")
+        return decode_chunks(model, batch, *args, **kwargs)
+
+    monkeypatch.setattr(batched_decoding, "decode_chunks", out_of_memory_once)
+    with_no_speech_prob(monkeypatch, 0.01)
+    sizer = BatchSizer("cpu", batch_size=2, adaptive=False)
+    result = transcribe_batched(model, synth_speech(70), language="en", batch_sizer=sizer)
+    assert len(calls[0]) == 2
+    # Окна упавшего батча повторяются по одному, в том же порядке
+    assert calls[1] + calls[2] == calls[0]
+    assert sizer.batch_size == 1
+    assert result["segments"]
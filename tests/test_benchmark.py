@@ -0,0 +1,112 @@
+import json
+import os
+import wave
+
+import pytest
+from whisper.audio import SAMPLE_RATE
+
+import benchmark
+from benchmark import check_startup_budget, make_corpus, run_benchmark, summarize, word_error_rate
+
+
+@pytest.mark.parametrize("reference, hypothesis, expected", [
+    ("the cat sat", "the cat sat", 0.0),
+    ("The cat, sat.", "the cat sat", 0.0),
+    ("the cat sat", "the dog sat", 1 / 3),
+    ("the cat sat", "the cat sat down", 1 / 3),
+    ("the cat sat", "the sat", 1 / 3),
+    ("a b c d", "a x c d e", 0.5),
+    ("", "", 0.0),
+    ("", "word", 1.0),
+    ("one two", "", 1.0),
+])
+def test_word_error_rate(reference, hypothesis, expected):
+    assert word_error_rate(reference, hypothesis) == pytest.approx(expected)
+
+
+def test_summarize_totals_stages_and_decoder_speed():
+    runs = [
+        {"audio_seconds": 10.0, "wall_seconds": 2.0,
+         "stages": {"mel": {"seconds": 0.5}, "decoder": {"seconds": 1.0}},
+         "decoding": {"tokens": 100, "seconds": 1.0, "drafted": 10, "accepted": 8}},
+        {"audio_seconds": 30.0, "wall_seconds": 4.0, "stages": {"mel": {"seconds": 0.25}}, "decoding": None},
+    ]
+    assert summarize(runs) == {
+        "audio_seconds": 40.0,
+        "wall_seconds": 6.0,
+        "rtf": 0.15,
+        "stages": {"mel": 0.75, "decoder": 1.0},
+        "decoding": {"tokens": 100, "tokens_per_second": 100.0, "acceptance_rate": 0.8},
+    }
+    assert summarize([])["rtf"] is None
+
+
+def test_corpus_is_deterministic_with_requested_durations(tmp_path):
+    first = make_corpus(str(tmp_path / "a"), durations=(3, 5))
+    second = make_corpus(str(tmp_path / "b"), durations=(3, 5))
+    for path, other, duration in zip(first, second, (3, 5)):
+        with open(path, "rb") as f, open(other, "rb") as g:
+            assert f.read() == g.read()
+        with wave.open(path) as f:
+            assert (f.getframerate(), f.getnchannels(), f.getnframes()) == (SAMPLE_RATE, 1, duration * SAMPLE_RATE)
+    # Разные файлы корпуса - разные сигналы
+    with open(first[0], "rb") as f, open(first[1], "rb") as g:
+        assert f.read()[:SAMPLE_RATE] != g.read()[:SAMPLE_RATE]
+    # Готовые файлы переиспользуются
+    mtime = os.stat(first[0]).st_mtime_ns
+    assert make_corpus(str(tmp_path / "a"), durations=(3,)) == first[:1]
+    assert os.stat(first[0]).st_mtime_ns == mtime
+
+
+def test_startup_budget_reports_heavy_imports_and_slow_paint():
+    report = {
+        "imports": {"transcriber_cli": {"seconds": 0.5, "loads_torch": False},
+                    "transcriber_app": {"seconds": 2.0, "loads_torch": True}},
+        "gui": {"first_paint_seconds": 3.0},
+    }
+    assert check_startup_budget(report, max_import_seconds=1.0, max_first_paint_seconds=2.5) == [
+        "transcriber_app импортирует torch при запуске",
+        "импорт transcriber_app: 2.00 с > 1.00 с",
+        "первая отрисовка окна: 3.00 с > 2.50 с",
+    ]
+    assert check_startup_budget(report) == ["transcriber_app импортирует torch при запуске"]
+    assert check_startup_budget({"imports": {"transcriber_cli": {"error": "нет модуля"}}}, 1.0, 1.0) == []
+
+
+def test_report_with_tiny_model(tiny_models, tmp_path):
+    paths = make_corpus(str(tmp_path / "corpus"), durations=(5, 12))
+    output_path = str(tmp_path / "report.json")
+    logs = []
+    run_benchmark(["tiny-random"], ["cpu"], paths, output_path=output_path, log_callback=logs.append,
+                  precisions=["fp32"], language="en")
+    with open(output_path, encoding="utf-8") as f:
+        report = json.load(f)
+
+    assert [entry["file"] for entry in report["corpus"]] == [os.path.basename(path) for path in paths]
+    assert report["environment"]["torch"]
+    result, = report["results"]
+    assert "error" not in result, result.get("error")
+    assert (result["model"], result["device"], result["precision"]) == ("tiny-random", "cpu", "fp32")
+    assert "texts" not in result
+    assert [run["audio_seconds"] for run in result["runs"]] == [5.0, 12.0]
+    for run in result["runs"]:
+        assert run["rtf"] == pytest.approx(run["wall_seconds"] / run["audio_seconds"], rel=1e-2)
+        assert run["stages"]["decoder"]["seconds"] > 0
+    summary = result["summary"]
+    assert summary["audio_seconds"] == 17.0
+    assert summary["rtf"] == pytest.approx(summary["wall_seconds"] / 17.0, rel=1e-2)
+    assert summary["decoding"]["tokens"] > 0
+    assert any("tiny-random" in text for text in logs)
+
+
+def test_failed_configuration_does_not_stop_the_rest(tiny_models, tmp_path, monkeypatch):
+    def fail(model_name, *args, **kwargs):
+        if model_name == "broken":
+            raise Exception("нет такой модели")
+        return {"model": model_name, "device": "cpu", "precision": "fp32", "summary": {"wall_seconds": 1.0},
+                "texts": {}}
+
+    monkeypatch.setattr(benchmark, "benchmark_model", fail)
+    report = run_benchmark(["broken", "tiny-random"], ["cpu"], [], log_callback=lambda text: None,
+                           precisions=["fp32"])
+    assert [result.get("error") for result in report["results"]] == ["нет такой модели", None]
@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+import pytest
+
+import diarization
+from diarization import DiarizationTimeout, agglomerative_clusters, diarize
+
+
+class FakeEmbedder:
+    name = "fake-1"
+    metric = "rms"
+    threshold = 0.35
+
+    def embed(self, clips):
+        return np.ones((len(clips), 4))
+
+
+def segments(count, length=2.0):
+    return [{"start": i * length, "end": (i + 1) * length, "text": "x"} for i in range(count)]
+
+
+def test_clusters_split_distant_groups():
+    points = np.array([[0.0], [0.1], [5.0], [5.1]])
+    labels = agglomerative_clusters(np.abs(points - points.T))
+    assert labels.tolist() == [0, 0, 1, 1]
+
+
+def test_clustering_stops_at_deadline():
+    distances = np.random.default_rng(0).random((50, 50))
+    with pytest.raises(DiarizationTimeout):
+        agglomerative_clusters(distances + distances.T, num_speakers=1, deadline=time.perf_counter() - 1)
+
+
+def test_time_budget_bounds_clustering_of_cached_embeddings(monkeypatch):
+    """Эмбеддинги из кэша не читают аудио, но кластеризация все равно ограничена бюджетом"""
+    class Cache:
+        def make_key(self, audio_hash, embedder_name, segments):
+            return "key"
+
+        def get(self, key):
+            return np.random.default_rng(0).random((40, 4))
+
+    clock = iter(range(0, 1000, 10))
+    monkeypatch.setattr(diarization.time, "perf_counter", lambda: float(next(clock)))
+    items = segments(40)
+    with pytest.raises(DiarizationTimeout):
+        diarize(None, items, embedder=FakeEmbedder(), cache=Cache(), audio_hash="hash", time_budget=5)
+    assert all("speaker" not in segment for segment in items)
@@ -0,0 +1,88 @@
+import io
+import json
+import os
+
+import pytest
+
+from exporters import TranscriptExporter, export_result, format_subtitle_timestamp, write_result
+
+RESULT = {
+    "language": "ru",
+    "text": " Привет, мир. Вторая\nстрока",
+    "speakers": ["Спикер 1", "Спикер 2"],
+    "segments": [
+        {"id": 0, "start": 0.0, "end": 2.5, "text": " Привет, мир.", "speaker": "Спикер 1"},
+        {"id": 1, "start": 2.5, "end": 3.0, "text": "  "},
+        {"id": 2, "start": 3661.125, "end": 3663.25, "text": " Вторая\nстрока\tс табом", "speaker": "Спикер 2"},
+    ],
+}
+
+
+def render(export_format):
+    f = io.StringIO()
+    write_result(RESULT, export_format, f)
+    return f.getvalue()
+
+
+@pytest.mark.parametrize("seconds, marker, expected", [
+    (0.0, ",", "00:00:00,000"),
+    (3661.125, ",", "01:01:01,125"),
+    (59.9996, ".", "00:01:00.000"),
+    (-0.2, ",", "00:00:00,000"),
+])
+def test_subtitle_timestamp(seconds, marker, expected):
+    assert format_subtitle_timestamp(seconds, marker) == expected
+
+
+def test_srt():
+    assert render("srt") == (
+        "1\n00:00:00,000 --> 00:00:02,500\nСпикер 1: Привет, мир.\n\n"
+        "2\n01:01:01,125 --> 01:01:03,250\nСпикер 2: Вторая строка с табом\n\n"
+    )
+
+
+def test_vtt():
+    assert render("vtt") == (
+        "WEBVTT\n\n"
+        "00:00:00.000 --> 00:00:02.500\n<v Спикер 1>Привет, мир.\n\n"
+        "01:01:01.125 --> 01:01:03.250\n<v Спикер 2>Вторая строка с табом\n\n"
+    )
+
+
+def test_tsv():
+    assert render("tsv") == (
+        "start\tend\ttext\n"
+        "0\t2500\tСпикер 1: Привет, мир.\n"
+        "3661125\t3663250\tСпикер 2: Вторая строка с табом\n"
+    )
+
+
+def test_json_is_valid_and_complete():
+    data = json.loads(render("json"))
+    assert data["language"] == "ru"
+    assert data["text"] == RESULT["text"]
+    assert data["speakers"] == RESULT["speakers"]
+    assert [segment["id"] for segment in data["segments"]] == [0, 1, 2]
+
+
+def test_streaming_export_matches_result_export(tmp_path):
+    streamed = {name: str(tmp_path / f"streamed.{name}") for name in ("srt", "vtt", "tsv", "json")}
+    with TranscriptExporter(streamed) as exporter:
+        for segment in RESULT["segments"]:
+            exporter.write_segment(segment)
+        exporter.finish(RESULT)
+    for name, path in streamed.items():
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == render(name)
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in streamed.values())
+
+
+def test_interrupted_export_leaves_no_files(tmp_path):
+    paths = {"srt": str(tmp_path / "a.srt"), "json": str(tmp_path / "a.json")}
+    with pytest.raises(RuntimeError):
+        with TranscriptExporter(paths) as exporter:
+            exporter.write_segment(RESULT["segments"][0])
+            raise RuntimeError("decoder failed")
+    assert os.listdir(tmp_path) == []
+    assert export_result(RESULT, paths) == paths
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "a.srt"]
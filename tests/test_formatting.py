@@ -0,0 +1,25 @@
+from formatting import RenderCache, format_result
+
+
+def make_result(index):
+    text = f" Запись номер {index:03d}."
+    return {"text": text, "segments": [{"start": 0.0, "end": 1.0, "text": text}], "language": "ru"}
+
+
+def test_render_cache_never_returns_blocks_of_a_collected_result():
+    cache = RenderCache()
+    rendered = []
+    for index in range(200):
+        result = make_result(index)
+        rendered.append(format_result(result, cache=cache))
+        # Предыдущий результат освобожден: его id могут достаться спискам и тексту следующего
+        del result
+    assert rendered == [f"[00:00.000 --> 00:01.000] Запись номер {index:03d}." for index in range(200)]
+
+
+def test_render_cache_renders_only_appended_segments():
+    cache = RenderCache()
+    result = make_result(0)
+    assert format_result(result, cache=cache).count("\n") == 0
+    result["segments"].append({"start": 1.0, "end": 2.0, "text": " Продолжение."})
+    assert format_result(result, cache=cache).splitlines()[1].endswith("Продолжение.")
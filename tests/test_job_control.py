@@ -0,0 +1,182 @@
+import collections
+import queue
+import threading
+import time
+
+import pytest
+
+from job_control import JobControl, PriorityJobQueue, TranscriptionCancelled
+
+
+class GatedRunner:
+    """run_job для PriorityJobQueue: задание проверяет control, пока тест не откроет его ворота"""
+
+    def __init__(self):
+        self.started = queue.Queue()
+        self._gates = collections.defaultdict(threading.Event)
+        self._lock = threading.Lock()
+
+    def gate(self, path):
+        with self._lock:
+            return self._gates[path]
+
+    def release(self, *paths):
+        for path in paths:
+            self.gate(path).set()
+
+    def __call__(self, job, control):
+        self.started.put(job["path"])
+        gate = self.gate(job["path"])
+        while not gate.wait(0.01):
+            control.check()
+        control.check()
+        return job["path"]
+
+    def next_started(self):
+        return self.started.get(timeout=10)
+
+
+@pytest.fixture
+def job_queue():
+    queues = []
+
+    def make(**options):
+        runner = GatedRunner()
+        jobs = PriorityJobQueue(runner, **options)
+        queues.append(jobs)
+        return jobs, runner
+
+    yield make
+    for jobs in queues:
+        jobs.stop(timeout=10)
+
+
+def wait_status(jobs, job_id, status, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if jobs.job(job_id)["status"] == status:
+            return jobs.job(job_id)
+        time.sleep(0.01)
+    raise AssertionError(f"Задание {job_id}: {jobs.job(job_id)['status']}, ожидался {status}")
+
+
+def test_priority_order_and_fifo_within_priority(job_queue):
+    jobs, runner = job_queue(preempt=False)
+    ids = {path: jobs.add(path, priority) for path, priority in [("b", 0), ("c", 1), ("d", 0), ("e", 1)]}
+    runner.release("b", "c", "d", "e")
+    jobs.start()
+    assert [runner.next_started() for _ in range(4)] == ["c", "e", "b", "d"]
+    for job_id in ids.values():
+        assert wait_status(jobs, job_id, "finished")["result"] is not None
+
+
+def test_higher_priority_preempts_and_requeues_running_job(job_queue):
+    jobs, runner = job_queue()
+    jobs.start()
+    low = jobs.add("low", 0)
+    assert runner.next_started() == "low"
+    high = jobs.add("high", 5)
+    assert runner.next_started() == "high"
+    assert jobs.job(low)["status"] == "queued"
+    runner.release("high")
+    wait_status(jobs, high, "finished")
+    # Вытесненное задание запускается снова и доходит до конца
+    assert runner.next_started() == "low"
+    runner.release("low")
+    assert wait_status(jobs, low, "finished")["result"] == "low"
+
+
+def test_raising_queued_priority_preempts_running_job(job_queue):
+    jobs, runner = job_queue()
+    jobs.start()
+    first = jobs.add("first", 1)
+    assert runner.next_started() == "first"
+    second = jobs.add("second", 0)
+    jobs.set_priority(second, 2)
+    assert runner.next_started() == "second"
+    assert jobs.job(first)["status"] == "queued"
+    runner.release("first", "second")
+    wait_status(jobs, first, "finished")
+    wait_status(jobs, second, "finished")
+
+
+def test_cancel_and_remove_queued_versus_running(job_queue):
+    jobs, runner = job_queue()
+    jobs.start()
+    running = jobs.add("running")
+    assert runner.next_started() == "running"
+    queued = jobs.add("queued")
+    jobs.cancel(queued)
+    assert jobs.job(queued)["status"] == "cancelled"
+    jobs.remove(queued)
+    assert jobs.job(queued) is None
+
+    with pytest.raises(ValueError):
+        jobs.remove(running)
+    jobs.cancel(running)
+    assert "finished" in wait_status(jobs, running, "cancelled")
+    assert jobs.running_job() is None
+    jobs.remove(running)
+    assert jobs.jobs() == []
+
+
+def test_pause_blocks_check_until_resume():
+    paused = threading.Event()
+    control = JobControl(on_pause=paused.set)
+    control.pause()
+    passed = threading.Event()
+
+    def decoder():
+        control.check()
+        passed.set()
+
+    thread = threading.Thread(target=decoder, daemon=True)
+    thread.start()
+    assert paused.wait(5)
+    assert not passed.wait(0.2)
+    control.resume()
+    assert passed.wait(5)
+    thread.join(5)
+
+
+def test_cancel_wakes_paused_check():
+    control = JobControl()
+    control.pause()
+    errors = []
+
+    def decoder():
+        try:
+            control.check()
+        except TranscriptionCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=decoder, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    control.cancel()
+    thread.join(5)
+    assert len(errors) == 1 and not control.paused
+
+
+def test_paused_jobs_wait_for_resume(job_queue):
+    pauses = []
+    jobs, runner = job_queue(on_pause=lambda: pauses.append(True))
+    jobs.start()
+    running = jobs.add("running")
+    assert runner.next_started() == "running"
+    jobs.pause(running)
+    assert jobs.job(running)["status"] == "paused"
+    queued = jobs.add("queued")
+    jobs.pause(queued)
+    # Снятие ворот не завершает задание на паузе: поток ждет в control.check()
+    runner.release("running", "queued")
+    time.sleep(0.2)
+    assert pauses and jobs.job(running)["status"] == "paused"
+    jobs.resume(running)
+    wait_status(jobs, running, "finished")
+    # Задание на паузе в очереди не берется, пока его не продолжат
+    with pytest.raises(queue.Empty):
+        runner.started.get(timeout=0.2)
+    jobs.resume(queued)
+    assert runner.next_started() == "queued"
+    wait_status(jobs, queued, "finished")
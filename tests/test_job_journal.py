@@ -0,0 +1,70 @@
+import functools
+import glob
+import os
+
+import pytest
+from whisper.audio import N_SAMPLES
+
+import batched_decoding
+import transcriber_core
+from job_journal import JobJournal
+
+MODES = {
+    "sequential": {},
+    "batched": {"batched": True, "batch_size": 1, "adaptive_batch_size": False},
+}
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(count):
+    segments = []
+
+    def on_segment(segment):
+        segments.append(segment)
+        if len(segments) == count:
+            raise Crash()
+    return on_segment
+
+
+def texts(result):
+    return [(round(segment["start"], 2), segment["text"]) for segment in result["segments"]]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_resume_after_crash(make_engine, wav_file, tmp_path, monkeypatch, mode):
+    # Пакетный режим пишет контрольную точку после блока в 10 минут: в тесте блоки по 30 секунд
+    monkeypatch.setattr(transcriber_core, "transcribe_batched",
+                        functools.partial(batched_decoding.transcribe_batched, block_samples=N_SAMPLES))
+    path = wav_file(150)
+    expected = make_engine(transcript_cache=None, job_journal=None, use_journal=False, **MODES[mode]).transcribe(path)
+    assert len(expected["segments"]) > 3
+
+    journal = JobJournal(str(tmp_path / "journal"))
+    crashing = make_engine(transcript_cache=None, job_journal=journal, **MODES[mode])
+    with pytest.raises(Crash):
+        crashing.transcribe(path, on_segment=crash_after(len(expected["segments"]) // 2))
+    assert glob.glob(os.path.join(journal.journal_dir, "*.jsonl"))
+
+    logs = []
+    engine = make_engine(transcript_cache=None, job_journal=journal, log_callback=logs.append, **MODES[mode])
+    result = engine.transcribe(path)
+    assert any("♻️" in line for line in logs)
+    assert texts(result) == texts(expected)
+    assert not glob.glob(os.path.join(journal.journal_dir, "*.jsonl"))
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    journal = JobJournal(str(tmp_path))
+    journal.start("job", "a.wav")
+    journal.checkpoint("job", [{"id": 0, "start": 0.0, "end": 2.0, "text": " one"}], {"seek": 3000})
+    with open(journal._path("job"), "a", encoding="utf-8") as f:
+        f.write('{"type":"checkpoint","segments":[{"id":1')
+
+    checkpoint = journal.load("job")
+    assert checkpoint["state"] == {"seek": 3000}
+    assert [segment["text"] for segment in checkpoint["segments"]] == [" one"]
+    journal.checkpoint("job", [{"id": 1, "start": 2.0, "end": 4.0, "text": " two"}], {"seek": 6000})
+    assert [segment["text"] for segment in journal.load("job")["segments"]] == [" one", " two"]
@@ -0,0 +1,82 @@
+import os
+import shutil
+import stat
+import sys
+
+import pytest
+import torch
+
+import job_scheduler
+from conftest import TINY_DIMS, tiny_whisper
+
+FAKE_FFMPEG = f"""#!{sys.executable}
+# ffmpeg для тестов: WAV 16 кГц моно 16 бит отдается в stdout как s16le
+import sys
+import wave
+
+args = sys.argv[1:]
+start = float(args[args.index("-ss") + 1]) if "-ss" in args else 0.0
+try:
+    f = wave.open(args[args.index("-i") + 1])
+except (OSError, wave.Error) as e:
+    sys.stderr.write(str(e))
+    sys.exit(1)
+f.setpos(int(start * f.getframerate()))
+sys.stdout.buffer.write(f.readframes(f.getnframes()))
+"""
+
+
+@pytest.fixture
+def worker_options(tmp_path, monkeypatch):
+    """Параметры движка для настоящих рабочих процессов: чекпойнт tiny-модели на диске вместо скачивания.
+
+    Рабочие запускаются через spawn и не видят подмен из тестового процесса, поэтому модель
+    передается путем к файлу, а без ffmpeg в PATH ставится заглушка, читающая WAV.
+    """
+    checkpoint = tmp_path / "tiny-random.pt"
+    torch.save({"dims": TINY_DIMS, "model_state_dict": tiny_whisper(0).state_dict()}, checkpoint)
+    # Кэш моделей и журналы рабочих - во временном каталоге
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    if shutil.which("ffmpeg") is None:
+        if os.name == "nt":
+            pytest.skip("ffmpeg не найден")
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        script = bin_dir / "ffmpeg"
+        script.write_text(FAKE_FFMPEG)
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    return {"model_name": str(checkpoint), "language": "en", "use_cache": False, "use_journal": False}
+
+
+def test_cpu_workers_share_jobs_and_report_failures(worker_options, wav_file, tmp_path):
+    paths = [wav_file(20, seed=seed) for seed in range(3)]
+    paths.insert(1, str(tmp_path / "missing.wav"))
+    events = []
+    states = job_scheduler.JobScheduler(["cpu", "cpu"], worker_options, on_event=events.append).run(paths)
+
+    assert [states[job_id]["status"] for job_id in range(4)] == ["finished", "failed", "finished", "finished"]
+    for job_id in (0, 2, 3):
+        assert states[job_id]["result"]["segments"]
+    assert "missing.wav" in states[1]["error"]
+    assert [event["job_id"] for event in events if event["type"] == "failed"] == [1]
+    assert {event["worker"] for event in events if event["type"] == "started"} == {0, 1}
+    assert events[-1]["type"] == "done"
+
+
+def test_language_grouping_waits_for_every_detection(worker_options, wav_file):
+    paths = [wav_file(5, seed=seed) for seed in range(3)]
+    events = []
+    states = job_scheduler.JobScheduler(["cpu", "cpu"], {**worker_options, "language": None},
+                                        on_event=events.append).run(paths, group_languages=True)
+
+    groups = [event["groups"] for event in events if event["type"] == "languages"]
+    assert len(groups) == 1
+    assert None not in groups[0]
+    assert sorted(job_id for job_ids in groups[0].values() for job_id in job_ids) == [0, 1, 2]
+    # Транскрибация начинается только после определения языка всех файлов
+    first_started = next(index for index, event in enumerate(events) if event["type"] == "started")
+    assert first_started > next(index for index, event in enumerate(events) if event["type"] == "languages")
+    for job_id, state in states.items():
+        assert state["status"] == "finished" and state["language"]
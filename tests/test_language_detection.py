@@ -0,0 +1,58 @@
+import language_detection
+from conftest import synth_speech, tiny_whisper
+from streaming_decoder import StreamingTranscriber, dominant_language
+
+
+def stub_detector(model, languages):
+    """Детектор модели отвечает языками из списка по очереди окон (последний повторяется)"""
+    calls = []
+
+    def detect_language(mel):
+        language = languages[min(len(calls), len(languages) - 1)]
+        calls.append(language)
+        return None, {"en": 0.05, "de": 0.05, language: 0.9}
+
+    model.detect_language = detect_language
+    return calls
+
+
+def test_detect_language_reads_only_the_start():
+    model = tiny_whisper()
+    calls = stub_detector(model, ["de"])
+    assert language_detection.detect_language(model, synth_speech(90)) == ("de", 0.9)
+    assert calls == ["de"]
+
+
+def test_language_per_window_is_recorded_on_segments():
+    model = tiny_whisper()
+    calls = stub_detector(model, ["en", "de"])
+    result = StreamingTranscriber(model, language_per_window=True).transcribe(synth_speech(90))
+    assert len(calls) >= 2
+    languages = [segment["language"] for segment in result["segments"]]
+    assert languages[0] == "en" and languages[-1] == "de"
+    # После смены язык не возвращается: сегменты идут одним блоком на язык
+    assert languages == sorted(languages, key=["en", "de"].index)
+    assert result["language"] == dominant_language(result["segments"])
+
+
+def test_dominant_language_weights_by_duration_of_spoken_segments():
+    segments = [{"start": 0.0, "end": 10.0, "text": " Hello", "language": "en"},
+                {"start": 10.0, "end": 14.0, "text": " Hallo", "language": "de"},
+                {"start": 14.0, "end": 20.0, "text": " Welt", "language": "de"},
+                # Сегменты без текста не считаются
+                {"start": 20.0, "end": 60.0, "text": " ", "language": "de"}]
+    assert dominant_language(segments) == "en"
+    assert dominant_language([]) is None
+
+
+def test_group_by_language_keeps_first_seen_order_and_puts_failures_last():
+    languages = {"a": "ru", "b": "en", "c": "ru", "e": "en"}
+
+    def detect(path):
+        if path not in languages:
+            raise RuntimeError("ffmpeg")
+        return languages[path]
+
+    assert language_detection.group_by_language(["d", "a", "b", "c", "e"], detect) == \
+        {"ru": ["a", "c"], "en": ["b", "e"], None: ["d"]}
+
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+import memory_profiler
+from memory_profiler import MemoryProfiler
+
+
+class FakeProcess:
+    """Часы, процессорное время и RSS процесса, которые задает тест"""
+
+    def __init__(self, monkeypatch, rss=(100,)):
+        self.now = 0.0
+        self.cpu = 0.0
+        self.rss = list(rss)
+        monkeypatch.setattr(memory_profiler, "time", self)
+        monkeypatch.setattr(memory_profiler, "process_cpu_seconds", lambda: self.cpu)
+        monkeypatch.setattr(memory_profiler, "process_rss_bytes",
+                            lambda: self.rss.pop(0) if len(self.rss) > 1 else self.rss[0])
+
+    def perf_counter(self):
+        return self.now
+
+    def advance(self, seconds, cpu_seconds=0.0):
+        self.now += seconds
+        self.cpu += cpu_seconds
+
+
+def test_overflow_halves_samples_and_doubles_interval(monkeypatch):
+    process = FakeProcess(monkeypatch)
+    profiler = MemoryProfiler("cpu", interval=0.5, max_samples=4)
+    for _ in range(5):
+        process.advance(1.0)
+        profiler.sample()
+    # Пятая точка переполнила ряд: остались первая, третья и пятая
+    assert [sample["time"] for sample in profiler.samples] == [1.0, 3.0, 5.0]
+    assert profiler.interval == 1.0
+    for _ in range(2):
+        process.advance(1.0)
+        profiler.sample()
+    assert [sample["time"] for sample in profiler.samples] == [1.0, 5.0, 7.0]
+    assert profiler.interval == 2.0
+
+
+def test_cpu_backend_records_rss_utilization_and_peak(monkeypatch):
+    process = FakeProcess(monkeypatch, rss=[100, 300, 200])
+    profiler = MemoryProfiler("cpu")
+    assert profiler.backend == "rss"
+    for cpu_seconds in (0.5, 2.0, 0.0):
+        process.advance(1.0, cpu_seconds)
+        profiler.sample()
+    assert [sample["allocated"] for sample in profiler.samples] == [100, 300, 200]
+    assert [sample["peak"] for sample in profiler.samples] == [100, 300, 300]
+    # Процент одного ядра: 2 секунды процессора за секунду - 200
+    assert [sample["utilization"] for sample in profiler.samples] == [50.0, 200.0, 0.0]
+    assert all(sample["reserved"] is None for sample in profiler.samples)
+    assert profiler.peak_bytes() == 300
+
+
+def test_unknown_rss_keeps_zero_peak(monkeypatch):
+    FakeProcess(monkeypatch, rss=[None])
+    profiler = MemoryProfiler("cpu")
+    profiler.sample()
+    assert profiler.samples[0]["allocated"] is None
+    assert profiler.peak_bytes() == 0
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="нужен /proc")
+def test_rss_without_psutil_reads_proc(monkeypatch):
+    monkeypatch.setattr(memory_profiler, "psutil", None)
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    rss = memory_profiler.process_rss_bytes()
+    assert rss > 0
+    assert abs(rss - resident_pages * os.sysconf("SC_PAGE_SIZE")) < 64 * 1024**2
+
+
+def test_start_and_stop_sample_in_background():
+    profiler = MemoryProfiler("cpu", interval=0.01, max_samples=4)
+    with profiler:
+        time.sleep(0.3)
+    result = profiler.as_dict()
+    # Начальная и конечная точки плюс фоновые: ряд переполнялся и прореживался
+    assert 2 <= len(result["samples"]) <= 4
+    assert result["interval"] > 0.01
+    times = [sample["time"] for sample in result["samples"]]
+    assert times == sorted(times)
+    assert result["peak_bytes"] == max(sample["peak"] for sample in result["samples"]) > 0
+    # Повторная остановка ничего не добавляет, повторный запуск начинает ряд заново
+    assert profiler.stop() == result
+    profiler.start()
+    assert profiler.samples[0]["time"] == 0.0
+    profiler.stop()
@@ -0,0 +1,42 @@
+import torch
+
+from model_pool import ModelPool
+
+
+def loader(loads, features=256):
+    def load(model_name, device, precision):
+        loads.append((model_name, precision))
+        return torch.nn.Linear(features, features)
+    return load
+
+
+def test_pool_reuses_and_evicts_least_recently_used():
+    loads = []
+    pool = ModelPool(max_models=2)
+    small = pool.get("small", "cpu", "fp32", loader(loads))
+    pool.get("base", "cpu", "fp32", loader(loads))
+    assert pool.get("small", "cpu", "fp32", loader(loads)) is small
+    pool.get("medium", "cpu", "fp32", loader(loads))
+
+    assert loads == [("small", "fp32"), ("base", "fp32"), ("medium", "fp32")]
+    assert pool.loaded() == [("small", "cpu", "fp32"), ("medium", "cpu", "fp32")]
+    assert [entry["hits"] for entry in pool.stats()] == [1, 0]
+
+
+def test_precision_is_part_of_the_key():
+    loads = []
+    pool = ModelPool(max_models=3)
+    pool.get("small", "cpu", "fp32", loader(loads))
+    pool.get("small", "cpu", "int8", loader(loads))
+    assert len(loads) == 2
+    pool.unload("small", "cpu", "fp32")
+    assert pool.loaded() == [("small", "cpu", "int8")]
+
+
+def test_memory_budget_evicts_before_loading():
+    loads = []
+    # Загруженная модель занимает 64 МБ, оценка для новой tiny в fp32 - около 150 МБ
+    pool = ModelPool(max_models=5, memory_budget_gb=0.2)
+    pool.get("tiny", "cpu", "fp32", loader(loads, features=4096))
+    pool.get("tiny.en", "cpu", "fp32", loader(loads, features=4096))
+    assert pool.loaded() == [("tiny.en", "cpu", "fp32")]
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import whisper
+
+from model_resolver import ModelResolver
+
+CHECKPOINT = b"checkpoint weights"
+SHA256 = hashlib.sha256(CHECKPOINT).hexdigest()
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    monkeypatch.setitem(whisper._MODELS, "test-model", f"https://example.invalid/models/{SHA256}/test-model.pt")
+    downloads = []
+
+    def download(url, root, in_memory):
+        downloads.append(url)
+        path = os.path.join(root, os.path.basename(url))
+        with open(path, "wb") as f:
+            f.write(CHECKPOINT)
+        return path
+
+    monkeypatch.setattr(whisper, "_download", download)
+    return downloads
+
+
+def test_local_checkpoint_is_used_without_network(tmp_path, downloads):
+    (tmp_path / "test-model.pt").write_bytes(CHECKPOINT)
+    logs = []
+    path = ModelResolver(str(tmp_path), log_callback=logs.append).resolve("test-model")
+    assert path == str(tmp_path / "test-model.pt")
+    assert downloads == []
+    assert any("🔍" in line for line in logs)
+
+    # Второй запуск сверяет только размер и время изменения по манифесту
+    logs.clear()
+    assert ModelResolver(str(tmp_path), log_callback=logs.append).resolve("test-model") == path
+    assert not any("🔍" in line for line in logs)
+
+
+def test_missing_or_corrupt_checkpoint_is_downloaded(tmp_path, downloads):
+    resolver = ModelResolver(str(tmp_path))
+    path = resolver.resolve("test-model")
+    assert len(downloads) == 1
+
+    with open(path, "wb") as f:
+        f.write(b"truncated")
+    assert ModelResolver(str(tmp_path)).resolve("test-model") == path
+    assert len(downloads) == 2
+    assert open(path, "rb").read() == CHECKPOINT
+
+
+def test_download_failure_names_the_cache(tmp_path, monkeypatch, downloads):
+    def offline(url, root, in_memory):
+        raise OSError("network is unreachable")
+
+    monkeypatch.setattr(whisper, "_download", offline)
+    with pytest.raises(Exception, match="test-model"):
+        ModelResolver(str(tmp_path)).resolve("test-model")
+
+
+def test_local_file_path_is_accepted(tmp_path):
+    path = tmp_path / "custom.pt"
+    path.write_bytes(CHECKPOINT)
+    assert ModelResolver(str(tmp_path)).resolve(str(path)) == str(path)
+    with pytest.raises(Exception, match="не найдена"):
+        ModelResolver(str(tmp_path)).resolve(str(tmp_path / "missing.pt"))
+
+
+def test_parallel_resolvers_keep_each_others_entries(tmp_path, downloads, monkeypatch):
+    names = [f"model-{index}" for index in range(8)]
+    for name in names:
+        monkeypatch.setitem(whisper._MODELS, name, f"https://example.invalid/models/{SHA256}/{name}.pt")
+        (tmp_path / f"{name}.pt").write_bytes(CHECKPOINT)
+    # Как рабочие процессы: каждый со своим ModelResolver проверяет свою модель одновременно с остальными
+    barrier = threading.Barrier(len(names))
+
+    def verify(name):
+        resolver = ModelResolver(str(tmp_path))
+        barrier.wait()
+        return resolver.verify(name, resolver.checkpoint_path(name))
+
+    with ThreadPoolExecutor(len(names)) as pool:
+        assert all(pool.map(verify, names))
+
+    logs = []
+    resolver = ModelResolver(str(tmp_path), log_callback=logs.append)
+    for name in names:
+        resolver.resolve(name)
+    assert not any("🔍" in line for line in logs)
+    # Временные файлы записей не остаются в каталоге
+    assert sorted(os.listdir(resolver.manifest_dir)) == sorted(f"{name}.pt.json" for name in names)
@@ -0,0 +1,54 @@
+import pytest
+import torch
+
+from conftest import tiny_whisper
+from precision import available_precisions, check_precision, load_int8_model, quantized_checkpoint_path
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    model = tiny_whisper(0)
+    path = tmp_path / "tiny-random.pt"
+    torch.save({"dims": model.dims.__dict__, "model_state_dict": model.state_dict()}, path)
+    return str(path), model
+
+
+def test_int8_model_is_cached_and_close_to_fp32(tmp_path, checkpoint):
+    path, model = checkpoint
+    quantized_path = quantized_checkpoint_path(str(tmp_path), path, "0123456789abcdef0123")
+    logs = []
+    quantized = load_int8_model(path, quantized_path, log=logs.append)
+    assert any("🧮" in line for line in logs)
+
+    logs.clear()
+    cached = load_int8_model(path, quantized_path, log=logs.append)
+    assert logs == []
+
+    torch.manual_seed(0)
+    mel = torch.randn(1, 80, 3000)
+    tokens = torch.tensor([[50258, 50259, 50359, 50363]])
+    with torch.no_grad():
+        expected = model(mel, tokens)
+        for int8_model in (quantized, cached):
+            logits = int8_model(mel, tokens)
+            assert (logits - expected).norm() / expected.norm() < 0.1
+
+
+def test_corrupt_cache_is_quantized_again(tmp_path, checkpoint):
+    path, _ = checkpoint
+    quantized_path = quantized_checkpoint_path(str(tmp_path), path, "0123456789abcdef")
+    load_int8_model(path, quantized_path)
+    with open(quantized_path, "wb") as f:
+        f.write(b"garbage")
+    logs = []
+    load_int8_model(path, quantized_path, log=logs.append)
+    assert any("⚠️" in line for line in logs) and any("🧮" in line for line in logs)
+
+
+def test_precision_availability():
+    assert available_precisions("cpu") == ["fp32", "int8", "bf16"]
+    check_precision("int8", "cpu")
+    with pytest.raises(Exception, match="недоступна"):
+        check_precision("fp16", "cpu")
+    with pytest.raises(Exception, match="Неизвестная"):
+        check_precision("fp8", "cpu")
@@ -0,0 +1,76 @@
+import pytest
+import torch
+import whisper
+
+import streaming_decoder
+from conftest import tiny_whisper
+from speculative_decoding import DecodingStats, speculative_decode
+
+
+def peaky_model(seed, n_text_layer):
+    """Случайная модель с крупными эмбеддингами токенов: логиты без почти равных максимумов"""
+    model = tiny_whisper(seed, n_text_layer=n_text_layer)
+    with torch.no_grad():
+        model.decoder.token_embedding.weight.mul_(20)
+    return model
+
+
+@pytest.fixture(scope="module")
+def models():
+    return peaky_model(1, n_text_layer=3), peaky_model(2, n_text_layer=1)
+
+
+@pytest.mark.parametrize("language, without_timestamps, sample_len", [
+    ("en", False, None),
+    ("ru", True, None),
+    (None, False, 40),
+])
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_greedy_decode(models, seed, language, without_timestamps, sample_len):
+    target, draft = models
+    torch.manual_seed(seed)
+    mel = torch.randn(1, 80, 3000)
+    with torch.no_grad():
+        audio_features, draft_features = target.embed_audio(mel), draft.embed_audio(mel)
+    options = whisper.DecodingOptions(language=language, temperature=0.0, fp16=False,
+                                      without_timestamps=without_timestamps, sample_len=sample_len)
+
+    expected = whisper.decode(target, audio_features, options)[0]
+    stats = DecodingStats()
+    result = speculative_decode(target, draft, audio_features, draft_features, options, draft_tokens=4, stats=stats)
+
+    assert result.tokens == expected.tokens
+    assert result.text == expected.text
+    assert result.language == expected.language
+    assert result.avg_logprob == pytest.approx(expected.avg_logprob, abs=1e-3)
+    assert result.no_speech_prob == pytest.approx(expected.no_speech_prob, abs=1e-4, nan_ok=True)
+    assert stats.accepted <= stats.drafted
+
+
+def test_same_model_as_draft_accepts_every_token(models):
+    target, _ = models
+    torch.manual_seed(0)
+    with torch.no_grad():
+        audio_features = target.embed_audio(torch.randn(1, 80, 3000))
+    options = whisper.DecodingOptions(language="en", temperature=0.0, fp16=False)
+    stats = DecodingStats()
+    result = speculative_decode(target, target, audio_features, audio_features, options, stats=stats)
+    assert result.tokens == whisper.decode(target, audio_features, options)[0].tokens
+    assert stats.drafted and stats.acceptance_rate == 1.0
+
+
+def test_engine_output_is_the_same_with_draft_model(make_engine, wav_file, monkeypatch):
+    calls = []
+    monkeypatch.setattr(streaming_decoder, "speculative_decode",
+                        lambda *args: calls.append(args) or speculative_decode(*args))
+    path = wav_file(45)
+    plain = make_engine(transcript_cache=None)
+    speculative = make_engine(transcript_cache=None, draft_model_name="tiny-draft")
+    assert speculative.draft_model is not None
+
+    expected = plain.transcribe(path)
+    result = speculative.transcribe(path)
+    assert [segment["text"] for segment in result["segments"]] == [segment["text"] for segment in expected["segments"]]
+    assert calls
+    # Окна случайной модели уходят в откат по температуре: учитываются токены только принятых попыток
+    assert speculative.last_decoding_stats["tokens"] == plain.last_decoding_stats["tokens"]
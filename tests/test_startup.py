@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_modules(module):
+    code = f"import sys, {module}; print(' '.join(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return set(output.stdout.split())
+
+
+def test_cli_does_not_import_torch_or_whisper():
+    modules = imported_modules("transcriber_cli")
+    assert "torch" not in modules
+    assert "whisper" not in modules
+
+
+def test_media_helpers_are_lightweight():
+    assert "torch" not in imported_modules("media_files")
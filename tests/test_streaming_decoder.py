@@ -0,0 +1,112 @@
+import pytest
+import torch
+import whisper
+from whisper.audio import HOP_LENGTH
+
+import streaming_decoder
+from batch_sizing import BatchSizer
+from conftest import WavAudioStream, synth_speech, tiny_whisper, write_wav
+from streaming_decoder import StreamingTranscriber
+
+
+@pytest.fixture(scope="module")
+def model():
+    return tiny_whisper(0)
+
+
+@pytest.fixture(scope="module")
+def speech_file(tmp_path_factory):
+    return write_wav(tmp_path_factory.mktemp("audio") / "speech.wav", synth_speech(65))
+
+
+def transcribe_stream(model, path, start_sample=0, **options):
+    """Транскрипция WAV через поток; события - сегменты и контрольные точки окон с позицией чтения"""
+    stream = WavAudioStream(path, start_sample=start_sample)
+    events = []
+    transcriber = StreamingTranscriber(
+        model, language="en", word_timestamps=True, temperatures=(0.0,),
+        on_checkpoint=lambda segments, state: events.append(("window", dict(state), stream.position)),
+        **options)
+    result = transcriber.transcribe(
+        stream, on_segment=lambda segment: events.append(("segment", segment["seek"], stream.position)))
+    return result, events, len(stream.samples)
+
+
+def test_segments_arrive_window_by_window(model, speech_file):
+    result, events, n_samples = transcribe_stream(model, speech_file)
+    windows = [event for event in events if event[0] == "window"]
+    assert len(windows) >= 3
+    # Сегменты окна приходят до его контрольной точки, первые - пока файл не дочитан
+    window_seek = 0
+    for kind, value, position in events:
+        if kind == "segment":
+            assert value == window_seek
+        else:
+            window_seek = value["seek"]
+    first_segment = next(event for event in events if event[0] == "segment")
+    assert first_segment[2] < n_samples
+    assert len([event for event in events if event[0] == "segment"]) == len(result["segments"])
+
+
+def test_segments_have_increasing_timestamps_and_words(model, speech_file):
+    segments = transcribe_stream(model, speech_file)[0]["segments"]
+    assert segments
+    for segment in segments:
+        assert {"start", "end", "text", "words"} <= segment.keys()
+        assert segment["start"] <= segment["end"]
+    assert [segment["id"] for segment in segments] == list(range(len(segments)))
+    starts = [segment["start"] for segment in segments]
+    assert starts == sorted(starts)
+    assert any(segment["words"] for segment in segments)
+
+
+def test_resume_matches_uninterrupted_run(model, speech_file):
+    full, events, _ = transcribe_stream(model, speech_file)
+    state = next(event[1] for event in events if event[0] == "window")
+    resumed = transcribe_stream(model, speech_file, start_sample=state["seek"] * HOP_LENGTH,
+                                resume_state=state)[0]
+
+    def fields(segments):
+        return [(segment["id"], segment["start"], segment["end"], segment["text"]) for segment in segments]
+
+    assert resumed["segments"]
+    assert fields(resumed["segments"]) == fields(full["segments"][state["next_segment_id"]:])
+
+
+def test_decoding_stats_count_only_accepted_attempt(model, monkeypatch):
+    results = []
+    decode = whisper.decode
+
+    def recording_decode(*args, **kwargs):
+        results.append(decode(*args, **kwargs)[0])
+        return [results[-1]]
+
+    monkeypatch.setattr(streaming_decoder.whisper, "decode", recording_decode)
+    # Порог уверенности выше любой avg_logprob: окно проходит все температуры, принимается последняя
+    transcriber = StreamingTranscriber(model, language="en", temperatures=(0.0, 0.5), logprob_threshold=0.0,
+                                       no_speech_threshold=None)
+    transcriber.transcribe(synth_speech(10))
+    assert [result.temperature for result in results] == [0.0, 0.5]
+    assert transcriber.decoding_stats.tokens == len(results[-1].tokens) + 1
+
+
+def test_out_of_memory_retries_window_with_smaller_beam(model, monkeypatch):
+    decode_with_fallback = StreamingTranscriber.decode_with_fallback
+    calls = []
+
+    def out_of_memory_once(self, mel_segment, prompt):
+        calls.append((mel_segment, self.beam_size))
+        if len(calls) == 1:
+            raise torch.OutOfMemoryError("CUDA out of memory")
+        return decode_with_fallback(self, mel_segment, prompt)
+
+    monkeypatch.setattr(StreamingTranscriber, "decode_with_fallback", out_of_memory_once)
+    sizer = BatchSizer("cpu", batch_size=1, beam_size=4, adaptive=False)
+    transcriber = StreamingTranscriber(model, language="en", temperatures=(0.0,), beam_size=4,
+                                       batch_sizer=sizer, no_speech_threshold=None)
+    result = transcriber.transcribe(synth_speech(10))
+    assert [beam_size for _, beam_size in calls] == [4, 2]
+    # Повторяется то же окно
+    assert torch.equal(calls[0][0], calls[1][0])
+    assert transcriber.beam_size == sizer.beam_size == 2
+    assert result["segments"]
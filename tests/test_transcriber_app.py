@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+from transcriber_app import TextboxUpdateQueue
+
+
+class RecordingRoot:
+    """Вместо Tk: after() только запоминает отложенные вызовы, тест выполняет их сам"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay_ms, callback):
+        self.scheduled.append((delay_ms, callback))
+
+    def run_next(self):
+        _, callback = self.scheduled.pop(0)
+        callback()
+
+
+class FakeTextbox:
+    def __init__(self):
+        self.text = ""
+        self.inserts = []
+
+    def insert(self, index, text):
+        assert index == "end"
+        self.inserts.append(text)
+        self.text += text
+
+    def index(self, index):
+        assert index == "end-1c"
+        return f"{self.text.count(chr(10)) + 1}.0"
+
+    def delete(self, start, end):
+        assert start == "1.0"
+        self.text = self.text.split("\n", int(end.split(".")[0]) - 1)[-1]
+
+    def see(self, index):
+        pass
+
+
+def make_queue(**options):
+    root = RecordingRoot()
+    owner = SimpleNamespace(output=FakeTextbox(), log=FakeTextbox())
+    return TextboxUpdateQueue(root, owner, **options), root, owner
+
+
+def test_drain_coalesces_updates_per_textbox_in_order():
+    updates, root, owner = make_queue(fps=20)
+    for target, text in [("output", "a"), ("log", "x"), ("output", "b"), ("output", "c")]:
+        updates.put(target, text)
+    updates.start()
+    assert [delay for delay, _ in root.scheduled] == [50]
+    root.run_next()
+    assert owner.output.inserts == ["abc"]
+    assert owner.log.inserts == ["x"]
+    assert updates.stats()["merged"] == 2
+    # Следующий кадр запланирован, пустой кадр ничего не вставляет
+    root.run_next()
+    assert owner.output.inserts == ["abc"] and len(root.scheduled) == 1
+
+
+def test_full_queue_drops_oldest_updates():
+    updates, root, owner = make_queue(max_pending=3)
+    for index in range(5):
+        updates.put("output", f"{index}\n")
+    updates.start()
+    root.run_next()
+    assert owner.output.text == "2\n3\n4\n"
+    assert updates.stats()["dropped"] == 2
+
+
+def test_long_textbox_is_trimmed_from_the_top():
+    updates, root, owner = make_queue(max_lines=3)
+    updates.put("output", "".join(f"line {index}\n" for index in range(5)))
+    updates.start()
+    root.run_next()
+    assert owner.output.text == "line 3\nline 4\n"
+    assert updates.stats()["trimmed_lines"] == 3
+
+
+def test_discard_and_stop():
+    updates, root, owner = make_queue()
+    updates.put("output", "dropped")
+    updates.put("log", "kept")
+    updates.discard("output")
+    updates.start()
+    root.run_next()
+    assert owner.output.inserts == [] and owner.log.inserts == ["kept"]
+    updates.stop()
+    updates.put("log", "late")
+    root.run_next()
+    assert owner.log.inserts == ["kept"] and root.scheduled == []
@@ -0,0 +1,130 @@
+import json
+import os
+
+import pytest
+
+import transcriber_cli
+import transcriber_core
+
+OPTIONS = ["--model", "tiny-random", "--device", "cpu", "--language", "en", "--no-cache", "--no-resume",
+           "--no-index", "-q"]
+
+
+@pytest.fixture
+def cli(monkeypatch, tmp_path, tiny_models):
+    # main() пишет transcription.log в текущий каталог
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(transcriber_cli, "MODEL_NAMES", transcriber_cli.MODEL_NAMES + ["tiny-random"])
+    return transcriber_cli.main
+
+
+def test_batch_writes_text_and_exports(cli, wav_file, tmp_path):
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for seed in range(2):
+        os.replace(wav_file(10, seed=seed), inputs / f"record{seed}.wav")
+    (inputs / "notes.txt").write_text("not media")
+    output = tmp_path / "out"
+
+    assert cli(["batch", str(inputs), "-o", str(output), "--export", "srt,json"] + OPTIONS) == 0
+    assert sorted(os.listdir(output)) == ["record0.json", "record0.srt", "record0_transcript.txt",
+                                          "record1.json", "record1.srt", "record1_transcript.txt"]
+    with open(output / "record0.json", encoding="utf-8") as f:
+        result = json.load(f)
+    assert result["language"] == "en"
+    assert result["segments"]
+
+
+def test_batch_skips_existing_results(cli, wav_file, tmp_path, capsys):
+    path = wav_file(10, name="record.wav")
+    output = tmp_path / "out"
+    assert cli(["batch", path, "-o", str(output)] + OPTIONS) == 0
+    modified = os.stat(output / "record_transcript.txt").st_mtime_ns
+    capsys.readouterr()
+
+    assert cli(["batch", path, "-o", str(output)] + OPTIONS) == 0
+    assert "⏭️" in capsys.readouterr().out
+    assert os.stat(output / "record_transcript.txt").st_mtime_ns == modified
+
+
+def test_parallel_run_prints_worker_logs(monkeypatch, capsys):
+    import job_scheduler
+
+    class Scheduler:
+        def __init__(self, devices, engine_options=None, on_event=None):
+            self.on_event = on_event
+
+        def run(self, paths, **options):
+            self.on_event({"type": "log", "worker": 0, "device": "cuda:1",
+                           "text": "♻️ Продолжаю с контрольной точки: 60.0 с\n\n⚠️ Не хватило памяти\n"})
+            self.on_event({"type": "done", "elapsed": 1.0})
+            return {}
+
+    monkeypatch.setattr(job_scheduler, "JobScheduler", Scheduler)
+    args = transcriber_cli.build_parser().parse_args(["batch", "a.wav", "--no-index"])
+    transcriber_cli.run_parallel(args, [], ["cuda:0", "cuda:1"])
+    captured = capsys.readouterr()
+    assert captured.err.splitlines() == ["[cuda:1] ♻️ Продолжаю с контрольной точки: 60.0 с",
+                                         "[cuda:1] ⚠️ Не хватило памяти"]
+    assert "♻️" not in captured.out
+
+
+def test_batch_processes_files_grouped_by_language(cli, wav_file, tmp_path, monkeypatch):
+    languages = {"a.wav": "de", "b.wav": "en", "c.wav": "de", "d.wav": "en"}
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for seed, name in enumerate(languages):
+        os.replace(wav_file(5, seed=seed), inputs / name)
+    monkeypatch.setattr(transcriber_core.TranscriptionEngine, "detect_language",
+                        lambda self, filename: languages[os.path.basename(filename)])
+    processed = []
+    monkeypatch.setattr(transcriber_cli, "process_file",
+                        lambda engine, filename, args: processed.append(os.path.basename(filename)))
+
+    options = [option if option != "en" else "auto" for option in OPTIONS]
+    assert cli(["batch", str(inputs), "-o", str(tmp_path / "out")] + options) == 0
+    assert processed == ["a.wav", "c.wav", "b.wav", "d.wav"]
+
+
+def test_parallel_run_groups_languages_when_language_is_auto(monkeypatch, capsys):
+    import job_scheduler
+
+    runs = []
+
+    class Scheduler:
+        def __init__(self, devices, engine_options=None, on_event=None):
+            self.on_event = on_event
+
+        def run(self, paths, **options):
+            runs.append(options)
+            self.on_event({"type": "languages", "groups": {"de": [0, 2], None: [1]}})
+            return {}
+
+    monkeypatch.setattr(job_scheduler, "JobScheduler", Scheduler)
+    for language in ("auto", "ru"):
+        args = transcriber_cli.build_parser().parse_args(["batch", "a.wav", "--no-index", "--language", language])
+        transcriber_cli.run_parallel(args, [], ["cuda:0", "cuda:1"])
+    assert [options["group_languages"] for options in runs] == [True, False]
+    assert "🌍 Языки: de - 2, не определен - 1" in capsys.readouterr().out
+
+
+def test_parallel_run_passes_cache_sizes_to_workers(monkeypatch):
+    import job_scheduler
+
+    passed = []
+
+    class Scheduler:
+        def __init__(self, devices, engine_options=None, on_event=None):
+            passed.append(engine_options)
+
+        def run(self, paths, **options):
+            return {}
+
+    monkeypatch.setattr(job_scheduler, "JobScheduler", Scheduler)
+    args = transcriber_cli.build_parser().parse_args(["batch", "a.wav", "--no-index", "--cache-size-mb", "3",
+                                                      "--audio-cache-size-mb", "5"])
+    transcriber_cli.run_parallel(args, [], ["cpu", "cpu"])
+    options = job_scheduler.worker_engine_options(passed[0])
+    assert options["transcript_cache"].max_bytes == 3 * 1024 * 1024
+    assert options["audio_cache"].max_bytes == 5 * 1024 * 1024
+    assert "transcript_cache_bytes" not in options and "audio_cache_bytes" not in options
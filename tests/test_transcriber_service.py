@@ -0,0 +1,152 @@
+import http.client
+import os
+import threading
+import time
+
+import pytest
+
+import transcriber_core
+from transcriber_service import ServiceError, TranscriptionServer, TranscriptionService
+
+
+@pytest.fixture
+def make_service(engine_options, tmp_path):
+    services = []
+
+    def make(**options):
+        engine = {key: value for key, value in engine_options.items() if key != "device"}
+        service = TranscriptionService(engine, device="cpu", allowed_dirs=[str(tmp_path)],
+                                       work_dir=str(tmp_path / "work"), **options)
+        service.start()
+        assert service.wait_ready(60)
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.stop()
+
+
+@pytest.fixture
+def held_segments(monkeypatch):
+    """Рабочий поток останавливается после первого сегмента каждого файла, пока тест не отпустит release"""
+    first_segment = threading.Event()
+    release = threading.Event()
+    runs = []
+    transcribe = transcriber_core.TranscriptionEngine.transcribe
+
+    def held_transcribe(self, filename, on_segment=None, **options):
+        run = {"path": filename, "start": time.monotonic()}
+        runs.append(run)
+
+        def segment(segment):
+            on_segment(segment)
+            first_segment.set()
+            release.wait(30)
+
+        try:
+            return transcribe(self, filename, on_segment=segment, **options)
+        finally:
+            run["end"] = time.monotonic()
+
+    monkeypatch.setattr(transcriber_core.TranscriptionEngine, "transcribe", held_transcribe)
+    return first_segment, release, runs
+
+
+def wait_status(service, job_id, statuses, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = service.status(job_id)
+        if status["status"] in statuses:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Задание {job_id}: {service.status(job_id)}")
+
+
+def test_submit_and_poll(make_service, wav_file):
+    service = make_service()
+    job = service.submit(wav_file(10))
+    assert job["status"] in ("queued", "running")
+    status = wait_status(service, job["id"], ("finished", "failed"))
+    assert status["status"] == "finished"
+    result = service.result(job["id"])
+    assert result["segments"]
+    assert service.health()["jobs"] == {"finished": 1}
+
+
+def test_cancel_running_job_keeps_partial_result(make_service, wav_file, held_segments):
+    first_segment, release, _ = held_segments
+    service = make_service()
+    job = service.submit(wav_file(150))
+    assert first_segment.wait(60)
+    assert service.delete(job["id"]) is False
+    release.set()
+    status = wait_status(service, job["id"], ("finished", "cancelled", "failed"))
+    assert status["status"] == "cancelled"
+    partial = service.result(job["id"])
+    assert 0 < len(partial["segments"])
+    assert partial["segments"][-1]["end"] < 150
+
+
+def test_deleted_queued_job_frees_queue_slot(make_service, wav_file, held_segments):
+    first_segment, release, _ = held_segments
+    service = make_service(max_queue=1)
+    running = service.submit(wav_file(30, seed=1))
+    assert first_segment.wait(60)
+    queued = service.submit(wav_file(10, seed=2))
+    assert service.delete(queued["id"]) is True
+    service.submit(wav_file(10, seed=3))
+    with pytest.raises(ServiceError) as error:
+        service.submit(wav_file(10, seed=4))
+    assert error.value.status == 503
+    release.set()
+    assert wait_status(service, running["id"], ("finished", "failed"))["status"] == "finished"
+
+
+def test_jobs_with_same_content_do_not_overlap(make_service, wav_file, held_segments, tmp_path):
+    first_segment, release, runs = held_segments
+    service = make_service(max_concurrent=2)
+    path = wav_file(30)
+    copy = tmp_path / "copy.wav"
+    copy.write_bytes(open(path, "rb").read())
+    first = service.submit(path)
+    assert first_segment.wait(60)
+    second = service.submit(str(copy))
+    time.sleep(0.5)
+    assert service.status(second["id"])["status"] == "queued"
+    release.set()
+    for job in (first, second):
+        assert wait_status(service, job["id"], ("finished", "failed"))["status"] == "finished"
+    assert runs[1]["start"] >= runs[0]["end"]
+    assert service.result(second["id"])["text"] == service.result(first["id"])["text"]
+
+
+def test_full_queue_rejects_upload_before_reading_body(make_service, wav_file, held_segments, tmp_path):
+    first_segment, release, _ = held_segments
+    service = make_service(max_queue=1)
+    running = service.submit(wav_file(30, seed=1))
+    assert first_segment.wait(60)
+    service.submit(wav_file(10, seed=2))
+    spooled = set(os.listdir(service.work_dir))
+
+    server = TranscriptionServer(("127.0.0.1", 0), service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    try:
+        # Заголовки обещают 100 МБ, но тело не отправляется: ответ должен прийти без него
+        connection.putrequest("POST", "/jobs?filename=big.wav")
+        connection.putheader("Content-Type", "application/octet-stream")
+        connection.putheader("Content-Length", str(100 * 1024 * 1024))
+        connection.endheaders()
+        response = connection.getresponse()
+        response.read()
+        assert response.status == 503
+        assert response.getheader("Retry-After")
+        assert response.getheader("Connection") == "close"
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+    assert set(os.listdir(service.work_dir)) == spooled
+    release.set()
+    assert wait_status(service, running["id"], ("finished", "failed"))["status"] == "finished"
@@ -0,0 +1,48 @@
+import word_alignment
+
+
+def test_aligned_result_is_reused_from_cache(make_engine, wav_file, monkeypatch):
+    path = wav_file(20)
+    engine = make_engine()
+    alignments = []
+    align_words = word_alignment.align_words
+
+    def counting_align_words(*args, **kwargs):
+        alignments.append(args[2])
+        return align_words(*args, **kwargs)
+
+    monkeypatch.setattr(word_alignment, "align_words", counting_align_words)
+
+    first = engine.transcribe(path, word_timestamps=True)
+    assert first["segments"]
+    engine.align_words(path, first)
+    assert alignments
+
+    alignments.clear()
+    second = engine.transcribe(path, word_timestamps=True)
+    engine.align_words(path, second)
+    assert not alignments
+    assert [segment["words"] for segment in second["segments"]] == [segment["words"] for segment in first["segments"]]
+
+
+def test_plain_run_does_not_take_aligned_result(make_engine, wav_file):
+    path = wav_file(20)
+    engine = make_engine()
+    engine.align_words(path, engine.transcribe(path, word_timestamps=True))
+
+    result = engine.transcribe(path)
+    assert result["segments"]
+    assert not any("words" in segment for segment in result["segments"])
+
+
+def test_beam_search_results_are_cached_separately(make_engine, wav_file):
+    path = wav_file(10)
+    greedy = make_engine()
+    beam = make_engine(beam_size=2)
+    assert greedy.cache_key(path) != beam.cache_key(path)
+
+    greedy.transcribe(path)
+    logs = []
+    beam.log_callback = logs.append
+    beam.transcribe(path)
+    assert not any("⚡" in line for line in logs)
@@ -0,0 +1,56 @@
+import pytest
+
+from transcript_index import TranscriptIndex, fts_query
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = TranscriptIndex(str(tmp_path / "index.sqlite"))
+    index.add_result("/records/meeting.mp3", {"language": "ru", "segments": [
+        {"start": 0.0, "end": 3.5, "text": " Ёлка стоит в зале", "speaker": "Спикер 1"},
+        {"start": 3.5, "end": 7.25, "text": " Все идут на ЕЛКУ вечером"},
+        {"start": 7.25, "end": 9.0, "text": " Бюджет утвержден"},
+        {"start": 9.0, "end": 9.5, "text": "  "},
+    ]}, model="small")
+    index.add_result("/records/call.wav", {"language": "en", "segments": [
+        {"start": 1.0, "end": 2.0, "text": " Budget \"approved\", OR NOT"},
+    ]}, model="large-v2")
+    yield index
+    index.close()
+
+
+def texts(rows):
+    return sorted(row["text"] for row in rows)
+
+
+def test_yo_and_ye_are_the_same_letter(index):
+    expected = sorted(["Ёлка стоит в зале", "Все идут на ЕЛКУ вечером"])
+    assert texts(index.search("ел*")) == expected
+    assert texts(index.search("ёл*")) == expected
+    assert texts(index.search("ЁЛКУ")) == ["Все идут на ЕЛКУ вечером"]
+    # Найденный текст возвращается как записан, с ё
+    assert index.search("елка")[0]["text"] == "Ёлка стоит в зале"
+
+
+def test_search_returns_timestamps_and_filters(index):
+    [row] = index.search("бюджет")
+    assert (row["path"], row["start_ms"], row["end_ms"], row["model"]) == ("/records/meeting.mp3", 7250, 9000, "small")
+    assert "[Бюджет]" in row["snippet"]
+    assert index.search("budget", language="ru") == []
+    assert texts(index.search("budget", model="large-v2")) == ['Budget "approved", OR NOT']
+    assert index.search("ёлка", path_prefix="/records/call") == []
+
+
+def test_query_syntax_is_escaped(index):
+    assert fts_query('"на ЁЛКУ" OR бюджет* -x') == '"на ЕЛКУ" "OR" "бюджет"* "-x"'
+    assert texts(index.search('"approved", OR')) == ['Budget "approved", OR NOT']
+    assert index.search('"" *') == []
+
+
+def test_reindex_replaces_segments(index):
+    assert index.stats() == {"transcripts": 2, "segments": 4}
+    index.add_result("/records/meeting.mp3", {"segments": [{"start": 0.0, "end": 1.0, "text": " Новый текст"}]})
+    assert index.search("елка") == []
+    assert texts(index.search("новый")) == ["Новый текст"]
+    assert index.remove("/records/call.wav")
+    assert index.stats() == {"transcripts": 1, "segments": 1}
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+import pytest
+
+import watch_folder
+from watch_folder import Debouncer, WatchDaemon, WatchQueue, WatchRoot
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watch_folder.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WatchQueue(str(tmp_path / "queue.sqlite"))
+    yield queue
+    queue.close()
+
+
+def test_debouncer_waits_until_file_stops_growing(tmp_path, clock):
+    path = tmp_path / "a.mp3"
+    path.write_bytes(b"x" * 100)
+    debouncer = Debouncer(settle_seconds=5)
+    debouncer.touch(str(path))
+    assert debouncer.ready() == []
+
+    clock.now += 4
+    with open(path, "ab") as f:
+        f.write(b"y" * 100)
+    assert debouncer.ready() == []
+    clock.now += 4
+    assert debouncer.ready() == []
+    clock.now += 1
+    [(ready_path, (size, _))] = debouncer.ready()
+    assert (ready_path, size) == (str(path), 200)
+    assert len(debouncer) == 0
+
+
+def test_debouncer_skips_empty_and_deleted_files(tmp_path, clock):
+    empty, deleted = tmp_path / "empty.mp3", tmp_path / "deleted.mp3"
+    empty.write_bytes(b"")
+    deleted.write_bytes(b"x")
+    debouncer = Debouncer(settle_seconds=1)
+    for path in (empty, deleted):
+        debouncer.touch(str(path))
+    debouncer.ready()
+    deleted.unlink()
+    clock.now += 10
+    assert debouncer.ready() == []
+    assert len(debouncer) == 1  # Пустой файл ждет, пока в него начнут писать
+
+
+def test_same_content_is_queued_once(tmp_path, queue):
+    watched = tmp_path / "in"
+    (watched / "board").mkdir(parents=True)
+    first, copy, other = watched / "a.mp3", watched / "board" / "copy.mp3", watched / "board" / "b.mp3"
+    first.write_bytes(b"same audio")
+    copy.write_bytes(b"same audio")
+    other.write_bytes(b"other audio")
+    logs = []
+    daemon = WatchDaemon([WatchRoot(str(watched)), WatchRoot(str(watched / "board"), priority=5)], queue,
+                         process=None, log_callback=logs.append)
+    for path in (first, copy, other, first):
+        stat = os.stat(path)
+        daemon._enqueue(str(path), (stat.st_size, stat.st_mtime_ns))
+
+    assert queue.counts() == {"queued": 2}
+    assert sum("⏭️" in line for line in logs) == 1
+    # Вложенный каталог с приоритетом 5 идет первым
+    assert [queue.next()["path"], queue.next()["path"]] == [str(other), str(first)]
+
+    first.write_bytes(b"new take")
+    stat = os.stat(first)
+    daemon._enqueue(str(first), (stat.st_size, stat.st_mtime_ns))
+    assert queue.counts() == {"queued": 1, "running": 2}
+
+
+def test_interrupted_jobs_are_requeued(tmp_path, queue):
+    queue.add("/in/a.mp3", "hash-a", 10, 1)
+    assert queue.next()["hash"] == "hash-a"
+    queue.close()
+    reopened = WatchQueue(queue.path)
+    assert reopened.counts() == {"queued": 1}
+    reopened.close()
+
+
+def test_daemon_processes_copied_files_once(tmp_path, queue):
+    watched = tmp_path / "in"
+    watched.mkdir()
+    processed = []
+    done = threading.Event()
+
+    def process(path, output_dir):
+        processed.append((os.path.basename(path), os.path.getsize(path)))
+        if len(processed) == 2:
+            done.set()
+
+    daemon = WatchDaemon([WatchRoot(str(watched))], queue, process, settle_seconds=0.3, poll_interval=0.05,
+                         use_inotify=False, log_callback=lambda text: None)
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+    try:
+        with open(watched / "a.wav", "wb") as f:
+            for _ in range(5):
+                f.write(b"a" * 1000)
+                f.flush()
+                time.sleep(0.1)
+        (watched / "b.wav").write_bytes(b"b" * 10)
+        (watched / "a copy.wav").write_bytes(b"a" * 5000)
+        (watched / "notes.txt").write_bytes(b"not media")
+        assert done.wait(30)
+        time.sleep(1)
+    finally:
+        daemon.stop()
+        thread.join(10)
+    # Копия с тем же содержимым не обрабатывается второй раз, недописанный файл - ни разу
+    assert sorted(size for _, size in processed) == [10, 5000]
+    assert queue.counts() == {"finished": 2}
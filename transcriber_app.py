@@ -1,26 +1,42 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import customtkinter as ctk
-import whisper
 import threading
 import os
 import sys
-import re
-import textwrap
-import urllib.request
 import logging
 import warnings
-import torch
-import time
-from io import StringIO
 import contextlib
-
-# Настройка логирования
-logging.basicConfig(
-    filename='transcription.log',
-    level=logging.ERROR,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+import itertools
+import argparse
+import json
+import sqlite3
+import time
+from collections import deque
+
+# torch и whisper (transcriber_core) импортируются в фоне после появления окна
+import media_files
+from formatting import build_result_header, format_segments_as_lines, format_timestamp, RenderCache, \
+    block_separator, effective_mode
+from exporters import EXPORT_FORMATS, export_result
+from job_control import PriorityJobQueue, TranscriptionCancelled
+from precision import available_precisions
+from transcript_index import TranscriptIndex
+
+# Сколько блоков (сегментов, абзацев) выводится в поле за один проход главного цикла
+RENDER_PAGE_BLOCKS = 200
+# auto - язык определяется по началу записи; в поле можно ввести любой код языка whisper
+LANGUAGE_CHOICES = ["auto", "ru", "en", "uk", "de", "fr", "es", "it", "pl", "zh", "ja"]
+# Сегментов в выдаче поиска: самые релевантные, дальше запрос стоит уточнить
+SEARCH_LIMIT = 200
+# Приоритет задания: больший выполняется раньше и вытесняет выполняемое задание с меньшим
+PRIORITY_CHOICES = ["0", "1", "2", "3"]
+JOB_STATUS_LABELS = {"queued": "⏳ в очереди", "running": "▶️ выполняется", "paused": "⏸ пауза",
+                     "finished": "✅ готово", "failed": "❌ ошибка", "cancelled": "⏹ отменено"}
+JOBS_REFRESH_MS = 1000
+# Черновая модель спекулятивного декодирования: предлагает токены, текст остается как у выбранной модели
+NO_DRAFT = "без черновика"
+DRAFT_CHOICES = [NO_DRAFT, "base", "small"]
 
 class WhisperLogHandler(logging.Handler):
     """Кастомный обработчик логов для Whisper"""
@@ -32,54 +48,83 @@ class WhisperLogHandler(logging.Handler):
         log_message = self.format(record)
         self.update_callback(log_message + '\n')
 
-class WhisperApp:
-    def get_resource_path(self, relative_path):
-        """Получение пути к ресурсам для PyInstaller"""
+class TextboxUpdateQueue:
+    """Очередь обновлений текстовых полей, которую главный поток разбирает с фиксированной частотой.
+
+    Фоновые потоки только кладут текст в ограниченную очередь; раз в кадр все
+    накопленные строки вставляются в каждое поле одной операцией, а старые
+    строки сверху удаляются, если поле превысило max_lines.
+    """
+    def __init__(self, root, owner, fps=20, max_pending=10000, max_lines=20000):
+        self.root = root
+        self.owner = owner
+        self.interval_ms = max(1, int(1000 / fps))
+        self.max_lines = max_lines
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._running = False
+        self.dropped = 0
+        self.merged = 0
+        self.trimmed_lines = 0
+
+    def put(self, target, text):
+        """target - имя атрибута с полем у владельца (например, "output")"""
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append((target, text))
+
+    def discard(self, target):
+        with self._lock:
+            kept = [item for item in self._pending if item[0] != target]
+            self._pending.clear()
+            self._pending.extend(kept)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        self._running = False
+
+    def stats(self):
+        return {"merged": self.merged, "dropped": self.dropped, "trimmed_lines": self.trimmed_lines}
+
+    def _drain(self):
+        if not self._running:
+            return
+        with self._lock:
+            items = list(self._pending)
+            self._pending.clear()
+
+        batches = {}
+        for target, text in items:
+            batches.setdefault(target, []).append(text)
+
+        for target, texts in batches.items():
+            self.merged += len(texts) - 1
+            textbox = getattr(self.owner, target, None)
+            if textbox is None:
+                continue
+            try:
+                textbox.insert("end", "".join(texts))
+                line_count = int(textbox.index("end-1c").split(".")[0])
+                if line_count > self.max_lines:
+                    excess = line_count - self.max_lines
+                    textbox.delete("1.0", f"{excess + 1}.0")
+                    self.trimmed_lines += excess
+                textbox.see("end")
+            except tk.TclError:
+                pass
+
         try:
-            base_path = sys._MEIPASS
-        except Exception:
-            base_path = os.path.abspath(".")
-        return os.path.join(base_path, relative_path)
-
-    def setup_ffmpeg_path(self):
-        """Настройка пути к FFmpeg для разных режимов запуска"""
-        if getattr(sys, 'frozen', False):
-            application_path = os.path.dirname(sys.executable)
-            ffmpeg_dir = os.path.join(application_path, "bin")
-            ffmpeg_path = os.path.join(ffmpeg_dir, "ffmpeg.exe")
-            
-            if os.path.exists(ffmpeg_path):
-                current_path = os.environ.get("PATH", "")
-                if ffmpeg_dir not in current_path:
-                    os.environ["PATH"] = ffmpeg_dir + os.pathsep + current_path
-                return True
-            else:
-                try:
-                    meipass_path = sys._MEIPASS
-                    ffmpeg_dir_alt = os.path.join(meipass_path, "bin")
-                    ffmpeg_path_alt = os.path.join(ffmpeg_dir_alt, "ffmpeg.exe")
-                    
-                    if os.path.exists(ffmpeg_path_alt):
-                        current_path = os.environ.get("PATH", "")
-                        if ffmpeg_dir_alt not in current_path:
-                            os.environ["PATH"] = ffmpeg_dir_alt + os.pathsep + current_path
-                        return True
-                except AttributeError:
-                    pass
-                
-                error_msg = f"FFmpeg not found at: {ffmpeg_path}"
-                logging.error(error_msg)
-                return False
-        else:
-            local_ffmpeg = os.path.join("bin", "ffmpeg.exe")
-            if os.path.exists(local_ffmpeg):
-                bin_dir = os.path.abspath("bin")
-                current_path = os.environ.get("PATH", "")
-                if bin_dir not in current_path:
-                    os.environ["PATH"] = bin_dir + os.pathsep + current_path
-            return True
-
-    def __init__(self, root):
+            self.root.after(self.interval_ms, self._drain)
+        except tk.TclError:
+            self._running = False
+
+class WhisperApp:
+    def __init__(self, root, model_name="large-v2", startup_report=None):
         self.root = root
         self.root.title("Whisper Transcriber - GPU/CPU")
         self.root.geometry("1000x800")
@@ -87,62 +132,124 @@ class WhisperApp:
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
 
-        self.suppress_warnings()
+        self.ui_updates = TextboxUpdateQueue(self.root, self)
+        self.ui_updates.start()
 
-        self.use_gpu = self.check_gpu_availability()
-        if not self.use_gpu:
-            messagebox.showwarning("Внимание", 
-                                "GPU недоступен. Транскрибация будет выполнена на CPU.\n"
-                                "Производительность может быть ниже.")
+        media_files.suppress_warnings()
 
-        self.model = None
+        # Устройство и движок появляются после фонового импорта torch (_warm_up)
+        self.use_gpu = False
+        self.engine = None
+        self.startup_report = startup_report
+        self.startup_marks = {}
         self.filename = ""
-        self.is_transcribing = False
+        # Файл показанного результата: выбранный файл мог смениться, пока задание ждало в очереди
+        self.result_filename = ""
         self.last_result = None
         self._last_processing_time = 0
-        self.selected_model = tk.StringVar(value="large-v2")
+        # Отрендеренные блоки результата по настройкам отображения и текущий постраничный вывод
+        self.render_cache = RenderCache()
+        self._render_state = None
+        self._render_generation = 0
+        self.selected_model = tk.StringVar(value=model_name)
+        self.selected_precision = tk.StringVar(value="")
+        self.search_query = tk.StringVar(value="")
+        # Индекс поиска по готовым результатам: пополняется после каждой транскрибации
+        try:
+            self.transcript_index = TranscriptIndex()
+        except (sqlite3.Error, OSError) as e:
+            logging.error(f"Не удалось открыть индекс поиска: {e}")
+            self.transcript_index = None
 
-        if not self.setup_ffmpeg_path():
+        if not media_files.setup_ffmpeg_path():
             error_msg = "Критическая ошибка: FFmpeg не найден!"
             self.update_log_safe(f"❌ {error_msg}\n")
             messagebox.showerror("Критическая ошибка", 
                                f"{error_msg}\n\nПриложение может работать некорректно.")
 
+        # Задания выполняются по одному в потоке очереди; на паузе движок отдает кэш памяти GPU
+        self.job_queue = PriorityJobQueue(self.run_job, on_change=lambda: self.root.after(0, self.refresh_jobs),
+                                          on_pause=lambda: self.engine.release_memory()).start()
+
         self.create_widgets()
-        self.root.after(100, self.load_model)
+        self.root.after(JOBS_REFRESH_MS, self.poll_jobs)
+        self.root.after(0, self.start_warm_up)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-    def suppress_warnings(self):
-        warnings.filterwarnings("ignore", category=FutureWarning, module="whisper")
-        warnings.filterwarnings("ignore", message=".*Triton kernels.*")
-        warnings.filterwarnings("ignore", message=".*DTW implementation.*")
+    def mark_startup(self, name):
+        self.startup_marks[name] = time.time()
+
+    def set_startup_progress(self, text, fraction):
+        def update():
+            self.startup_status.configure(text=text)
+            self.startup_progress.set(fraction)
+        self.root.after(0, update)
+
+    def start_warm_up(self):
+        """Окно уже построено: отрисовываем его и загружаем библиотеки и модель в фоне"""
+        self.root.update_idletasks()
+        self.mark_startup("first_paint")
+        model_name = self.selected_model.get()
+        threading.Thread(target=lambda: self._warm_up(model_name), daemon=True).start()
 
-    def check_gpu_availability(self):
+    def _warm_up(self, model_name):
         try:
-            if not torch.cuda.is_available():
-                return False
-            test_tensor = torch.tensor([1.0]).cuda()
-            del test_tensor
-            torch.cuda.empty_cache()
-            return True
+            self.set_startup_progress("⏳ Загружаю PyTorch и Whisper...", 0.1)
+            import transcriber_core
+            self.mark_startup("torch_loaded")
+
+            self.set_startup_progress("🔍 Проверяю GPU...", 0.3)
+            use_gpu = transcriber_core.check_gpu_availability()
+            device_info = transcriber_core.get_gpu_info() if use_gpu else {"name": "CPU (без GPU)"}
+            engine = transcriber_core.TranscriptionEngine(
+                device="cuda:0" if use_gpu else "cpu",
+                log_callback=self.update_log_safe,
+                profile_memory=True,
+                transcript_index=self.transcript_index
+            )
         except Exception as e:
-            logging.error(f"GPU проверка не прошла: {e}")
-            return False
-
-    def get_gpu_info(self):
-        if torch.cuda.is_available():
-            device_name = torch.cuda.get_device_name(0)
-            memory_allocated = torch.cuda.memory_allocated(0) / 1024**3
-            memory_reserved = torch.cuda.memory_reserved(0) / 1024**3
-            memory_total = torch.cuda.get_device_properties(0).total_memory / 1024**3
-            return {
-                'name': device_name,
-                'memory_allocated': memory_allocated,
-                'memory_reserved': memory_reserved,
-                'memory_total': memory_total,
-                'device_count': torch.cuda.device_count()
-            }
-        return None
+            error_msg = f"❌ КРИТИЧЕСКАЯ ОШИБКА при загрузке PyTorch/Whisper: {e}\n"
+            logging.error(error_msg)
+            self.update_log_safe(error_msg)
+            self.set_startup_progress(error_msg.strip(), 0)
+            self.finish_startup_report(error=str(e))
+            return
+
+        ready = threading.Event()
+
+        def on_device_ready():
+            self.use_gpu = use_gpu
+            self.engine = engine
+            self.show_device_info(device_info)
+            self.selected_precision.set(engine.precision)
+            self.precision_combo.configure(values=available_precisions(engine.device))
+            ready.set()
+            if not use_gpu and not self.startup_report:
+                messagebox.showwarning("Внимание",
+                                       "GPU недоступен. Транскрибация будет выполнена на CPU.\n"
+                                       "Производительность может быть ниже.")
+
+        self.root.after(0, on_device_ready)
+        ready.wait()
+        self.set_startup_progress(f"🧠 Загружаю модель {model_name}...", 0.5)
+        self._load_model_thread(model_name)
+
+    def show_device_info(self, device_info):
+        device_text = f"🚀 Устройство: {device_info['name']}"
+        if self.use_gpu and device_info['device_count'] > 1:
+            device_text += f" (доступно {device_info['device_count']} GPU)"
+        self.device_label.configure(text=device_text, text_color="#00FF00" if self.use_gpu else "#FF4500")
+        if self.use_gpu:
+            self.memory_label.configure(text=f"💾 Память: {device_info.get('memory_total', 0):.1f} GB")
+
+    def finish_startup_report(self, error=None):
+        """Для бенчмарка запуска: записывает отметки времени и закрывает приложение"""
+        if not self.startup_report:
+            return
+        report = dict(self.startup_marks, **({"error": error} if error else {}))
+        with open(self.startup_report, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        self.root.after(0, self.on_closing)
 
     def setup_whisper_logging(self):
         self.whisper_log_handler = WhisperLogHandler(self.update_log_safe)
@@ -189,137 +296,25 @@ class WhisperApp:
             sys.stdout = old_stdout
             sys.stderr = old_stderr
 
-    def format_segments_as_lines(self, segments, max_line_length=80):
-        if not segments:
-            return ""
-        
-        formatted_lines = []
-        
-        for segment in segments:
-            start = segment.get("start", 0)
-            end = segment.get("end", 0)
-            text = segment.get("text", "").strip()
-            
-            if not text:
-                continue
-            
-            start_time = f"{int(start//60):02d}:{start%60:06.3f}"
-            end_time = f"{int(end//60):02d}:{end%60:06.3f}"
-            timestamp = f"[{start_time} --> {end_time}]"
-            
-            available_width = max_line_length - len(timestamp) - 1
-            if available_width > 20 and len(text) > available_width:
-                wrapped_text = textwrap.fill(text, width=available_width)
-                text_lines = wrapped_text.split('\n')
-                for i, line in enumerate(text_lines):
-                    if i == 0:
-                        formatted_lines.append(f"{timestamp} {line}")
-                    else:
-                        formatted_lines.append(f"{' ' * len(timestamp)} {line}")
-            else:
-                formatted_lines.append(f"{timestamp} {text}")
-        
-        return '\n'.join(formatted_lines)
-
-    def format_text_with_line_breaks(self, text, max_line_length=80):
-        if not text or not text.strip():
-            return text
-        
-        text = ' '.join(text.split())
-        
-        if len(text) <= max_line_length:
-            return text
-        
-        sentences = re.split(r'([.!?]+\s*)', text)
-        formatted_lines = []
-        current_line = ""
-        
-        i = 0
-        while i < len(sentences):
-            sentence = sentences[i].strip()
-            if not sentence:
-                i += 1
-                continue
-            
-            if sentence in '.!?' or (len(sentence) <= 3 and re.match(r'[.!?]+', sentence)):
-                if current_line:
-                    current_line += sentence
-                i += 1
-                continue
-            
-            test_line = current_line + " " + sentence if current_line else sentence
-            
-            if len(test_line) <= max_line_length:
-                current_line = test_line
-            else:
-                if current_line:
-                    formatted_lines.append(current_line)
-                
-                if len(sentence) > max_line_length:
-                    wrapped = textwrap.fill(sentence, width=max_line_length)
-                    formatted_lines.extend(wrapped.split('\n'))
-                    current_line = ""
-                else:
-                    current_line = sentence
-            
-            i += 1
-        
-        if current_line:
-            formatted_lines.append(current_line)
-        
-        return '\n'.join(formatted_lines)
-
     def update_output_safe(self, text):
-        def update():
-            try:
-                self.output.insert("end", text)
-                self.output.see("end")
-            except tk.TclError:
-                pass
-        
-        try:
-            self.root.after(0, update)
-        except tk.TclError:
-            pass
+        self.ui_updates.put("output", text)
 
     def update_log_safe(self, text):
-        def update():
-            try:
-                is_transcribing = getattr(self, 'is_transcribing', False)
-                if "Начинаю обработку" in text or not is_transcribing:
-                    self.log_output.insert("end", text)
-                    self.log_output.see("end")
-                elif is_transcribing:
-                    self.output.insert("end", text)
-                    self.output.see("end")
-            except (tk.TclError, AttributeError):
-                pass
-        
-        try:
-            self.root.after(0, update)
-        except tk.TclError:
-            pass
+        self.ui_updates.put("log_output", text)
 
     def create_widgets(self):
         main_frame = ctk.CTkFrame(self.root, corner_radius=0)
         main_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
-        device_info = self.get_gpu_info() if self.use_gpu else {"name": "CPU (без GPU)"}
-        device_text = f"🚀 Устройство: {device_info['name']}"
-        if self.use_gpu and device_info['device_count'] > 1:
-            device_text += f" (доступно {device_info['device_count']} GPU)"
-        memory_text = f"💾 Память: {device_info.get('memory_total', 0):.1f} GB" if self.use_gpu else ""
-
         main_frame.grid_columnconfigure((0, 1), weight=1)
         main_frame.grid_rowconfigure((0, 1, 2), weight=1)
 
-        device_label = ctk.CTkLabel(main_frame, text=device_text, font=ctk.CTkFont("Arial", 14, "bold"), 
-                                   text_color="#00FF00" if self.use_gpu else "#FF4500")
-        device_label.grid(row=0, column=0, columnspan=2, pady=5)
+        self.device_label = ctk.CTkLabel(main_frame, text="🔍 Устройство: определяется...",
+                                         font=ctk.CTkFont("Arial", 14, "bold"), text_color="#AAAAAA")
+        self.device_label.grid(row=0, column=0, columnspan=2, pady=5)
 
-        if memory_text:
-            memory_label = ctk.CTkLabel(main_frame, text=memory_text, font=ctk.CTkFont("Arial", 12), text_color="#1E90FF")
-            memory_label.grid(row=1, column=0, columnspan=2, pady=2)
+        self.memory_label = ctk.CTkLabel(main_frame, text="", font=ctk.CTkFont("Arial", 12), text_color="#1E90FF")
+        self.memory_label.grid(row=1, column=0, columnspan=2, pady=2)
 
         model_label = ctk.CTkLabel(main_frame, text="Модель:", font=ctk.CTkFont("Arial", 14))
         model_label.grid(row=2, column=0, pady=2, sticky="e")
@@ -333,6 +328,22 @@ class WhisperApp:
                                           font=ctk.CTkFont("Arial", 12), width=120)
         apply_model_button.grid(row=2, column=1, pady=5, padx=(155, 0), sticky="w")
 
+        # Точность: на CPU int8 заметно ускоряет большие модели
+        self.precision_combo = ctk.CTkComboBox(main_frame, variable=self.selected_precision,
+                                               values=[],
+                                               font=ctk.CTkFont("Arial", 12), width=80)
+        self.precision_combo.grid(row=2, column=1, pady=5, padx=(285, 0), sticky="w")
+
+        self.language_var = tk.StringVar(value="auto")
+        language_combo = ctk.CTkComboBox(main_frame, variable=self.language_var, values=LANGUAGE_CHOICES,
+                                         font=ctk.CTkFont("Arial", 12), width=80)
+        language_combo.grid(row=2, column=1, pady=5, padx=(375, 0), sticky="w")
+
+        self.draft_model_var = tk.StringVar(value=NO_DRAFT)
+        draft_combo = ctk.CTkComboBox(main_frame, variable=self.draft_model_var, values=DRAFT_CHOICES,
+                                      font=ctk.CTkFont("Arial", 12), width=130)
+        draft_combo.grid(row=2, column=1, pady=5, padx=(465, 0), sticky="w")
+
         control_frame = ctk.CTkFrame(main_frame, corner_radius=10)
         control_frame.grid(row=3, column=0, columnspan=2, pady=10, sticky="nsew")
         control_frame.grid_columnconfigure(0, weight=1)
@@ -344,12 +355,61 @@ class WhisperApp:
                                      font=ctk.CTkFont("Arial", 14), width=200)
         select_button.pack(pady=5)
 
-        self.transcribe_btn = ctk.CTkButton(control_frame, text=f"🚀 Начать транскрибацию ({'GPU' if self.use_gpu else 'CPU'})",
-                                           command=self.start_transcription,
+        self.transcribe_btn = ctk.CTkButton(control_frame, text="Загрузка модели...",
+                                           command=self.start_transcription, state="disabled",
                                            font=ctk.CTkFont("Arial", 14, "bold"), width=250,
                                            fg_color="#4CAF50", text_color_disabled="#000000")
         self.transcribe_btn.pack(pady=5)
 
+        # Новое задание встает в очередь; выполняемое можно приостановить или отменить
+        job_frame = ctk.CTkFrame(control_frame, fg_color="transparent")
+        job_frame.pack(pady=5)
+        priority_label = ctk.CTkLabel(job_frame, text="Приоритет:", font=ctk.CTkFont("Arial", 12))
+        priority_label.pack(side="left", padx=5)
+        self.priority_var = tk.StringVar(value=PRIORITY_CHOICES[0])
+        priority_combo = ctk.CTkComboBox(job_frame, variable=self.priority_var, values=PRIORITY_CHOICES,
+                                         font=ctk.CTkFont("Arial", 12), width=70)
+        priority_combo.pack(side="left", padx=5)
+        self.pause_btn = ctk.CTkButton(job_frame, text="⏸ Пауза", command=self.toggle_pause_running,
+                                       font=ctk.CTkFont("Arial", 12), width=120)
+        self.pause_btn.pack(side="left", padx=5)
+        cancel_btn = ctk.CTkButton(job_frame, text="⏹ Отменить", command=self.cancel_running,
+                                   font=ctk.CTkFont("Arial", 12), width=120)
+        cancel_btn.pack(side="left", padx=5)
+
+        # Ход фоновой загрузки библиотек и модели; скрывается, когда модель готова
+        self.startup_status = ctk.CTkLabel(control_frame, text="⏳ Запуск...", font=ctk.CTkFont("Arial", 12))
+        self.startup_status.pack(pady=(5, 0))
+        self.startup_progress = ctk.CTkProgressBar(control_frame, width=300)
+        self.startup_progress.set(0)
+        self.startup_progress.pack(pady=(0, 5))
+
+        self.batched_var = tk.BooleanVar(value=False)
+        batched_check = ctk.CTkCheckBox(control_frame, text="⚡ Пакетное декодирование (VAD, пропуск тишины)",
+                                        variable=self.batched_var, font=ctk.CTkFont("Arial", 12))
+        batched_check.pack(pady=5)
+
+        self.diarize_var = tk.BooleanVar(value=False)
+        diarize_check = ctk.CTkCheckBox(control_frame, text="👥 Разделять спикеров",
+                                        variable=self.diarize_var, font=ctk.CTkFont("Arial", 12))
+        diarize_check.pack(pady=5)
+
+        self.language_per_chunk_var = tk.BooleanVar(value=False)
+        language_per_chunk_check = ctk.CTkCheckBox(control_frame, text="🌍 Язык для каждого фрагмента (смешанная речь)",
+                                                   variable=self.language_per_chunk_var,
+                                                   font=ctk.CTkFont("Arial", 12))
+        language_per_chunk_check.pack(pady=5)
+
+        self.normalize_var = tk.BooleanVar(value=False)
+        normalize_check = ctk.CTkCheckBox(control_frame, text="🎚️ Выровнять громкость речи",
+                                          variable=self.normalize_var, font=ctk.CTkFont("Arial", 12))
+        normalize_check.pack(pady=5)
+
+        self.trim_silence_var = tk.BooleanVar(value=False)
+        trim_silence_check = ctk.CTkCheckBox(control_frame, text="✂️ Вырезать длинные паузы",
+                                             variable=self.trim_silence_var, font=ctk.CTkFont("Arial", 12))
+        trim_silence_check.pack(pady=5)
+
         notebook = ctk.CTkTabview(main_frame, height=400)
         notebook.grid(row=4, column=0, columnspan=2, pady=10, sticky="nsew")
         main_frame.grid_rowconfigure(4, weight=1)
@@ -361,6 +421,41 @@ class WhisperApp:
         self.output = ctk.CTkTextbox(result_tab, font=ctk.CTkFont("Consolas", 12), wrap="word", height=300)
         self.output.pack(fill="both", expand=True, padx=10, pady=5)
 
+        jobs_tab = notebook.add("📋 Задания")
+        self.jobs_tree = ttk.Treeview(jobs_tab, columns=("file", "priority", "status", "position"),
+                                      show="headings", height=10)
+        for column, title, width in (("file", "Файл", 420), ("priority", "Приоритет", 90),
+                                     ("status", "Состояние", 150), ("position", "Готово до", 110)):
+            self.jobs_tree.heading(column, text=title)
+            self.jobs_tree.column(column, width=width, anchor="w" if column == "file" else "center")
+        self.jobs_tree.pack(fill="both", expand=True, padx=10, pady=5)
+        jobs_buttons = ctk.CTkFrame(jobs_tab, fg_color="transparent")
+        jobs_buttons.pack(fill="x", padx=10, pady=5)
+        for text, command in (("⏸ Пауза", lambda job_id: self.job_queue.pause(job_id)),
+                              ("▶️ Продолжить", lambda job_id: self.job_queue.resume(job_id)),
+                              ("⏹ Отменить", lambda job_id: self.job_queue.cancel(job_id)),
+                              ("⬆️ Приоритет", lambda job_id: self.change_priority(job_id, 1)),
+                              ("⬇️ Приоритет", lambda job_id: self.change_priority(job_id, -1)),
+                              ("📄 Результат", self.show_job_result),
+                              ("🗑️ Убрать", self.remove_job)):
+            button = ctk.CTkButton(jobs_buttons, text=text, font=ctk.CTkFont("Arial", 12), width=110,
+                                   command=lambda command=command: self.with_selected_job(command))
+            button.pack(side="left", padx=3)
+
+        search_tab = notebook.add("🔍 Поиск")
+        search_frame = ctk.CTkFrame(search_tab, fg_color="transparent")
+        search_frame.pack(fill="x", padx=10, pady=5)
+        search_entry = ctk.CTkEntry(search_frame, textvariable=self.search_query, font=ctk.CTkFont("Arial", 12),
+                                    placeholder_text="Слова, \"фраза\" или начало слова*")
+        search_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
+        search_entry.bind("<Return>", lambda event: self.run_search())
+        search_button = ctk.CTkButton(search_frame, text="🔍 Найти", command=self.run_search,
+                                      font=ctk.CTkFont("Arial", 12), width=120)
+        search_button.pack(side="left")
+
+        self.search_output = ctk.CTkTextbox(search_tab, font=ctk.CTkFont("Consolas", 12), wrap="word", height=300)
+        self.search_output.pack(fill="both", expand=True, padx=10, pady=5)
+
         log_tab = notebook.add("📊 Логи")
         log_label = ctk.CTkLabel(log_tab, text="🔍 Подробные логи запуска:", font=ctk.CTkFont("Arial", 14, "bold"))
         log_label.pack(anchor="w", padx=10, pady=5)
@@ -421,6 +516,7 @@ class WhisperApp:
             messagebox.showinfo("Готово", "Настройки применены!")
 
     def copy_to_clipboard(self):
+        self.finish_render()
         text = self.output.get("0.0", "end").strip()
         if not text:
             messagebox.showinfo("Пусто", "Нет текста для копирования.")
@@ -434,48 +530,127 @@ class WhisperApp:
             messagebox.showerror("Ошибка", f"Не удалось скопировать: {e}")
 
     def clear_output(self):
+        self.ui_updates.discard("output")
+        self.ui_updates.discard("log_output")
+        self._render_state = None
         self.output.delete("0.0", "end")
         self.log_output.delete("0.0", "end")
-        self.is_transcribing = False
         self.last_result = None
+        self.render_cache.clear()
+
+    def run_search(self):
+        """Поиск по индексу готовых транскрипций: сегменты с метками времени"""
+        query = self.search_query.get().strip()
+        if not query:
+            return
+        self.search_output.delete("0.0", "end")
+        if self.transcript_index is None:
+            self.search_output.insert("end", "❌ Индекс поиска недоступен, подробности в transcription.log\n")
+            return
+        try:
+            matches = self.transcript_index.search(query, limit=SEARCH_LIMIT)
+        except sqlite3.Error as e:
+            self.search_output.insert("end", f"❌ Ошибка поиска: {e}\n")
+            return
+        if not matches:
+            stats = self.transcript_index.stats()
+            self.search_output.insert("end", f"🔍 Ничего не найдено (в индексе {stats['transcripts']} файлов)\n")
+            return
+        lines = []
+        for match in matches:
+            speaker = f"{match['speaker']}: " if match["speaker"] else ""
+            start, end = match["start_ms"], match["end_ms"]
+            lines.append(f"📁 {os.path.basename(match['path'])}  "
+                         f"[{format_timestamp(start / 1000)} --> {format_timestamp(end / 1000)}]  {start}-{end} мс\n"
+                         f"    {speaker}{match['snippet']}\n")
+        more = " (показаны самые релевантные)" if len(matches) == SEARCH_LIMIT else ""
+        lines.append(f"🔍 Найдено сегментов: {len(matches)}{more}")
+        self.search_output.insert("end", "\n".join(lines))
+
+    def refresh_jobs(self):
+        """Список заданий в порядке выполнения; выделение сохраняется"""
+        try:
+            selection = self.jobs_tree.selection()
+            self.jobs_tree.delete(*self.jobs_tree.get_children())
+            for job in self.job_queue.jobs():
+                position = f"{job['position']:.0f} с" if job["position"] else ""
+                self.jobs_tree.insert("", "end", iid=str(job["id"]),
+                                      values=(os.path.basename(job["path"]), job["priority"],
+                                              JOB_STATUS_LABELS.get(job["status"], job["status"]), position))
+            self.jobs_tree.selection_set([iid for iid in selection if self.jobs_tree.exists(iid)])
+            running = self.job_queue.running_job()
+            self.pause_btn.configure(text="▶️ Продолжить" if running and running["status"] == "paused"
+                                     else "⏸ Пауза")
+        except tk.TclError:
+            pass
+
+    def poll_jobs(self):
+        # Позиция выполняемого задания меняется с каждым сегментом, поэтому список обновляется по таймеру
+        self.refresh_jobs()
+        self.root.after(JOBS_REFRESH_MS, self.poll_jobs)
+
+    def with_selected_job(self, command):
+        selection = self.jobs_tree.selection()
+        if not selection:
+            messagebox.showinfo("Информация", "Выберите задание в списке.")
+            return
+        command(int(selection[0]))
+
+    def change_priority(self, job_id, delta):
+        job = self.job_queue.job(job_id)
+        if job is not None:
+            self.job_queue.set_priority(job_id, job["priority"] + delta)
+
+    def show_job_result(self, job_id):
+        job = self.job_queue.job(job_id)
+        if job is None or not job.get("result"):
+            messagebox.showinfo("Пусто", "У задания нет результата.")
+            return
+        self.last_result = job["result"]
+        self.result_filename = job["path"]
+        self._last_processing_time = job.get("processing_time", 0)
+        self.display_result(job["result"])
+
+    def remove_job(self, job_id):
+        try:
+            self.job_queue.remove(job_id)
+        except ValueError as e:
+            messagebox.showwarning("Внимание", str(e))
+
+    def toggle_pause_running(self):
+        running = self.job_queue.running_job()
+        if running is None:
+            return
+        if running["status"] == "paused":
+            self.job_queue.resume(running["id"])
+        else:
+            self.job_queue.pause(running["id"])
+
+    def cancel_running(self):
+        running = self.job_queue.running_job()
+        if running is not None:
+            self.job_queue.cancel(running["id"])
+
+    def hide_startup_progress(self):
+        self.startup_status.pack_forget()
+        self.startup_progress.pack_forget()
 
-    def load_model(self):
-        model_name = self.selected_model.get()
-        threading.Thread(target=lambda: self._load_model_thread(model_name), daemon=True).start()
-    
     def _load_model_thread(self, model_name):
         try:
-            device_info = self.get_gpu_info() if self.use_gpu else {"name": "CPU"}
-            device = "cuda:0" if self.use_gpu else "cpu"
             self.setup_whisper_logging()
             
-            cache_dir = os.path.expanduser("~/.cache/whisper")
-            if not os.path.exists(cache_dir):
-                os.makedirs(cache_dir)
-                self.update_log_safe(f"📂 Создаю кэш моделей в: {cache_dir}\n")
-            os.environ["WHISPER_CACHE_DIR"] = cache_dir
-            self.update_log_safe(f"📂 Кэш моделей установлен в: {cache_dir}\n")
-            
-            try:
-                urllib.request.urlopen('https://huggingface.co', timeout=5)
-            except:
-                raise Exception("Интернет-соединение отсутствует. Подключитесь к интернету для загрузки модели.")
-            
             with self.capture_whisper_output():
-                self.model = whisper.load_model(model_name, device=device)
+                self.engine.load_model(model_name)
             
-            if hasattr(self.model, 'device'):
-                actual_device = str(self.model.device)
-                if self.use_gpu and "cuda" not in actual_device.lower():
-                    raise Exception(f"Модель загрузилась на {actual_device}, а не на GPU!")
-                elif not self.use_gpu and "cpu" not in actual_device.lower():
-                    raise Exception(f"Модель загрузилась на {actual_device}, а не на CPU!")
-            
-            self.update_log_safe(f"\n🚀 Модель {model_name} успешно загружена на {device_info['name']}!\n")
+            self.update_log_safe(f"\n🚀 Модель {model_name} успешно загружена на {self.engine.device_name()}!\n")
             self.update_log_safe("📋 Готов к транскрибации!\n\n")
             
             self.root.after(0, lambda: self.transcribe_btn.configure(
                 text=f"🚀 Начать транскрибацию ({'GPU' if self.use_gpu else 'CPU'})", state="normal"))
+            self.root.after(0, self.hide_startup_progress)
+            if "model_ready" not in self.startup_marks:
+                self.mark_startup("model_ready")
+                self.finish_startup_report()
             
         except Exception as e:
             error_msg = f"❌ КРИТИЧЕСКАЯ ОШИБКА при загрузке модели: {e}\n\n"
@@ -488,17 +663,37 @@ class WhisperApp:
                 self.update_log_safe("1. Не установлен PyTorch с CUDA поддержкой\n")
                 self.update_log_safe("2. Устаревшие драйверы NVIDIA\n")
                 self.update_log_safe("3. Недостаточно памяти GPU\n")
-            self.update_log_safe("4. Отсутствует интернет-соединение для загрузки модели\n\n")
+            self.update_log_safe("4. Модели нет в локальном кэше и нет интернет-соединения для загрузки\n\n")
             self.update_log_safe("💡 Для установки PyTorch с CUDA (если требуется GPU):\n")
             self.update_log_safe("pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cu118\n")
             self.update_log_safe("💡 Для ручной загрузки модели: скачайте с https://huggingface.co/whisper и поместите в C:\\Users\\<Имя пользователя>\\.cache\\whisper.\n")
             
-            self.root.after(0, lambda: messagebox.showerror("Критическая ошибка", 
-                                  f"Не удалось загрузить модель:\n{e}\n\n"
-                                  "Проверьте интернет-соединение или установите модель вручную в C:\\Users\\<Имя пользователя>\\.cache\\whisper."))
+            self.set_startup_progress("❌ Модель не загружена, подробности в логах", 0)
+            if "model_ready" not in self.startup_marks and self.startup_report:
+                self.finish_startup_report(error=str(e))
+                return
+            # Имя исключения удаляется после except, а лямбда выполнится позже: текст связывается сразу
+            self.root.after(0, lambda error=str(e): messagebox.showerror("Критическая ошибка",
+                                  f"Не удалось загрузить модель:\n{error}\n\n"
+                                  "Модели нет в кэше: проверьте интернет-соединение или установите модель вручную в C:\\Users\\<Имя пользователя>\\.cache\\whisper."))
 
     def apply_selected_model(self):
-        if self.model:
+        if self.engine is None:
+            messagebox.showinfo("Информация", "Подождите: идет загрузка PyTorch и Whisper.")
+            return
+        if self.job_queue.running_job() is not None:
+            messagebox.showinfo("Информация", "Дождитесь окончания задания или отмените его, затем смените модель.")
+            return
+        try:
+            self.engine.set_precision(self.selected_precision.get())
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        draft_model = self.draft_model_var.get().strip()
+        self.engine.draft_model_name = None if draft_model in ("", NO_DRAFT) else draft_model
+        if self.engine.is_model_loaded(self.selected_model.get()):
+            messagebox.showinfo("Информация", f"Переключаюсь на модель {self.selected_model.get()} (уже в памяти)")
+        elif self.engine.model:
             messagebox.showinfo("Информация", f"Перезагружаю модель {self.selected_model.get()}...")
         else:
             messagebox.showinfo("Информация", f"Загружаю модель {self.selected_model.get()}...")
@@ -529,166 +724,197 @@ class WhisperApp:
             messagebox.showwarning("Внимание", "Сначала выберите аудио или видео файл.")
             return
         
-        if not self.model:
+        if self.engine is None or not self.engine.model:
             messagebox.showwarning("Внимание", "Модель еще не загружена. Выберите и примените модель.")
             return
 
-        if self.use_gpu and not torch.cuda.is_available():
+        import transcriber_core
+        if self.use_gpu and not transcriber_core.check_gpu_availability():
             messagebox.showerror("Ошибка GPU", "GPU стал недоступен! Переключение на CPU не поддерживается после загрузки.")
             return
 
-        self.output.delete("0.0", "end")
-        self.log_output.delete("0.0", "end")
-        self.is_transcribing = False
-        
-        self.transcribe_btn.configure(state="disabled", text=f"⚡ Транскрибация ({'GPU' if self.use_gpu else 'CPU'})...", text_color="#000000")
-        
-        threading.Thread(target=self.transcribe_audio, daemon=True).start()
-
-    def display_result(self, result):
-        device_info = self.get_gpu_info() if self.use_gpu else {"name": "CPU"}
-        processing_time = self._last_processing_time
-        
-        result_header = f"=== ⚡ РЕЗУЛЬТАТ ТРАНСКРИБАЦИИ ===\n"
-        result_header += f"🚀 Устройство: {device_info['name']}\n"
-        result_header += f"📁 Файл: {os.path.basename(self.filename)}\n"
-        result_header += f"⏱️ Время: {processing_time:.1f} секунд\n"
-        result_header += f"🌍 Язык: {result.get('language', 'ru')}\n"
-        result_header += f"📝 Символов: {len(result['text'])}\n"
-        if processing_time > 0:
-            result_header += f"🚀 Скорость: {len(result['text'])/processing_time:.0f} символов/сек\n"
-        result_header += "=" * 60 + "\n\n"
-        
+        try:
+            priority = int(self.priority_var.get())
+        except ValueError:
+            messagebox.showwarning("Внимание", "Приоритет должен быть числом.")
+            return
+        # Настройки запоминаются при добавлении: задание может дождаться очереди уже с другими
+        language = self.language_var.get().strip().lower()
+        options = {"batched": self.batched_var.get(),
+                   "language": None if language in ("", "auto") else language,
+                   "language_per_chunk": self.language_per_chunk_var.get(),
+                   "normalize_loudness": self.normalize_var.get(),
+                   "trim_silence": self.trim_silence_var.get(),
+                   "diarize": self.diarize_var.get(),
+                   "line_length": self.get_line_length()}
+        self.job_queue.add(self.filename, priority, options)
+        self.update_log_safe(f"📋 В очереди: {os.path.basename(self.filename)} (приоритет {priority})\n")
+
+    def get_line_length(self):
         try:
             max_line_length = int(self.line_length_var.get())
             if max_line_length < 20:
                 max_line_length = 80
         except ValueError:
             max_line_length = 80
-            
+        return max_line_length
+
+    def display_result(self, result):
+        result_header = build_result_header(result, self.engine.device_name(),
+                                            os.path.basename(self.result_filename), self._last_processing_time)
+        self.root.after(0, lambda: self.render_result(result, result_header))
+
+    def render_result(self, result, result_header):
+        """Выводит результат постранично (в главном потоке).
+
+        Первая страница (видимое начало текста) появляется сразу, остальные
+        дописываются в следующих проходах главного цикла, поэтому окно не
+        замирает на длинных записях. Блоки берутся из кэша рендера: повторное
+        применение уже показанных настроек не форматирует текст заново.
+        """
         format_mode = self.format_mode_var.get()
         show_timestamps = self.show_timestamps_var.get()
-        
-        formatted_text = ""
-        if format_mode == "segments" and "segments" in result and result["segments"]:
-            if show_timestamps:
-                formatted_text = self.format_segments_as_lines(result["segments"], max_line_length)
-            else:
-                for segment in result["segments"]:
-                    text = segment.get("text", "").strip()
-                    if text:
-                        if len(text) > max_line_length:
-                            wrapped_text = textwrap.fill(text, width=max_line_length)
-                            formatted_text += wrapped_text + "\n\n"
-                        else:
-                            formatted_text += text + "\n\n"
-                formatted_text = formatted_text.rstrip()
-        elif format_mode == "paragraphs" and "segments" in result and result["segments"]:
-            paragraphs = []
-            current_paragraph = []
-            for segment in result["segments"]:
-                text = segment.get("text", "").strip()
-                if text:
-                    current_paragraph.append(text)
-                    if (segment.get("end", 0) - segment.get("start", 0) > 2.0 or 
-                        text.rstrip().endswith(('.', '!', '?'))):
-                        if current_paragraph:
-                            paragraph_text = ' '.join(current_paragraph)
-                            wrapped_text = textwrap.fill(paragraph_text, width=max_line_length)
-                            paragraphs.append(wrapped_text)
-                            current_paragraph = []
-            if current_paragraph:
-                paragraph_text = ' '.join(current_paragraph)
-                wrapped_text = textwrap.fill(paragraph_text, width=max_line_length)
-                paragraphs.append(wrapped_text)
-            formatted_text = '\n\n'.join(paragraphs)
-        else:
-            formatted_text = self.format_text_with_line_breaks(result["text"], max_line_length)
-        
-        def update_final_result():
-            try:
-                self.output.delete("0.0", "end")
-                self.output.insert("end", result_header + formatted_text)
-            except Exception:
-                pass
-                
-        self.root.after(0, update_final_result)
+        self._render_generation += 1
+        self._render_state = {
+            "generation": self._render_generation,
+            "blocks": self.render_cache.iter_blocks(result, format_mode, self.get_line_length(), show_timestamps),
+            "separator": block_separator(effective_mode(result, format_mode), show_timestamps),
+            "started": False,
+        }
+        try:
+            # Строки потокового вывода, еще не попавшие в поле, заменяются итоговым текстом
+            self.ui_updates.discard("output")
+            self.output.delete("0.0", "end")
+            self.output.insert("end", result_header)
+        except Exception:
+            self._render_state = None
+            return
+        self._render_page(self._render_generation)
 
-    def transcribe_audio(self):
+    def _render_page(self, generation, max_blocks=RENDER_PAGE_BLOCKS):
+        state = self._render_state
+        # Более новый вывод (другой результат или настройки) отменяет оставшиеся страницы
+        if state is None or state["generation"] != generation:
+            return
+        page = list(itertools.islice(state["blocks"], max_blocks))
         try:
-            device_info = self.get_gpu_info() if self.use_gpu else {"name": "CPU"}
-            file_ext = os.path.splitext(self.filename)[1].lower()
-            file_type = "видео" if file_ext in ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.3gp'] else "аудио"
+            if page:
+                prefix = state["separator"] if state["started"] else ""
+                self.output.insert("end", prefix + state["separator"].join(page))
+                state["started"] = True
+        except Exception:
+            self._render_state = None
+            return
+        if max_blocks is None or len(page) < max_blocks:
+            self._render_state = None
+        else:
+            self.root.after(1, self._render_page, generation)
+
+    def finish_render(self):
+        """Дописывает оставшиеся страницы сразу (перед копированием и сохранением)"""
+        if self._render_state is not None:
+            self._render_page(self._render_state["generation"], max_blocks=None)
+
+    def run_job(self, job, control):
+        """Выполняет задание в потоке очереди с настройками, запомненными при добавлении"""
+        options = job["options"]
+        filename = job["path"]
+        self.engine.batched = options["batched"]
+        self.engine.language = options["language"]
+        self.engine.language_per_chunk = options["language_per_chunk"]
+        self.engine.normalize_loudness = options["normalize_loudness"]
+        self.engine.trim_silence = options["trim_silence"]
+        self.ui_updates.discard("output")
+        self.root.after(0, lambda: self.output.delete("0.0", "end"))
+        try:
+            device_name = self.engine.device_name()
+            file_type = media_files.get_file_type(filename)
             
-            self.update_log_safe(f"🎬 Начинаю обработку {file_type} файла на {device_info['name']}...\n")
-            self.update_log_safe(f"📁 Файл: {os.path.basename(self.filename)}\n")
+            self.update_log_safe(f"🎬 Начинаю обработку {file_type} файла на {device_name}...\n")
+            self.update_log_safe(f"📁 Файл: {os.path.basename(filename)}\n")
             if self.use_gpu:
-                self.update_log_safe(f"🚀 GPU: {device_info['name']}\n")
-                self.update_log_safe(f"💾 Память до обработки: {device_info['memory_allocated']:.2f} GB\n")
+                self.update_log_safe(f"🚀 GPU: {device_name}\n")
+                self.update_log_safe(f"💾 Память до обработки: {self.engine.memory_allocated():.2f} GB\n")
             self.update_log_safe("=" * 50 + "\n")
             
-            if self.use_gpu:
-                torch.cuda.empty_cache()
+            self.update_log_safe(f"Начинаю обработку на {device_name} с моделью {self.engine.model_name}...\n")
             
-            start_time = time.time()
+            line_length = options["line_length"]
             
-            self.is_transcribing = True
-            self.update_log_safe(f"Начинаю обработку на {device_info['name']} с моделью {self.selected_model.get()}...\n")
+            def show_segment(segment):
+                job["position"] = segment["end"]
+                line = format_segments_as_lines([segment], line_length)
+                if line:
+                    self.update_output_safe(line + "\n")
             
-            exe_dir = os.path.dirname(sys.executable)
-            ffmpeg_path = os.path.join(exe_dir, "bin", "ffmpeg.exe")
-            if not os.path.exists(ffmpeg_path):
-                raise Exception(f"ffmpeg.exe not found at {ffmpeg_path}")
-            
-            with self.capture_whisper_output():
-                result = self.model.transcribe(
-                    self.filename,
-                    language="ru",
-                    task="transcribe",
-                    fp16=self.use_gpu,
-                    verbose=True,
-                    word_timestamps=True
-                )
+            result = self.engine.transcribe(filename, on_segment=show_segment, control=control)
+            if options["diarize"]:
+                control.check()
+                self.update_log_safe("👥 Разделяю спикеров...\n")
+                self.engine.diarize(filename, result)
+            self.engine.index_result(filename, result)
             
-            processing_time = time.time() - start_time
+            processing_time = self.engine.last_processing_time
+            job["processing_time"] = processing_time
             self._last_processing_time = processing_time
             self.last_result = result
+            self.result_filename = filename
             
-            self.is_transcribing = False
-            
+            self.update_log_safe(f"\n✅ Транскрибация завершена за {processing_time:.1f} секунд!\n")
             if self.use_gpu:
-                gpu_info_after = self.get_gpu_info()
-                self.update_log_safe(f"\n✅ Транскрибация завершена за {processing_time:.1f} секунд!\n")
-                self.update_log_safe(f"💾 Память {device_info['name']} после: {gpu_info_after['memory_allocated']:.2f} GB\n")
-            else:
-                self.update_log_safe(f"\n✅ Транскрибация завершена за {processing_time:.1f} секунд!\n")
+                self.update_log_safe(f"💾 Память {device_name} после: {self.engine.memory_allocated():.2f} GB\n")
             
             self.update_log_safe(f"📝 Обработано символов: {len(result['text'])}\n")
             if processing_time > 0:
                 self.update_log_safe(f"🚀 Скорость: {len(result['text'])/processing_time:.0f} символов/сек\n")
+                if result.get("duration"):
+                    self.update_log_safe(f"⏳ RTF: {processing_time/result['duration']:.3f} "
+                                         f"({result['duration']/processing_time:.1f}x быстрее реального времени)\n")
+            ui_stats = self.ui_updates.stats()
+            self.update_log_safe(f"🖥️ Обновления интерфейса: объединено {ui_stats['merged']}, "
+                                 f"отброшено {ui_stats['dropped']}, удалено строк {ui_stats['trimmed_lines']}\n")
             self.update_log_safe("=" * 60 + "\n")
             
             self.display_result(result)
-            
-            if self.use_gpu:
-                torch.cuda.empty_cache()
-            
+            return result
+
+        except TranscriptionCancelled:
+            if control.requeue:
+                # Вытесненное задание вернется в очередь, журнал продолжит его с контрольной точки
+                self.update_log_safe(f"⏭ {os.path.basename(filename)} уступает место заданию "
+                                     f"с большим приоритетом и продолжится позже\n")
+                raise
+            partial = self.engine.last_partial_result
+            self.update_log_safe(f"⏹ Задание отменено: {os.path.basename(filename)}\n")
+            if partial:
+                job["result"] = partial
+                self.last_result = partial
+                self.result_filename = filename
+                self.update_log_safe(f"📝 Частичный результат: {len(partial['segments'])} сегментов, "
+                                     f"его можно сохранить кнопкой сохранения\n")
+            raise
+
         except Exception as e:
-            self.is_transcribing = False
             error_msg = f"❌ Ошибка при транскрибации: {e}\n"
             logging.error(error_msg)
             self.update_log_safe(error_msg)
             
-            if self.use_gpu:
-                torch.cuda.empty_cache()
+            partial = self.engine.last_partial_result
+            if partial:
+                # Готовые сегменты не теряются: их можно сохранить, а журнал позволит продолжить
+                job["result"] = partial
+                self.last_result = partial
+                self.result_filename = filename
+                self.update_log_safe(f"📝 Частичный результат: {len(partial['segments'])} сегментов, "
+                                     f"его можно сохранить кнопкой сохранения\n")
+            
+            self.engine.release_memory()
                     
-            self.root.after(0, lambda: messagebox.showerror("Ошибка транскрибации", str(e)))
-        
-        finally:
-            self.root.after(0, lambda: self.transcribe_btn.configure(
-                state="normal", text=f"🚀 Начать транскрибацию ({'GPU' if self.use_gpu else 'CPU'})", text_color="white"))
+            self.root.after(0, lambda error=str(e): messagebox.showerror("Ошибка транскрибации", error))
+            raise
 
     def save_result(self):
+        self.finish_render()
         text = self.output.get("0.0", "end").strip()
         if not text:
             messagebox.showinfo("Пусто", "Нет результата для сохранения.")
@@ -696,11 +922,15 @@ class WhisperApp:
         
         filetypes = [
             ("Текстовые файлы", "*.txt"),
+            ("Субтитры SRT", "*.srt"),
+            ("Субтитры WebVTT", "*.vtt"),
+            ("JSON (сегменты и слова)", "*.json"),
+            ("TSV", "*.tsv"),
             ("Все файлы", "*.*")
         ]
         
-        if self.filename:
-            base_name = os.path.splitext(os.path.basename(self.filename))[0]
+        if self.result_filename:
+            base_name = os.path.splitext(os.path.basename(self.result_filename))[0]
             initialfile = f"{base_name}_transcript.txt"
         else:
             initialfile = "transcript.txt"
@@ -712,30 +942,62 @@ class WhisperApp:
         )
         
         if save_path and save_path.strip():
+            export_format = os.path.splitext(save_path)[1].lstrip(".").lower()
             try:
-                with open(save_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
+                if export_format in EXPORT_FORMATS:
+                    # Субтитры и данные строятся по сегментам результата, а не по тексту в поле
+                    if not self.last_result:
+                        messagebox.showinfo("Пусто", "Нет сегментов для экспорта.")
+                        return
+                    export_result(self.last_result, {export_format: save_path})
+                else:
+                    with open(save_path, 'w', encoding='utf-8') as f:
+                        f.write(text)
                 messagebox.showinfo("Готово", f"Результат сохранен в:\n{save_path}")
             except Exception as e:
                 messagebox.showerror("Ошибка сохранения", f"Не удалось сохранить файл:\n{e}")
 
     def on_closing(self):
         """Очистка при закрытии окна"""
+        if self.job_queue.running_job() is not None and not messagebox.askokcancel(
+                "Транскрибация не завершена",
+                "Транскрибация еще идет. Готовые сегменты сохранены в журнале, и при следующем "
+                "запуске этого файла обработка продолжится с последней контрольной точки.\n\nЗакрыть?"):
+            return
+        self.ui_updates.stop()
+        # Выполняемое задание отменяется на границе окна, прежде чем модель будет выгружена
+        self.job_queue.stop(timeout=5)
         self.cleanup_whisper_logging()
-        if self.use_gpu:
-            torch.cuda.empty_cache()
+        if self.engine is not None:
+            self.engine.model = None
+            self.engine.model_pool.clear()
+            self.engine.release_memory()
+        if self.transcript_index is not None:
+            self.transcript_index.close()
         self.root.quit()
         self.root.destroy()
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Whisper Transcriber - GPU/CPU")
+    parser.add_argument("--model", default="large-v2", help="Модель, загружаемая при запуске")
+    parser.add_argument("--startup-report",
+                        help="Бенчмарк запуска: записать отметки времени в JSON и выйти после загрузки модели")
+    args = parser.parse_args(argv)
+
+    # Настройка логирования: при запуске, а не при импорте модуля
+    logging.basicConfig(
+        filename='transcription.log',
+        level=logging.ERROR,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     warnings.filterwarnings("ignore", category=FutureWarning)
     warnings.filterwarnings("ignore", category=UserWarning)
     
     root = ctk.CTk()
-    app = WhisperApp(root)
+    app = WhisperApp(root, model_name=args.model, startup_report=args.startup_report)
     root.mainloop()
     
-    if not getattr(sys, 'frozen', False):
+    if not getattr(sys, 'frozen', False) and not args.startup_report:
         input("Press Enter to exit...")
 
 if __name__ == "__main__":
@@ -0,0 +1,610 @@
+"""Консольный режим: пакетная транскрибация без GUI.
+
+Пример:
+    python transcriber_cli.py batch records/ "meetings/**/*.mp4" -o transcripts --model small
+    python transcriber_cli.py search "бюджет проекта"
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+import media_files
+from exporters import EXPORT_FORMATS, TranscriptExporter, export_result
+from precision import PRECISIONS
+from transcript_cache import TranscriptCache
+from transcript_index import DEFAULT_INDEX_PATH, TranscriptIndex
+from formatting import FORMAT_MODES, DEFAULT_LINE_LENGTH, format_result, build_result_header, \
+    format_segments_as_lines, format_timestamp
+
+MODEL_NAMES = ["base", "small", "medium", "large-v2", "large-v3"]
+
+
+def output_path_for(filename, output_dir, suffix="_transcript.txt"):
+    base_name = os.path.splitext(os.path.basename(filename))[0]
+    target_dir = output_dir or os.path.dirname(filename)
+    return os.path.join(target_dir, base_name + suffix)
+
+
+def write_transcript(filename, result, args, device_name, processing_time):
+    save_path = output_path_for(filename, args.output_dir)
+    text = format_result(result, args.format, args.line_length, not args.no_timestamps)
+    if not args.no_header:
+        text = build_result_header(result, device_name, os.path.basename(filename), processing_time) + text
+    with open(save_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return save_path
+
+
+def write_memory_profile(filename, profile, args):
+    """Временной ряд памяти задания рядом с результатом: <имя>.memory.json"""
+    if not args.memory_profile or not profile:
+        return None
+    save_path = output_path_for(filename, args.output_dir, ".memory.json")
+    with open(save_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f)
+    return save_path
+
+
+def export_paths_for(filename, args):
+    return {name: output_path_for(filename, args.output_dir, f".{name}") for name in args.export}
+
+
+def parse_export_formats(spec):
+    formats = [name.strip().lower() for name in (spec or "").split(",") if name.strip()]
+    unknown = [name for name in formats if name not in EXPORT_FORMATS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"неизвестный формат: {', '.join(unknown)}; "
+                                         f"доступны: {', '.join(EXPORT_FORMATS)}")
+    return formats
+
+
+def print_segment(segment):
+    line = format_segments_as_lines([segment], sys.maxsize)
+    if line:
+        print(line, flush=True)
+
+
+def parse_language(value):
+    """Код языка whisper; auto - определять автоматически"""
+    return None if value == "auto" else value
+
+
+def engine_options(args):
+    return {
+        "model_name": args.model,
+        "language": args.language,
+        "language_per_chunk": args.language_per_chunk,
+        "batched": args.batched,
+        "batch_size": args.batch_size,
+        "beam_size": args.beam_size,
+        "draft_model_name": args.draft_model,
+        "adaptive_batch_size": not args.fixed_batch_size,
+        "profile_memory": args.memory_profile,
+        "use_cache": not args.no_cache,
+        "normalize_loudness": args.normalize_loudness,
+        "trim_silence": args.trim_silence,
+        "use_journal": not args.no_resume,
+        "precision": args.precision,
+    }
+
+
+def open_index(args):
+    """Индекс поиска по готовым результатам; None при --no-index"""
+    return None if args.no_index else TranscriptIndex(args.index_db or DEFAULT_INDEX_PATH)
+
+
+def create_engine(args):
+    import transcriber_core
+    from audio_cache import AudioCache
+
+    options = engine_options(args)
+    if not args.no_cache:
+        options["transcript_cache"] = TranscriptCache(max_bytes=args.cache_size_mb * 1024 * 1024)
+        options["audio_cache"] = AudioCache(max_bytes=args.audio_cache_size_mb * 1024 * 1024)
+    options["transcript_index"] = open_index(args)
+    engine = transcriber_core.TranscriptionEngine(device=args.device, **options)
+    engine.log(f"🚀 Загружаю модель {args.model} на {engine.device_name()}...\n")
+    engine.load_model()
+    return engine
+
+
+def process_file(engine, filename, args):
+    """Транскрибация файла со всеми проходами и выводом результатов; возвращает путь к тексту"""
+    # Метки слов и спикеры появляются только после отдельных проходов, тогда экспорт идет по готовому результату
+    post_passes = args.word_timestamps or args.diarize
+    stream_export = args.export and not post_passes
+    with TranscriptExporter(export_paths_for(filename, args) if stream_export else {}) as exporter:
+        def on_segment(segment):
+            exporter.write_segment(segment)
+            if not args.quiet:
+                print_segment(segment)
+
+        result = engine.transcribe(filename, on_segment=on_segment, word_timestamps=args.word_timestamps)
+        exporter.finish(result)
+    if args.word_timestamps:
+        engine.align_words(filename, result)
+    if args.diarize:
+        engine.diarize(filename, result, args.speakers)
+    if post_passes and args.export:
+        export_result(result, export_paths_for(filename, args))
+    save_path = write_transcript(filename, result, args, engine.device_name(), engine.last_processing_time)
+    write_memory_profile(filename, engine.last_memory_profile, args)
+    engine.index_result(filename, result)
+    engine.log(f"✅ Готово за {engine.last_processing_time:.1f} секунд: {save_path}\n")
+    return save_path
+
+
+def run_batch(args):
+    # Указанное число спикеров включает их разделение
+    args.diarize = args.diarize or args.speakers is not None
+    files = media_files.collect_media_files(args.inputs)
+    if not files:
+        print("❌ Не найдено ни одного аудио/видео файла.")
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    pending = []
+    for index, filename in enumerate(files, 1):
+        save_path = output_path_for(filename, args.output_dir)
+        if os.path.exists(save_path) and not args.overwrite:
+            print(f"⏭️ [{index}/{len(files)}] Пропускаю, результат уже есть: {save_path}")
+        else:
+            pending.append(filename)
+    if not pending:
+        return 0
+
+    media_files.suppress_warnings()
+    if not media_files.setup_ffmpeg_path():
+        print("❌ Критическая ошибка: FFmpeg не найден!")
+        return 1
+
+    # torch и whisper загружаются только здесь: разбор аргументов и --help остаются быстрыми
+    import job_scheduler
+    import language_detection
+
+    if args.devices or args.cpu_workers:
+        devices = job_scheduler.parse_devices(args.devices, args.cpu_workers)
+        if len(devices) > 1:
+            return run_parallel(args, pending, devices)
+        args.device = devices[0]
+
+    engine = create_engine(args)
+
+    if engine.language is None and len(pending) > 1:
+        # Файлы одного языка идут подряд: язык определяется один раз и запоминается движком
+        groups = language_detection.group_by_language(pending, engine.detect_language)
+        pending = [filename for filenames in groups.values() for filename in filenames]
+        engine.log("🌍 Языки: " + ", ".join(f"{language or 'не определен'} - {len(filenames)}"
+                                          for language, filenames in groups.items()) + "\n")
+
+    failures = 0
+    batch_start = time.time()
+    for index, filename in enumerate(pending, 1):
+        engine.log(f"🎬 [{index}/{len(pending)}] {os.path.basename(filename)}\n")
+        try:
+            process_file(engine, filename, args)
+        except Exception as e:
+            failures += 1
+            logging.error(f"Ошибка при транскрибации {filename}: {e}")
+            engine.log(f"❌ Ошибка при транскрибации {filename}: {e}\n")
+
+    engine.log(f"\n📋 Обработано файлов: {len(pending) - failures}/{len(pending)} "
+               f"за {time.time() - batch_start:.1f} секунд\n")
+    return 1 if failures else 0
+
+
+def run_watch(args):
+    """Наблюдение за каталогами: новые записи транскрибируются по мере появления"""
+    import watch_folder
+
+    queue = watch_folder.WatchQueue(args.queue_db or watch_folder.DEFAULT_QUEUE_PATH)
+    if args.status:
+        counts = queue.counts()
+        print("📋 " + (", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+                       if counts else "Очередь пуста"))
+        for job in queue.jobs():
+            error = f" - {job['error']}" if job.get("error") else ""
+            print(f"  [{job['status']}] приоритет {job['priority']}: {job['path']}{error}")
+        return 0
+
+    roots = [watch_folder.WatchRoot(path) for path in args.dirs]
+    for path, priority in args.priority_dir:
+        try:
+            roots.append(watch_folder.WatchRoot(path, int(priority)))
+        except ValueError:
+            print(f"❌ Приоритет должен быть числом: {priority}")
+            return 1
+    if not roots:
+        print("❌ Не указано ни одного каталога для наблюдения.")
+        return 1
+    missing = [root.path for root in roots if not os.path.isdir(root.path)]
+    if missing:
+        print(f"❌ Каталог не найден: {', '.join(missing)}")
+        return 1
+    if args.retry_failed:
+        print(f"♻️ Возвращено в очередь заданий с ошибкой: {queue.retry_failed()}")
+
+    # Указанное число спикеров включает их разделение
+    args.diarize = args.diarize or args.speakers is not None
+    media_files.suppress_warnings()
+    if not media_files.setup_ffmpeg_path():
+        print("❌ Критическая ошибка: FFmpeg не найден!")
+        return 1
+    engine = create_engine(args)
+
+    def process(path, output_dir):
+        # Результаты рядом с исходником или в том же подкаталоге дерева --output-dir
+        job_args = copy.copy(args)
+        job_args.output_dir = output_dir
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        process_file(engine, path, job_args)
+
+    daemon = watch_folder.WatchDaemon(roots, queue, process, output_dir=args.output_dir,
+                                      settle_seconds=args.settle_seconds, poll_interval=args.poll_interval,
+                                      use_inotify=not args.poll, log_callback=engine.log)
+    daemon.run()
+    return 0
+
+
+def run_parallel(args, files, devices):
+    """Файлы распределяются между процессами, по одному на устройство"""
+    import job_scheduler
+
+    print(f"🚀 Запускаю {len(devices)} рабочих процессов: {', '.join(devices)}")
+    names = {job_id: os.path.basename(path) for job_id, path in enumerate(files)}
+
+    def on_event(event):
+        kind = event["type"]
+        if kind == "worker_ready":
+            print(f"📋 [{event['device']}] Модель {args.model} загружена")
+        elif kind == "worker_failed":
+            print(f"❌ [{event['device']}] Не удалось загрузить модель: {event['error']}")
+        elif kind == "started":
+            print(f"🎬 [{event['device']}] {names[event['job_id']]}")
+        elif kind == "failed":
+            logging.error(f"Ошибка при транскрибации {files[event['job_id']]}: {event['error']}")
+            print(f"❌ [{event['device']}] {names[event['job_id']]}: {event['error']}")
+        elif kind == "finished":
+            print(f"✅ [{event['device']}] {names[event['job_id']]} за {event['processing_time']:.1f} секунд")
+        elif kind == "languages":
+            print("🌍 Языки: " + ", ".join(f"{language or 'не определен'} - {len(job_ids)}"
+                                          for language, job_ids in event["groups"].items()))
+        elif kind == "done":
+            print(f"\n📋 Общее время: {event['elapsed']:.1f} секунд")
+        elif kind == "log":
+            # Журнал движка рабочего процесса (контрольные точки, предупреждения) - в stderr, отдельно от хода работы
+            for line in event["text"].splitlines():
+                if line.strip():
+                    print(f"[{event['device']}] {line}", file=sys.stderr)
+
+    options = engine_options(args)
+    if not args.no_cache:
+        # Кэши создаются в рабочих процессах: передаются только их пределы размера
+        options["transcript_cache_bytes"] = args.cache_size_mb * 1024 * 1024
+        options["audio_cache_bytes"] = args.audio_cache_size_mb * 1024 * 1024
+    scheduler = job_scheduler.JobScheduler(devices, options, on_event=on_event)
+    # Как и в одном процессе: рабочие сначала определяют язык файлов, затем файлы идут по языкам
+    states = scheduler.run(files, align_words=args.word_timestamps, diarize=args.diarize,
+                           num_speakers=args.speakers, group_languages=args.language is None)
+
+    failures = 0
+    indexed = []
+    for state in states.values():
+        if state["status"] != "finished":
+            failures += 1
+            continue
+        write_transcript(state["path"], state["result"], args, state["device"], state["processing_time"])
+        write_memory_profile(state["path"], state["memory_profile"], args)
+        if args.export:
+            export_result(state["result"], export_paths_for(state["path"], args))
+        indexed.append((os.path.abspath(state["path"]), state["result"], args.model, None))
+    index = open_index(args)
+    if index is not None and indexed:
+        # Результаты всех процессов - одной транзакцией
+        try:
+            index.add_results(indexed)
+        except sqlite3.Error as e:
+            logging.error(f"Не удалось добавить результаты в индекс поиска: {e}")
+            print(f"⚠️ Не удалось добавить результаты в индекс поиска: {e}")
+    print(f"📋 Обработано файлов: {len(files) - failures}/{len(files)}")
+    return 1 if failures else 0
+
+
+def run_search(args):
+    """Поиск по индексу: совпавшие сегменты с началом и концом в миллисекундах"""
+    index = TranscriptIndex(args.index_db or DEFAULT_INDEX_PATH)
+    query = " ".join(args.query)
+    matches = index.search(query, limit=args.limit, language=args.language, model=args.model,
+                           path_prefix=os.path.abspath(args.path) if args.path else None)
+    if args.json:
+        print(json.dumps(matches, ensure_ascii=False, indent=2))
+        return 0 if matches else 1
+    if not matches:
+        stats = index.stats()
+        print(f"🔍 Ничего не найдено (в индексе {stats['transcripts']} файлов, {stats['segments']} сегментов)")
+        return 1
+    for match in matches:
+        speaker = f"{match['speaker']}: " if match["speaker"] else ""
+        print(f"{match['path']}  [{format_timestamp(match['start_ms'] / 1000)} --> "
+              f"{format_timestamp(match['end_ms'] / 1000)}]  {match['start_ms']}-{match['end_ms']} мс")
+        print(f"    {speaker}{match['snippet']}")
+    print(f"🔍 Найдено сегментов: {len(matches)}")
+    return 0
+
+
+def run_bench(args):
+    import benchmark
+
+    media_files.suppress_warnings()
+    if not media_files.setup_ffmpeg_path():
+        print("❌ Критическая ошибка: FFmpeg не найден!")
+        return 1
+
+    models = [name.strip() for name in args.models.split(",") if name.strip()]
+    devices = benchmark.available_devices() if args.devices == "all" else \
+        [device.strip() for device in args.devices.split(",") if device.strip()]
+    durations = [int(value) for value in args.durations.split(",") if value.strip()]
+    precisions = [value.strip() for value in args.precisions.split(",") if value.strip()] \
+        if args.precisions else None
+
+    if args.files:
+        # Настоящие записи дают осмысленный WER при сравнении точностей
+        paths = media_files.collect_media_files(args.files)
+    else:
+        print(f"📂 Готовлю синтетический корпус в {args.corpus_dir}...")
+        paths = benchmark.make_corpus(args.corpus_dir, durations)
+    warmup_path = None if args.no_warmup else benchmark.make_warmup_clip(args.corpus_dir)
+
+    log_callback = (lambda text: None) if args.quiet else None
+    report = benchmark.run_benchmark(
+        models, devices, paths, output_path=args.output, warmup_path=warmup_path, log_callback=log_callback,
+        language=args.language, word_timestamps=args.word_timestamps, batched=args.batched,
+        repeat=args.repeat, precisions=precisions, keep_texts=args.keep_texts, draft_model=args.draft_model)
+
+    failures = 0
+    print(f"\n{'Модель':<10} {'Устройство':<10} {'Точность':<8} {'RTF':>8} {'Загрузка, с':>12} "
+          f"{'WER/fp32':>9} {'Ускорение':>10}  Этапы, с")
+    for result in report["results"]:
+        if "error" in result:
+            failures += 1
+            print(f"{result['model']:<10} {result['device']:<10} {result['precision']:<8} ❌ {result['error']}")
+            continue
+        summary = result["summary"]
+        stages = ", ".join(f"{name} {seconds:.2f}" for name, seconds in summary["stages"].items())
+        comparison = result.get("vs_fp32", {})
+        wer = f"{comparison['wer']:.2%}" if comparison.get("wer") is not None else "-"
+        speedup = f"{comparison['speedup']:.2f}x" if comparison.get("speedup") is not None else "-"
+        print(f"{result['model']:<10} {result['device']:<10} {result['precision']:<8} {summary['rtf']:>8.3f} "
+              f"{result['load_seconds']:>12.1f} {wer:>9} {speedup:>10}  {stages}")
+        decoding = summary.get("decoding")
+        if decoding and decoding["tokens_per_second"]:
+            acceptance = (f", черновик {result['draft_model']}: принято {decoding['acceptance_rate']:.1%}"
+                          if decoding["acceptance_rate"] is not None else "")
+            print(f"{'':<30} декодер {decoding['tokens_per_second']:.1f} токенов/с{acceptance}")
+    print(f"\n💾 Результаты сохранены: {args.output}")
+    return 1 if failures else 0
+
+
+def run_startup(args):
+    import benchmark
+
+    print("⏱️ Замеряю время запуска...")
+    report = benchmark.run_startup_benchmark(args.model, args.device, repeat=args.repeat, gui=not args.no_gui,
+                                             output_path=args.output)
+    print(f"\n{'Импорт':<20} {'Время, с':>9}  torch")
+    for module, measurement in report["imports"].items():
+        if "error" in measurement:
+            print(f"{module:<20} ❌ {measurement['error']}")
+        else:
+            print(f"{module:<20} {measurement['seconds']:>9.3f}  {'да' if measurement['loads_torch'] else 'нет'}")
+    for name, title in (("engine", "Без интерфейса"), ("gui", "Окно")):
+        if name in report:
+            stages = ", ".join(f"{key[:-len('_seconds')]} {value:.2f} с" for key, value in report[name].items()
+                               if key.endswith("_seconds"))
+            error = f" ❌ {report[name]['error']}" if "error" in report[name] else ""
+            print(f"{title}: {stages}{error}")
+    print(f"\n💾 Результаты сохранены: {args.output}")
+
+    problems = benchmark.check_startup_budget(report, args.max_import_seconds, args.max_first_paint_seconds)
+    for problem in problems:
+        print(f"❌ {problem}")
+    return 1 if problems else 0
+
+
+def run_serve(args):
+    # Импорт здесь: пакетному режиму модуль сервиса не нужен
+    import transcriber_service
+    from audio_cache import AudioCache
+
+    media_files.suppress_warnings()
+    if not media_files.setup_ffmpeg_path():
+        print("❌ Критическая ошибка: FFmpeg не найден!")
+        return 1
+    options = engine_options(args)
+    if not args.no_cache:
+        options["transcript_cache"] = TranscriptCache(max_bytes=args.cache_size_mb * 1024 * 1024)
+        # Один кэш аудио на все потоки сервиса
+        options["audio_cache"] = AudioCache(max_bytes=args.audio_cache_size_mb * 1024 * 1024)
+    options["transcript_index"] = open_index(args)
+    service = transcriber_service.TranscriptionService(
+        options, device=args.device, max_concurrent=args.max_concurrent, max_queue=args.max_queue,
+        allowed_dirs=args.allow_dir, log_callback=None if args.quiet else lambda text: print(text, end="", flush=True))
+    transcriber_service.serve(service, args.host, args.port, args.max_upload_mb)
+    return 0
+
+
+def add_index_arguments(parser):
+    parser.add_argument("--no-index", action="store_true", help="Не добавлять результаты в индекс поиска")
+    parser.add_argument("--index-db", help="Файл индекса поиска SQLite "
+                                           "(по умолчанию ~/.cache/whisper-transcriber/transcript_index.sqlite)")
+
+
+def add_engine_arguments(parser):
+    """Модель, декодирование, предобработка и кэши: общие для batch, watch и serve"""
+    parser.add_argument("--model", default="large-v2", choices=MODEL_NAMES)
+    parser.add_argument("--device", help="cpu, cuda:0, cuda:1 ... (по умолчанию автоматически)")
+    parser.add_argument("--language", type=parse_language,
+                        help="Код языка (ru, en, ...); по умолчанию определяется по началу каждого файла")
+    parser.add_argument("--language-per-chunk", action="store_true",
+                        help="Определять язык каждого окна (записи со сменой языка); только без --language")
+    parser.add_argument("--precision", choices=PRECISIONS,
+                        help="fp32, fp16 (GPU), bf16 или int8 (CPU); по умолчанию fp16 на GPU и fp32 на CPU")
+    parser.add_argument("--batched", action="store_true",
+                        help="VAD + пакетное декодирование окон (быстрее на длинных записях, без меток слов)")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="Начальный размер батча для --batched; на GPU растет по свободной памяти")
+    parser.add_argument("--fixed-batch-size", action="store_true",
+                        help="Не увеличивать батч по свободной памяти (уменьшение при нехватке остается)")
+    parser.add_argument("--beam-size", type=int, help="Ширина луча (по умолчанию жадное декодирование)")
+    parser.add_argument("--draft-model", choices=MODEL_NAMES,
+                        help="Черновая модель (base, small) для спекулятивного жадного декодирования: "
+                             "текст тот же, декодер быстрее; без --beam-size и --batched")
+    parser.add_argument("--normalize-loudness", action="store_true",
+                        help="Выровнять громкость речи при подготовке аудио")
+    parser.add_argument("--trim-silence", action="store_true",
+                        help="Вырезать паузы длиннее 2 секунд (метки времени остаются по исходному файлу)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не использовать кэш результатов и подготовленного аудио")
+    parser.add_argument("--cache-size-mb", type=int, default=512, help="Предельный размер кэша результатов")
+    parser.add_argument("--audio-cache-size-mb", type=int, default=8192,
+                        help="Предельный размер кэша подготовленного аудио (16 кГц моно, ~230 МБ на час записи)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Не вести журнал и не продолжать прерванные задания с контрольной точки")
+    add_index_arguments(parser)
+
+
+def add_transcription_arguments(parser):
+    """Параметры движка и вывода результатов в файлы, общие для batch и watch"""
+    add_engine_arguments(parser)
+    parser.add_argument("--format", default="segments", choices=FORMAT_MODES)
+    parser.add_argument("--line-length", type=int, default=DEFAULT_LINE_LENGTH)
+    parser.add_argument("--no-timestamps", action="store_true", help="Не выводить временные метки")
+    parser.add_argument("--word-timestamps", action="store_true",
+                        help="Метки слов: отдельный проход выравнивания после декодирования")
+    parser.add_argument("--diarize", action="store_true",
+                        help="Разделение спикеров: метки 'Спикер N' в тексте и экспорте (на CPU после декодирования)")
+    parser.add_argument("--speakers", type=int, help="Число спикеров для --diarize, если известно")
+    parser.add_argument("--no-header", action="store_true", help="Не добавлять заголовок с метриками")
+    parser.add_argument("--export", type=parse_export_formats, default=[],
+                        help=f"Дополнительные форматы через запятую ({','.join(EXPORT_FORMATS)}), "
+                             f"пишутся по мере декодирования за один проход")
+    parser.add_argument("--memory-profile", action="store_true",
+                        help="Временной ряд памяти и загрузки устройства для каждого файла (<имя>.memory.json)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Не печатать сегменты по мере декодирования")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Whisper Transcriber - консольный режим")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="Транскрибировать каталог, маску или список файлов")
+    batch.add_argument("inputs", nargs="+", help="Файлы, каталоги или маски (glob)")
+    batch.add_argument("-o", "--output-dir", help="Каталог для результатов (по умолчанию рядом с исходником)")
+    batch.add_argument("--devices",
+                       help="Параллельная обработка: 'all' или список устройств через запятую (cuda:0,cuda:1)")
+    batch.add_argument("--cpu-workers", type=int, help="Число CPU-процессов, если GPU нет")
+    batch.add_argument("--overwrite", action="store_true", help="Перезаписывать существующие результаты")
+    add_transcription_arguments(batch)
+    batch.set_defaults(func=run_batch)
+
+    watch = subparsers.add_parser("watch", help="Наблюдать за каталогами и транскрибировать новые записи")
+    watch.add_argument("dirs", nargs="*", help="Наблюдаемые каталоги (с подкаталогами)")
+    watch.add_argument("-o", "--output-dir",
+                       help="Корень дерева результатов, повторяющего подкаталоги (по умолчанию рядом с исходником)")
+    watch.add_argument("--priority-dir", nargs=2, action="append", default=[], metavar=("DIR", "PRIORITY"),
+                       help="Каталог с приоритетом: его файлы идут раньше (больше - раньше; можно несколько раз)")
+    watch.add_argument("--settle-seconds", type=float, default=5.0,
+                       help="Файл ставится в очередь, когда его размер не меняется столько секунд")
+    watch.add_argument("--poll", action="store_true",
+                       help="Обходить каталоги вместо inotify (сетевые папки, где события не приходят)")
+    watch.add_argument("--poll-interval", type=float, default=2.0, help="Интервал обхода, секунд")
+    watch.add_argument("--queue-db", help="Файл очереди заданий SQLite, задания переживают перезапуск "
+                                          "(по умолчанию ~/.cache/whisper-transcriber/watch_queue.sqlite)")
+    watch.add_argument("--retry-failed", action="store_true", help="Вернуть в очередь задания с ошибкой")
+    watch.add_argument("--status", action="store_true", help="Показать очередь и выйти")
+    add_transcription_arguments(watch)
+    watch.set_defaults(func=run_watch)
+
+    serve = subparsers.add_parser("serve", help="HTTP-сервис: очередь заданий, статус и результат в разных форматах")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    add_engine_arguments(serve)
+    serve.add_argument("--memory-profile", action="store_true",
+                       help="Временной ряд памяти каждого задания: GET /jobs/<id>/memory")
+    serve.add_argument("--max-concurrent", type=int, default=1,
+                       help="Заданий одновременно; каждое использует свою копию модели")
+    serve.add_argument("--max-queue", type=int, default=16, help="Заданий в очереди, сверх - ответ 503")
+    serve.add_argument("--max-upload-mb", type=int, default=2048, help="Предельный размер загружаемого файла")
+    serve.add_argument("--allow-dir", action="append", default=[],
+                       help="Каталог, файлы из которого можно отправлять путем (можно несколько раз)")
+    serve.add_argument("-q", "--quiet", action="store_true", help="Не печатать журнал запросов")
+    serve.set_defaults(func=run_serve)
+
+    search = subparsers.add_parser("search", help="Поиск по тексту готовых транскрипций с метками времени")
+    search.add_argument("query", nargs="+",
+                        help="Слова (все должны встретиться в сегменте), \"фраза\" или начало слова*")
+    search.add_argument("--limit", type=int, default=50, help="Сколько сегментов вывести")
+    search.add_argument("--language", help="Только сегменты на этом языке (ru, en, ...)")
+    search.add_argument("--model", choices=MODEL_NAMES, help="Только результаты этой модели")
+    search.add_argument("--path", help="Только файлы из этого каталога")
+    search.add_argument("--index-db", help="Файл индекса поиска SQLite "
+                                           "(по умолчанию ~/.cache/whisper-transcriber/transcript_index.sqlite)")
+    search.add_argument("--json", action="store_true", help="Вывести совпадения в JSON")
+    search.set_defaults(func=run_search)
+
+    startup = subparsers.add_parser("startup", help="Бенчмарк запуска: импорт, первая отрисовка окна, готовность модели")
+    startup.add_argument("--model", default="base", choices=MODEL_NAMES)
+    startup.add_argument("--device", default="cpu", help="Устройство для замера готовности модели без интерфейса")
+    startup.add_argument("--repeat", type=int, default=3, help="Повторов замера импорта (берется медиана)")
+    startup.add_argument("--no-gui", action="store_true", help="Не запускать окно (например, без дисплея)")
+    startup.add_argument("--max-import-seconds", type=float,
+                         help="Лимит импорта точек входа; превышение дает код выхода 1")
+    startup.add_argument("--max-first-paint-seconds", type=float,
+                         help="Лимит времени до первой отрисовки окна; превышение дает код выхода 1")
+    startup.add_argument("-o", "--output", default="startup_results.json", help="Файл JSON с результатами")
+    startup.set_defaults(func=run_startup)
+
+    bench = subparsers.add_parser("bench", help="Бенчмарк: RTF и время по этапам на синтетическом корпусе")
+    bench.add_argument("--models", default=",".join(MODEL_NAMES), help="Модели через запятую")
+    bench.add_argument("--devices", default="all", help="'all' (CPU и все GPU) или список через запятую")
+    bench.add_argument("--durations", default="30,120,600", help="Длительности файлов корпуса в секундах")
+    bench.add_argument("--corpus-dir", default=os.path.expanduser("~/.cache/whisper-transcriber/bench-corpus"))
+    bench.add_argument("--precisions",
+                       help="Точности через запятую, например fp32,int8,bf16 (WER и ускорение считаются к fp32)")
+    bench.add_argument("--files", nargs="+", help="Свои записи вместо синтетического корпуса")
+    bench.add_argument("--keep-texts", action="store_true", help="Сохранить тексты транскрипций в JSON")
+    bench.add_argument("--repeat", type=int, default=1, help="Повторов на каждый файл")
+    bench.add_argument("--language", default="ru", type=parse_language, help="Код языка или auto")
+    bench.add_argument("--batched", action="store_true", help="Замерять пакетный режим (VAD + батчи)")
+    bench.add_argument("--draft-model", choices=MODEL_NAMES,
+                       help="Замерять спекулятивное декодирование с этой черновой моделью")
+    bench.add_argument("--word-timestamps", action="store_true",
+                       help="Замерять и отложенное выравнивание слов после декодирования")
+    bench.add_argument("--no-warmup", action="store_true", help="Не прогревать модель перед замером")
+    bench.add_argument("-o", "--output", default="benchmark_results.json", help="Файл JSON с результатами")
+    bench.add_argument("-q", "--quiet", action="store_true", help="Не печатать журнал загрузки моделей")
+    bench.set_defaults(func=run_bench)
+    return parser
+
+
+def main(argv=None):
+    # Журнал настраивается только при запуске: импорт модуля (тесты, GUI) не создает файл в текущем каталоге
+    logging.basicConfig(
+        filename='transcription.log',
+        level=logging.ERROR,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,628 @@
+"""Ядро транскрибации без зависимостей от GUI (tkinter/customtkinter)."""
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+import torch
+import whisper
+from whisper.audio import SAMPLE_RATE
+
+import diarization
+import language_detection
+import word_alignment
+from audio_cache import AudioCache
+from batch_sizing import BatchSizer
+from batched_decoding import transcribe_batched
+from stage_timer import NULL_TIMER
+from precision import default_precision, check_precision, load_int8_model, quantized_checkpoint_path
+from job_control import TranscriptionCancelled
+from job_journal import JobJournal
+from memory_profiler import MemoryProfiler
+from media_files import FFMPEG_BINARY, find_ffmpeg
+from model_pool import ModelPool
+from model_resolver import ModelResolver
+from speculative_decoding import check_draft_model
+from streaming_decoder import StreamingTranscriber
+from transcript_cache import TranscriptCache, hash_file, make_cache_key
+
+MODEL_CACHE_DIR = os.path.expanduser("~/.cache/whisper")
+# Разделение спикеров на CPU ограничено по времени: не дольше этой доли длительности записи
+DIARIZATION_MAX_RTF = 0.05
+DIARIZATION_MIN_BUDGET_SECONDS = 5.0
+
+
+def check_gpu_availability():
+    try:
+        if not torch.cuda.is_available():
+            return False
+        test_tensor = torch.tensor([1.0]).cuda()
+        del test_tensor
+        torch.cuda.empty_cache()
+        return True
+    except Exception as e:
+        logging.error(f"GPU проверка не прошла: {e}")
+        return False
+
+
+def get_gpu_info(device_index=0):
+    if torch.cuda.is_available():
+        return {
+            'name': torch.cuda.get_device_name(device_index),
+            'memory_allocated': torch.cuda.memory_allocated(device_index) / 1024**3,
+            'memory_reserved': torch.cuda.memory_reserved(device_index) / 1024**3,
+            'memory_total': torch.cuda.get_device_properties(device_index).total_memory / 1024**3,
+            'device_count': torch.cuda.device_count()
+        }
+    return None
+
+
+class TranscriptionEngine:
+    """Загрузка модели Whisper и транскрибация файлов без привязки к интерфейсу"""
+
+    def __init__(self, model_name="large-v2", device=None, language=None,
+                 word_timestamps=False, batched=False, batch_size=8, log_callback=None,
+                 model_pool=None, transcript_cache=None, use_cache=True, job_journal=None, use_journal=True,
+                 precision=None, speaker_embedder=None, language_per_chunk=False,
+                 language_detect_seconds=language_detection.LANGUAGE_DETECT_SECONDS,
+                 beam_size=None, adaptive_batch_size=True, profile_memory=False, transcript_index=None,
+                 audio_cache=None, normalize_loudness=False, trim_silence=False, draft_model_name=None):
+        if device is None:
+            device = "cuda:0" if check_gpu_availability() else "cpu"
+        self.device = device
+        self.use_gpu = device.startswith("cuda")
+        self.model_name = model_name
+        # None - язык определяется по первым language_detect_seconds секундам каждого файла,
+        # language_per_chunk - для каждого окна или фрагмента (смешанная речь)
+        self.language = language
+        self.language_per_chunk = language_per_chunk
+        self.language_detect_seconds = language_detect_seconds
+        self.word_timestamps = word_timestamps
+        self.batched = batched
+        self.batch_size = batch_size
+        # Ширина луча (None - жадное декодирование); при нехватке памяти батч и луч уменьшаются,
+        # а в пакетном режиме на GPU батч растет по свободной памяти, если adaptive_batch_size
+        self.beam_size = beam_size
+        self.adaptive_batch_size = adaptive_batch_size
+        self._batch_sizers = {}
+        # Маленькая модель с тем же словарем (base, small) предлагает токены для жадного декодирования;
+        # результат тот же, что без нее. Статистика декодера последнего файла - в last_decoding_stats
+        self.draft_model_name = draft_model_name
+        self.draft_model = None
+        self.last_decoding_stats = None
+        # Временной ряд памяти последнего задания (MemoryProfiler.as_dict), если profile_memory
+        self.profile_memory = profile_memory
+        self.last_memory_profile = None
+        self.log_callback = log_callback
+        self.precision = precision or default_precision(device)
+        check_precision(self.precision, device)
+        self.use_fp16 = self.precision == "fp16"
+        self.model_pool = model_pool or ModelPool(log_callback=self.log)
+        self.model_resolver = ModelResolver(MODEL_CACHE_DIR, log_callback=self.log)
+        if transcript_cache is None and use_cache:
+            transcript_cache = TranscriptCache()
+        self.transcript_cache = transcript_cache
+        if job_journal is None and use_journal:
+            job_journal = JobJournal()
+        self.job_journal = job_journal
+        # Аудио, подготовленное один раз (16 кГц моно, memmap): повторные запуски не вызывают ffmpeg.
+        # normalize_loudness и trim_silence применяются при подготовке и без кэша невозможны
+        if audio_cache is None and (use_cache or normalize_loudness or trim_silence):
+            audio_cache = AudioCache()
+        self.audio_cache = audio_cache
+        self.normalize_loudness = normalize_loudness
+        self.trim_silence = trim_silence
+        # Полнотекстовый индекс готовых результатов (TranscriptIndex); None - не индексировать
+        self.transcript_index = transcript_index
+        # Эмбеддер голоса для diarize (None - статистики лог-мел спектра) и кэш эмбеддингов
+        self.speaker_embedder = speaker_embedder
+        self.embedding_cache = diarization.EmbeddingCache() if use_cache else None
+        self.model = None
+        self.last_processing_time = 0
+        # Сегменты, готовые к моменту ошибки: интерфейс может сохранить частичный результат
+        self.last_partial_result = None
+        self.segment_listeners = []
+        self._file_hashes = {}
+        self._detected_languages = {}
+        # StageTimer для замера этапов (бенчмарк); None - без замеров
+        self.stage_timer = None
+
+    def log(self, text):
+        if self.log_callback:
+            self.log_callback(text)
+        else:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    def device_name(self):
+        if self.use_gpu:
+            return torch.cuda.get_device_name(self._device_index())
+        return "CPU"
+
+    def _device_index(self):
+        if ":" in self.device:
+            return int(self.device.split(":", 1)[1])
+        return 0
+
+    def memory_allocated(self):
+        if self.use_gpu:
+            return torch.cuda.memory_allocated(self._device_index()) / 1024**3
+        return 0.0
+
+    def release_memory(self):
+        if self.use_gpu:
+            torch.cuda.empty_cache()
+
+    def load_model(self, model_name=None):
+        if model_name:
+            self.model_name = model_name
+
+        if not os.path.exists(MODEL_CACHE_DIR):
+            os.makedirs(MODEL_CACHE_DIR)
+            self.log(f"📂 Создаю кэш моделей в: {MODEL_CACHE_DIR}\n")
+        os.environ["WHISPER_CACHE_DIR"] = MODEL_CACHE_DIR
+        self.log(f"📂 Кэш моделей установлен в: {MODEL_CACHE_DIR}\n")
+
+        # Отпускаем текущую модель, чтобы пул мог выгрузить ее до загрузки новой
+        self.model = None
+        self.draft_model = None
+        self.model = self.model_pool.get(self.model_name, self.device, self.precision, self._load_checked_model)
+        if self.draft_model_name and self.draft_model_name != self.model_name:
+            self.load_draft_model()
+        return self.model
+
+    def load_draft_model(self):
+        """Черновая модель для спекулятивного декодирования; несовместимая отключается с предупреждением"""
+        draft_model = self.model_pool.get(self.draft_model_name, self.device, self.precision,
+                                          self._load_checked_model)
+        try:
+            check_draft_model(self.model, draft_model)
+        except Exception as e:
+            self.log(f"⚠️ {e}. Декодирую без черновой модели\n")
+            return None
+        self.draft_model = draft_model
+        self.log(f"🎯 Черновая модель {self.draft_model_name} предлагает токены для {self.model_name}\n")
+        return draft_model
+
+    def set_precision(self, precision):
+        """Смена точности; модель в новой точности загружается следующим load_model"""
+        check_precision(precision, self.device)
+        self.precision = precision
+        self.use_fp16 = precision == "fp16"
+
+    def is_model_loaded(self, model_name):
+        return (model_name, self.device, self.precision) in self.model_pool.loaded()
+
+    def _load_checked_model(self, model_name, device, precision):
+        checkpoint_path = self.model_resolver.resolve(model_name)
+        if precision == "int8":
+            if model_name in whisper._MODELS:
+                checkpoint_tag = self.model_resolver.expected_sha256(model_name)
+            else:
+                stat = os.stat(checkpoint_path)
+                checkpoint_tag = f"{stat.st_size:x}{stat.st_mtime_ns:x}"
+            quantized_path = quantized_checkpoint_path(MODEL_CACHE_DIR, model_name, checkpoint_tag)
+            model = load_int8_model(checkpoint_path, quantized_path, log=self.log)
+        else:
+            model = whisper.load_model(checkpoint_path, device=device)
+        # Декодеры включают автокаст bf16 по этому атрибуту
+        model.compute_precision = precision
+        # При загрузке по пути whisper не знает имя модели и не ставит головы выравнивания
+        if model_name in whisper._ALIGNMENT_HEADS:
+            model.set_alignment_heads(whisper._ALIGNMENT_HEADS[model_name])
+
+        if hasattr(model, 'device'):
+            actual_device = str(model.device)
+            if self.use_gpu and "cuda" not in actual_device.lower():
+                raise Exception(f"Модель загрузилась на {actual_device}, а не на GPU!")
+            elif not self.use_gpu and "cpu" not in actual_device.lower():
+                raise Exception(f"Модель загрузилась на {actual_device}, а не на CPU!")
+        return model
+
+    def _file_hash(self, filename):
+        """Хэш содержимого, пересчитывается только при изменении размера или времени файла"""
+        stat = os.stat(filename)
+        key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+        if key not in self._file_hashes:
+            self._file_hashes[key] = hash_file(filename)
+        return self._file_hashes[key]
+
+    def _preprocessing(self):
+        """Параметры предобработки, меняющие аудио; пустой словарь - аудио как из ffmpeg"""
+        options = {}
+        if self.normalize_loudness:
+            options["normalize"] = True
+        if self.trim_silence:
+            options["trim_silence"] = True
+        return options
+
+    def _decoding_options(self):
+        """Параметры декодирования, меняющие текст; пустой словарь - жадный поиск и определение языка по умолчанию.
+
+        Черновая модель сюда не входит: со спекулятивным декодированием текст тот же.
+        """
+        options = {}
+        if self.beam_size:
+            options["beam_size"] = self.beam_size
+        if (self.language is None and not self.language_per_chunk
+                and self.language_detect_seconds != language_detection.LANGUAGE_DETECT_SECONDS):
+            options["language_detect_seconds"] = self.language_detect_seconds
+        return options
+
+    def cache_key(self, filename, word_timestamps=None):
+        if word_timestamps is None:
+            word_timestamps = self.word_timestamps and not self.batched
+        return make_cache_key(
+            self._file_hash(filename),
+            model=self.model_name,
+            language=self.language or ("auto-chunks" if self.language_per_chunk else "auto"),
+            word_timestamps=word_timestamps,
+            precision=self.precision,
+            mode="batched" if self.batched else "sequential",
+            **self._preprocessing(),
+            **self._decoding_options(),
+        )
+
+    def prepare_audio(self, filename):
+        """Подготовленное аудио файла (PreprocessedAudio).
+
+        С нормализацией или вырезанием пауз при первом обращении файл целиком
+        декодируется в кэш. None - файла еще нет в кэше без предобработки или кэш
+        аудио отключен: файл читается ffmpeg потоково (transcribe заполняет кэш по ходу чтения).
+        """
+        if self.audio_cache is None:
+            return None
+        audio_hash = self._file_hash(filename)
+        audio = self.audio_cache.get(audio_hash, self.normalize_loudness, self.trim_silence)
+        if audio is None and self._preprocessing():
+            start_time = time.time()
+            with (self.stage_timer or NULL_TIMER).stage("audio_decode"):
+                audio = self.audio_cache.prepare(filename, audio_hash, self.normalize_loudness, self.trim_silence)
+            details = []
+            if audio.gain_db:
+                details.append(f"громкость {audio.gain_db:+.1f} дБ")
+            if audio.trimmed:
+                details.append(f"вырезано пауз {audio.duration - len(audio.samples) / SAMPLE_RATE:.1f} с")
+            self.log(f"🎚️ Аудио подготовлено за {time.time() - start_time:.1f} секунд"
+                     + (f" ({', '.join(details)})" if details else "") + "\n")
+        return audio
+
+    def audio_input(self, filename, source_timeline=False):
+        """Что передать декодеру вместо пути: подготовленные отсчеты или сам путь без кэша аудио.
+
+        source_timeline - на шкале исходного файла (выравнивание слов и спикеров по меткам результата).
+        """
+        audio = self.prepare_audio(filename)
+        if audio is None:
+            return filename
+        return audio.source_timeline() if source_timeline else audio.samples
+
+    def detect_language(self, filename):
+        """Язык файла: заданный явно или определенный по началу записи (результат запоминается)"""
+        if self.language:
+            return self.language
+        if self.model is None:
+            raise Exception("Модель еще не загружена.")
+        key = self._language_key(filename)
+        if key not in self._detected_languages:
+            language, probability = language_detection.detect_language(
+                self.model, self.audio_input(filename), self.language_detect_seconds, fp16=self.use_fp16,
+                timer=self.stage_timer)
+            self.log(f"🌍 Определен язык: {language} ({probability:.0%})\n")
+            self._detected_languages[key] = language
+        return self._detected_languages[key]
+
+    def _language_key(self, filename):
+        return (self._file_hash(filename), self.model_name, self.language_detect_seconds,
+                tuple(self._preprocessing()))
+
+    def remember_language(self, filename, language):
+        """Язык файла, определенный заранее (другим процессом с той же моделью): detect_language его не пересчитывает"""
+        self._detected_languages[self._language_key(filename)] = language
+
+    def add_segment_listener(self, callback):
+        """Подписка на сегменты: callback(segment) вызывается по мере декодирования"""
+        self.segment_listeners.append(callback)
+
+    def remove_segment_listener(self, callback):
+        if callback in self.segment_listeners:
+            self.segment_listeners.remove(callback)
+
+    def _emit_segment(self, segment, on_segment=None):
+        if on_segment is not None:
+            on_segment(segment)
+        for listener in list(self.segment_listeners):
+            listener(segment)
+
+    def transcribe(self, filename, on_segment=None, control=None, word_timestamps=False):
+        """Транскрибирует один файл и возвращает результат Whisper.
+
+        Сегменты передаются в on_segment и подписчикам сразу после декодирования
+        каждого окна, не дожидаясь конца файла. control (JobControl) ставит
+        декодирование на паузу или отменяет его между окнами; после отмены
+        готовые сегменты доступны в last_partial_result. word_timestamps -
+        дальше будет вызван align_words: в кэше сначала ищется уже выровненный
+        результат.
+        """
+        if self.model is None:
+            raise Exception("Модель еще не загружена.")
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"Файл не найден: {filename}")
+
+        def emit(segment):
+            self._emit_segment(segment, on_segment)
+
+        start_time = time.time()
+        self.last_memory_profile = None
+        self.last_decoding_stats = None
+        cache_key = None
+        if self.transcript_cache is not None or self.job_journal is not None:
+            cache_key = self.cache_key(filename)
+        if self.transcript_cache is not None:
+            lookup_keys = [cache_key]
+            if word_timestamps:
+                lookup_keys.insert(0, self.cache_key(filename, word_timestamps=True))
+            result = None
+            for key in dict.fromkeys(lookup_keys):
+                result = self.transcript_cache.get(key)
+                if result is not None:
+                    break
+            if result is not None:
+                self.last_processing_time = time.time() - start_time
+                self.log(f"⚡ Результат найден в кэше ({self.last_processing_time * 1000:.0f} мс)\n")
+                for segment in result.get("segments", []):
+                    emit(segment)
+                return result
+
+        if find_ffmpeg() is None:
+            raise Exception(f"{FFMPEG_BINARY} не найден ни в bin, ни в PATH")
+
+        restored_segments = []
+        resume_state = None
+        if self.job_journal is not None:
+            checkpoint = self.job_journal.load(cache_key)
+            if checkpoint:
+                restored_segments = checkpoint["segments"]
+                resume_state = checkpoint["state"]
+                position = restored_segments[-1]["end"] if restored_segments else 0.0
+                self.log(f"♻️ Продолжаю с контрольной точки: {position:.1f} с, "
+                         f"готово сегментов: {len(restored_segments)}\n")
+                for segment in restored_segments:
+                    emit(segment)
+            else:
+                self.job_journal.start(cache_key, filename)
+
+        done_segments = list(restored_segments)
+        # Выданные сегменты, включая еще не попавшие в контрольную точку: частичный результат при отмене
+        decoded_segments = list(restored_segments)
+
+        def on_checkpoint(segments, state):
+            done_segments.extend(segments)
+            if self.job_journal is not None:
+                self.job_journal.checkpoint(cache_key, segments, state)
+
+        self.last_partial_result = None
+        self.release_memory()
+        audio = self.prepare_audio(filename)
+
+        def decode_emit(segment):
+            # Без пауз декодер видит укороченное аудио: метки переводятся на шкалу файла до подписчиков и журнала
+            segment = audio.remap_segment(segment) if audio is not None else segment
+            decoded_segments.append(segment)
+            emit(segment)
+
+        # При определении по фрагментам язык файла не фиксируется: его выбирает декодер для каждого окна
+        language = self.language if self.language_per_chunk else self.detect_language(filename)
+        profiler = MemoryProfiler(self.device).start() if self.profile_memory else None
+        cancelled = False
+        stream = None
+        if audio is not None:
+            decode_input = audio.samples
+        elif self.audio_cache is not None and resume_state is None:
+            # Первый запуск без предобработки: декодер читает ffmpeg потоково, отсчеты попутно пишутся в кэш
+            decode_input = stream = self.audio_cache.open_stream(filename, self._file_hash(filename))
+        else:
+            decode_input = filename
+        try:
+            result = self._decode(decode_input, language, decode_emit, resume_state, on_checkpoint, control)
+        except TranscriptionCancelled:
+            # Исключение не пробрасывается дальше: его traceback держит кадры декодера с тензорами,
+            # и память освобождается только после выхода из except
+            cancelled = True
+            self._keep_partial_result(decoded_segments, done_segments, language)
+        except BaseException:
+            self._keep_partial_result(decoded_segments, done_segments, language)
+            raise
+        finally:
+            if stream is not None:
+                stream.close()
+            self.last_processing_time = time.time() - start_time
+            if profiler is not None:
+                self.last_memory_profile = profiler.stop()
+                self.log(f"💾 Пик памяти ({profiler.backend}): {profiler.peak_bytes() / 1024**3:.2f} GB\n")
+            self.release_memory()
+
+        if cancelled:
+            self.log(f"⏹ Транскрибация остановлена, готово сегментов: {len(decoded_segments)}\n")
+            raise TranscriptionCancelled("Транскрибация отменена")
+        if audio is not None:
+            result["duration"] = audio.duration
+        if restored_segments:
+            result["segments"] = restored_segments + result["segments"]
+            result["text"] = "".join(segment["text"] for segment in result["segments"])
+        if self.job_journal is not None:
+            self.job_journal.finish(cache_key)
+
+        if self.transcript_cache is not None:
+            try:
+                self.transcript_cache.put(cache_key, result)
+            except OSError as e:
+                logging.error(f"Не удалось сохранить результат в кэш: {e}")
+        return result
+
+    def _keep_partial_result(self, segments, saved_segments, language):
+        """Готовые сегменты прерванного файла остаются доступны в last_partial_result;
+        saved_segments - часть из них, записанная в журнал"""
+        if segments:
+            self.last_partial_result = {
+                "text": "".join(segment["text"] for segment in segments),
+                "segments": list(segments),
+                "language": language,
+            }
+        if self.job_journal is not None and saved_segments:
+            self.log(f"💾 Прогресс сохранен до {saved_segments[-1]['end']:.1f} с, "
+                     f"повторный запуск продолжит с этого места\n")
+
+    def iter_segments(self, filename):
+        """Генератор сегментов файла; декодирование идет в фоновом потоке"""
+        segments = queue.Queue()
+        finished = object()
+        errors = []
+
+        def worker():
+            try:
+                self.transcribe(filename, on_segment=segments.put)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                segments.put(finished)
+
+        threading.Thread(target=worker, daemon=True).start()
+        while True:
+            segment = segments.get()
+            if segment is finished:
+                break
+            yield segment
+        if errors:
+            raise errors[0]
+
+    def align_words(self, filename, result, segment_ids=None):
+        """Отложенный расчет меток слов: для всего результата или только для сегментов segment_ids.
+
+        Уже выровненные сегменты пропускаются. Полностью выровненный результат
+        сохраняется в кэш под отдельным ключом.
+        """
+        if self.model is None:
+            raise Exception("Модель еще не загружена.")
+        segments = result["segments"]
+        if segment_ids is not None:
+            segment_ids = set(segment_ids)
+            segments = [segment for segment in segments if segment["id"] in segment_ids]
+        segments = [segment for segment in segments if "words" not in segment]
+        if not segments:
+            return result  # Результат уже выровнен, например взят из кэша
+        # Сегменты на разных языках выравниваются токенизатором своего языка
+        default_language = result.get("language") or self.language
+        by_language = {}
+        for segment in segments:
+            by_language.setdefault(segment.get("language") or default_language, []).append(segment)
+        for language, language_segments in by_language.items():
+            word_alignment.align_words(self.model, self.audio_input(filename, source_timeline=True),
+                                       language_segments, language,
+                                       fp16=self.use_fp16, timer=self.stage_timer)
+
+        if segment_ids is None and self.transcript_cache is not None:
+            try:
+                self.transcript_cache.put(self.cache_key(filename, word_timestamps=True), result)
+            except OSError as e:
+                logging.error(f"Не удалось сохранить результат в кэш: {e}")
+        return result
+
+    def diarize(self, filename, result, num_speakers=None):
+        """Разделение спикеров для готового результата: поле speaker в сегментах и список result["speakers"].
+
+        Модель whisper не нужна: эмбеддинги голоса считаются на CPU и кэшируются
+        по хэшу аудио. Если стадия не укладывается в бюджет времени, результат
+        остается без спикеров.
+        """
+        segments = result["segments"]
+        duration = result.get("duration") or (segments[-1]["end"] if segments else 0.0)
+        time_budget = max(DIARIZATION_MIN_BUDGET_SECONDS, DIARIZATION_MAX_RTF * duration)
+        start_time = time.time()
+        try:
+            speakers = diarization.diarize(self.audio_input(filename, source_timeline=True), segments,
+                                           num_speakers, embedder=self.speaker_embedder, cache=self.embedding_cache,
+                                           audio_hash="-".join([self._file_hash(filename), *self._preprocessing()]),
+                                           time_budget=time_budget, timer=self.stage_timer)
+        except diarization.DiarizationTimeout:
+            self.log(f"⚠️ Разделение спикеров не уложилось в {time_budget:.0f} секунд и пропущено\n")
+            return result
+        result["speakers"] = speakers
+        self.log(f"👥 Спикеров: {len(speakers)} ({time.time() - start_time:.1f} секунд)\n")
+        return result
+
+    def index_result(self, filename, result, name=None):
+        """Добавляет готовый результат (после выравнивания и спикеров) в полнотекстовый индекс.
+
+        name - путь, под которым результат виден в поиске (по умолчанию абсолютный путь файла).
+        Ошибка индекса не мешает заданию: она только записывается в журнал.
+        """
+        if self.transcript_index is None:
+            return
+        try:
+            audio_hash = self._file_hash(filename) if os.path.exists(filename) else None
+            self.transcript_index.add_result(name or os.path.abspath(filename), result,
+                                             model=self.model_name, audio_hash=audio_hash)
+        except (sqlite3.Error, OSError) as e:
+            logging.error(f"Не удалось добавить {filename} в индекс поиска: {e}")
+            self.log(f"⚠️ Не удалось добавить результат в индекс поиска: {e}\n")
+
+    def batch_sizer(self, batched=None):
+        """BatchSizer режима декодирования; общий для всех файлов, поэтому подобранный
+        размер и найденный предел памяти сохраняются между заданиями"""
+        batched = self.batched if batched is None else batched
+        key = (batched, self.batch_size if batched else 1, self.beam_size, self.adaptive_batch_size)
+        if key not in self._batch_sizers:
+            self._batch_sizers[key] = BatchSizer(self.device, key[1], self.beam_size,
+                                                 adaptive=batched and self.adaptive_batch_size,
+                                                 log_callback=self.log)
+        return self._batch_sizers[key]
+
+    def _decode(self, audio, language, on_segment, resume_state=None, on_checkpoint=None, control=None):
+        """audio - путь к файлу, открытый поток (AudioCache.open_stream) или подготовленные отсчеты (prepare_audio)"""
+        if self.batched:
+            if self.draft_model is not None:
+                self.log("ℹ️ Черновая модель не используется в пакетном режиме\n")
+            # Пакетный режим: VAD + батчи окон, метки слов не вычисляются;
+            # без языка whisper.decode определяет его для каждого фрагмента
+            return transcribe_batched(
+                self.model,
+                audio,
+                language=language,
+                task="transcribe",
+                batch_size=self.batch_size,
+                beam_size=self.beam_size,
+                fp16=self.use_fp16,
+                on_segment=on_segment,
+                timer=self.stage_timer,
+                resume_state=resume_state,
+                on_checkpoint=on_checkpoint,
+                batch_sizer=self.batch_sizer(batched=True),
+                control=control
+            )
+        transcriber = StreamingTranscriber(
+            self.model,
+            language=language,
+            task="transcribe",
+            fp16=self.use_fp16,
+            word_timestamps=self.word_timestamps,
+            timer=self.stage_timer,
+            resume_state=resume_state,
+            on_checkpoint=on_checkpoint,
+            language_per_window=self.language_per_chunk,
+            beam_size=self.beam_size,
+            batch_sizer=self.batch_sizer(batched=False),
+            control=control,
+            draft_model=self.draft_model
+        )
+        result = transcriber.transcribe(audio, on_segment=on_segment)
+        stats = transcriber.decoding_stats
+        self.last_decoding_stats = stats.as_dict()
+        if stats.tokens_per_second:
+            acceptance = (f", принято токенов черновика: {stats.acceptance_rate:.0%}"
+                          if stats.acceptance_rate is not None else "")
+            self.log(f"🔤 Декодер: {stats.tokens} токенов, {stats.tokens_per_second:.1f} токенов/с{acceptance}\n")
+        return result
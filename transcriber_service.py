@@ -0,0 +1,542 @@
+"""HTTP-сервис транскрибации: очередь заданий поверх TranscriptionEngine без GUI.
+
+Задание отправляется файлом в теле запроса или путем на сервере, сервис
+сразу отвечает его номером, а результат забирается позже в нужном формате:
+
+    POST   /jobs?filename=a.mp3   тело - содержимое файла (application/octet-stream)
+    POST   /jobs                  {"path": "/data/a.mp3"} (только из разрешенных каталогов)
+                                  ?word_timestamps=1, ?diarize=1&speakers=N - метки слов и спикеров,
+                                  ?priority=N - задания с большим приоритетом берутся из очереди раньше
+    GET    /jobs/<id>             состояние: queued, running, finished, failed, cancelled
+    GET    /jobs/<id>/result?format=txt|json|srt|vtt|tsv
+                                  у отмененного задания - готовая к отмене часть
+    GET    /jobs/<id>/memory      временной ряд памяти задания (сервис запущен с профилированием)
+    DELETE /jobs/<id>             удалить готовое задание, снять с очереди или отменить выполняемое
+    GET    /health
+
+Одновременно выполняется не больше max_concurrent заданий, у каждого
+рабочего потока своя модель (декодер whisper ставит хуки на модель, поэтому
+одну модель нельзя использовать из нескольких потоков). Задания с одинаковым
+содержимым файла выполняются по очереди: у них общие кэш и журнал, и второе
+обычно берет готовый результат первого. Очередь ограничена max_queue
+ожидающими заданиями: при переполнении сервис отвечает 503 с Retry-After.
+"""
+import io
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import transcriber_core
+from exporters import EXPORT_FORMATS, write_result
+from formatting import FORMAT_MODES, DEFAULT_LINE_LENGTH, format_result
+from job_control import JobControl, TranscriptionCancelled
+from transcript_cache import TranscriptCache
+
+RESULT_FORMATS = ("txt",) + EXPORT_FORMATS
+CONTENT_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "tsv": "text/tab-separated-values; charset=utf-8",
+}
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_UPLOAD_MB = 2048
+RETRY_AFTER_SECONDS = 5
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class TranscriptionService:
+    """Очередь заданий и рабочие потоки с собственными движками транскрибации"""
+
+    def __init__(self, engine_options=None, device=None, max_concurrent=1, max_queue=16, max_finished=100,
+                 allowed_dirs=None, work_dir=None, log_callback=None):
+        self.engine_options = dict(engine_options or {})
+        self.device = device
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_finished = max_finished
+        self.allowed_dirs = [os.path.realpath(path) for path in allowed_dirs or []]
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="whisper-service-")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.log_callback = log_callback
+        # Элементы очереди - (-приоритет, порядковый номер, id задания). Снятые с очереди задания
+        # остаются в ней до выборки, поэтому заполненность считается по заданиям в статусе queued
+        self.max_queue = max(1, max_queue)
+        self._queue = queue.PriorityQueue()
+        self._jobs = {}
+        # Ключ содержимого -> [блокировка, число заданий, которые ее ждут или держат]
+        self._content_locks = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._workers = []
+        self._ready = threading.Event()
+        self._ready_count = 0
+        self._load_error = None
+
+    def log(self, text):
+        if self.log_callback:
+            self.log_callback(text)
+
+    def start(self):
+        """Запускает рабочие потоки; модели загружаются в них же, не блокируя прием заданий"""
+        if "transcript_cache" not in self.engine_options and self.engine_options.get("use_cache", True):
+            # Один кэш на все потоки: повторная отправка того же файла отдается без декодирования
+            self.engine_options["transcript_cache"] = TranscriptCache()
+        for worker_id in range(self.max_concurrent):
+            thread = threading.Thread(target=self._worker, args=(worker_id,), daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    def stop(self):
+        # Задания из очереди не выполняются, а выполняемые отменяются: иначе остановка ждала бы всю очередь
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        with self._lock:
+            for job in self._jobs.values():
+                if job.get("control") is not None:
+                    job["control"].cancel()
+        for _ in self._workers:
+            self._queue.put((float("inf"), next(self._seq), None))
+        for thread in self._workers:
+            thread.join()
+        self._workers = []
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def wait_ready(self, timeout=None):
+        self._ready.wait(timeout)
+        if self._load_error:
+            raise Exception(f"Не удалось загрузить модель: {self._load_error}")
+        return self._ready.is_set()
+
+    def _worker(self, worker_id):
+        try:
+            engine = transcriber_core.TranscriptionEngine(device=self.device, log_callback=self.log_callback,
+                                                          **self.engine_options)
+            engine.load_model()
+        except Exception as e:
+            logging.error(f"Рабочий поток {worker_id}: не удалось загрузить модель: {e}")
+            self._load_error = str(e)
+            self._ready.set()
+            return
+        with self._lock:
+            self._ready_count += 1
+        self._ready.set()
+        self.log(f"📋 Рабочий поток {worker_id}: модель {engine.model_name} загружена на {engine.device_name()}\n")
+
+        while True:
+            _, _, job_id = self._queue.get()
+            if job_id is None:
+                break
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue  # Снято с очереди
+            with self._content_lock(self._content_key(engine, job)):
+                self._run_job(engine, job_id)
+
+    def _content_key(self, engine, job):
+        """Ключ кэша и журнала задания; None, если файл не прочитать (ошибку покажет транскрибация)"""
+        try:
+            return engine.cache_key(job["path"])
+        except OSError:
+            return None
+
+    @contextmanager
+    def _content_lock(self, key):
+        """Задания с одним ключом выполняются по очереди, иначе они писали бы в один журнал"""
+        if key is None:
+            yield
+            return
+        with self._lock:
+            entry = self._content_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._content_locks[key]
+
+    def _run_job(self, engine, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return  # Снято с очереди, пока ждало задание с тем же файлом
+            control = JobControl(on_pause=engine.release_memory)
+            job.update(status="running", started=time.time(), control=control)
+
+        def progress(segment):
+            job["position"] = segment["end"]
+
+        result = None
+        try:
+            result = engine.transcribe(job["path"], on_segment=progress, control=control,
+                                       word_timestamps=job["word_timestamps"])
+            if job["word_timestamps"]:
+                control.check()
+                engine.align_words(job["path"], result)
+            if job["diarize"]:
+                control.check()
+                engine.diarize(job["path"], result, job["num_speakers"])
+            # Загрузка удаляется после задания: в индексе она видна под номером задания и именем файла
+            engine.index_result(job["path"], result,
+                                name=f"upload:{job['id']}/{job['filename']}" if job["upload"] else None)
+            with self._lock:
+                job.update(status="finished", result=result, processing_time=engine.last_processing_time,
+                           duration=result.get("duration"), finished=time.time(),
+                           memory_profile=engine.last_memory_profile)
+        except TranscriptionCancelled:
+            # Отмена после декодирования оставляет весь текст, во время - готовую часть
+            partial = result or engine.last_partial_result
+            self.log(f"⏹ Задание {job['id']} ({job['filename']}) отменено\n")
+            with self._lock:
+                job.update(status="cancelled", result=partial, finished=time.time(),
+                           memory_profile=engine.last_memory_profile)
+        except Exception as e:
+            logging.error(f"Ошибка при транскрибации {job['filename']}: {e}")
+            with self._lock:
+                job.update(status="failed", error=str(e), finished=time.time(),
+                           memory_profile=engine.last_memory_profile)
+        finally:
+            job.pop("control", None)
+            self._remove_upload(job)
+            self._evict_finished()
+
+    def _remove_upload(self, job):
+        if job.get("upload"):
+            try:
+                os.remove(job["path"])
+            except FileNotFoundError:
+                pass
+
+    def _evict_finished(self):
+        with self._lock:
+            done = [job for job in self._jobs.values() if job["status"] in ("finished", "failed", "cancelled")]
+            for job in sorted(done, key=lambda job: job["finished"])[:max(0, len(done) - self.max_finished)]:
+                del self._jobs[job["id"]]
+
+    def check_path(self, path):
+        real_path = os.path.realpath(path)
+        if not any(os.path.commonpath([real_path, root]) == root for root in self.allowed_dirs):
+            raise ServiceError(403, "Путь вне разрешенных каталогов (--allow-dir)")
+        if not os.path.isfile(real_path):
+            raise ServiceError(404, f"Файл не найден: {path}")
+        return real_path
+
+    def new_upload_path(self, filename):
+        extension = os.path.splitext(filename or "")[1].lower()
+        fd, path = tempfile.mkstemp(suffix=extension, dir=self.work_dir)
+        os.close(fd)
+        return path
+
+    def check_capacity(self):
+        """ServiceError(503), если задание сейчас не будет принято: модель не загрузилась или очередь заполнена.
+
+        Вызывается до приема файла, чтобы клиент не загружал его впустую; submit проверяет то же самое.
+        """
+        with self._lock:
+            self._check_capacity()
+
+    def _check_capacity(self):
+        if self._load_error and not self._ready_count:
+            raise ServiceError(503, f"Модель не загружена: {self._load_error}")
+        if sum(job["status"] == "queued" for job in self._jobs.values()) >= self.max_queue:
+            raise ServiceError(503, "Очередь заданий заполнена, повторите позже",
+                               {"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    def submit(self, path, filename=None, upload=False, word_timestamps=False, diarize=False, num_speakers=None,
+               priority=0):
+        """Ставит задание в очередь; ServiceError(503), если очередь заполнена"""
+        try:
+            with self._lock:
+                self._check_capacity()
+                job_id = str(next(self._ids))
+                job = {"id": job_id, "status": "queued", "filename": filename or os.path.basename(path),
+                       "path": path, "upload": upload, "word_timestamps": word_timestamps,
+                       "diarize": diarize, "num_speakers": num_speakers, "priority": priority,
+                       "created": time.time(), "position": 0.0}
+                self._jobs[job_id] = job
+        except ServiceError:
+            self._remove_upload({"upload": upload, "path": path})
+            raise
+        self._queue.put((-priority, next(self._seq), job_id))
+        return self.status(job_id)
+
+    def job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ServiceError(404, f"Задание {job_id} не найдено")
+        return job
+
+    def status(self, job_id):
+        job = self.job(job_id)
+        with self._lock:
+            status = {key: job.get(key) for key in ("id", "status", "filename", "priority", "created", "started",
+                                                    "finished", "position", "duration", "processing_time", "error")}
+            if job["status"] == "queued":
+                queued = sorted((-other["priority"], other["created"], other["id"]) for other in self._jobs.values()
+                                if other["status"] == "queued")
+                status["queue_position"] = queued.index((-job["priority"], job["created"], job["id"])) + 1
+        return {key: value for key, value in status.items() if value is not None}
+
+    def result(self, job_id):
+        job = self.job(job_id)
+        if job["status"] == "failed":
+            raise ServiceError(409, f"Задание завершилось ошибкой: {job.get('error')}")
+        if job["status"] == "cancelled" and not job.get("result"):
+            raise ServiceError(409, "Задание отменено до первого готового сегмента")
+        if job["status"] not in ("finished", "cancelled"):
+            raise ServiceError(409, f"Задание еще не готово ({job['status']})")
+        return job["result"]
+
+    def memory_profile(self, job_id):
+        job = self.job(job_id)
+        if job["status"] in ("queued", "running"):
+            raise ServiceError(409, f"Задание еще не готово ({job['status']})")
+        if not job.get("memory_profile"):
+            raise ServiceError(404, "Профиль памяти не записан (сервис запущен без --memory-profile)")
+        return job["memory_profile"]
+
+    def delete(self, job_id):
+        """Удаляет задание; выполняемое отменяется между окнами и остается в списке со статусом cancelled.
+
+        Возвращает True, если задание удалено, и False, если запрошена отмена.
+        """
+        job = self.job(job_id)
+        with self._lock:
+            if job["status"] == "running":
+                job["control"].cancel()
+                return False
+            del self._jobs[job_id]
+        self._remove_upload(job)
+        return True
+
+    def health(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"status": "error" if self._load_error else "ok" if self._ready_count else "loading",
+                "workers": self.max_concurrent, "workers_ready": self._ready_count,
+                "queue_capacity": self.max_queue, "jobs": counts,
+                **({"error": self._load_error} if self._load_error else {})}
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = "WhisperTranscriber/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        self.service.log(f"🌐 {self.address_string()} {format % args}\n")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False, default=float).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES["json"])
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, handler):
+        try:
+            handler(urlsplit(self.path))
+        except ServiceError as e:
+            self._send_json(e.status, {"error": str(e)}, e.headers)
+        except Exception as e:
+            logging.error(f"Ошибка обработки запроса {self.command} {self.path}: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def _job_route(self, url):
+        parts = [part for part in url.path.split("/") if part]
+        if len(parts) < 2 or parts[0] != "jobs":
+            raise ServiceError(404, "Неизвестный адрес")
+        return parts[1], parts[2:]
+
+    def do_GET(self):
+        self._route(self._get)
+
+    def do_POST(self):
+        self._route(self._post)
+
+    def do_DELETE(self):
+        self._route(self._delete)
+
+    def _get(self, url):
+        if url.path.rstrip("/") == "/health":
+            return self._send_json(200, self.service.health())
+        job_id, rest = self._job_route(url)
+        if not rest:
+            return self._send_json(200, self.service.status(job_id))
+        if rest == ["memory"]:
+            return self._send_json(200, self.service.memory_profile(job_id))
+        if rest != ["result"]:
+            raise ServiceError(404, "Неизвестный адрес")
+
+        query = parse_qs(url.query)
+        result_format = query.get("format", ["json"])[0]
+        if result_format not in RESULT_FORMATS:
+            raise ServiceError(400, f"Неизвестный формат {result_format}; доступны: {', '.join(RESULT_FORMATS)}")
+        mode = query.get("mode", ["segments"])[0]
+        if mode not in FORMAT_MODES:
+            raise ServiceError(400, f"Неизвестный режим {mode}; доступны: {', '.join(FORMAT_MODES)}")
+        try:
+            line_length = int(query.get("line_length", [DEFAULT_LINE_LENGTH])[0])
+        except ValueError:
+            raise ServiceError(400, "line_length должно быть числом")
+        result = self.service.result(job_id)
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[result_format])
+        # Тело пишется по сегментам и завершается закрытием соединения, без сборки в памяти
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        stream = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=False)
+        try:
+            if result_format == "txt":
+                stream.write(format_result(result, mode, line_length, query.get("timestamps", ["1"])[0] != "0"))
+            else:
+                write_result(result, result_format, stream)
+            stream.flush()
+        finally:
+            stream.detach()
+
+    def _post(self, url):
+        if url.path.rstrip("/") != "/jobs":
+            raise ServiceError(404, "Неизвестный адрес")
+        query = parse_qs(url.query)
+        options = {"word_timestamps": query.get("word_timestamps", ["0"])[0] == "1",
+                   "diarize": query.get("diarize", ["0"])[0] == "1",
+                   "num_speakers": query.get("speakers", [None])[0],
+                   "priority": query.get("priority", [0])[0]}
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+
+        if content_type == "application/json":
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError:
+                raise ServiceError(400, "Некорректный JSON")
+            if not isinstance(request, dict) or not request.get("path"):
+                raise ServiceError(400, "Ожидается {\"path\": ...}")
+            path = self.service.check_path(request["path"])
+            options.update({key: request[key] for key in ("word_timestamps", "diarize") if key in request})
+            options["num_speakers"] = request.get("speakers", options["num_speakers"])
+            options["priority"] = request.get("priority", options["priority"])
+            job = self.service.submit(path, **self._job_options(options))
+            return self._send_json(202, job, {"Location": f"/jobs/{job['id']}"})
+
+        filename = query.get("filename", ["upload"])[0]
+        options = self._job_options(options)
+        try:
+            # Отказ по заполненной очереди - до чтения тела: клиент не загружает файл впустую
+            self.service.check_capacity()
+            path = self._receive_upload(filename)
+        except ServiceError as e:
+            # Непрочитанное тело осталось в сокете: после ответа соединение закрывается
+            e.headers = {**e.headers, "Connection": "close"}
+            self.close_connection = True
+            raise
+        job = self.service.submit(path, filename=os.path.basename(filename), upload=True, **options)
+        self._send_json(202, job, {"Location": f"/jobs/{job['id']}"})
+
+    @staticmethod
+    def _job_options(options):
+        num_speakers = options["num_speakers"]
+        if num_speakers is not None:
+            try:
+                num_speakers = int(num_speakers)
+            except (TypeError, ValueError):
+                raise ServiceError(400, "speakers должно быть числом")
+            if num_speakers < 1:
+                raise ServiceError(400, "speakers должно быть больше нуля")
+        try:
+            priority = int(options["priority"])
+        except (TypeError, ValueError):
+            raise ServiceError(400, "priority должно быть числом")
+        return {"word_timestamps": bool(options["word_timestamps"]),
+                "diarize": bool(options["diarize"]) or num_speakers is not None,
+                "num_speakers": num_speakers, "priority": priority}
+
+    def _receive_upload(self, filename):
+        """Тело запроса потоково пишется во временный файл"""
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise ServiceError(411, "Нужен заголовок Content-Length")
+        length = int(length)
+        if length <= 0:
+            raise ServiceError(400, "Пустой файл")
+        if length > self.server.max_upload_bytes:
+            raise ServiceError(413, f"Файл больше {self.server.max_upload_bytes // (1024 * 1024)} МБ")
+        path = self.service.new_upload_path(filename)
+        try:
+            with open(path, "wb") as f:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ServiceError(400, "Соединение оборвалось во время загрузки")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    def _delete(self, url):
+        job_id, rest = self._job_route(url)
+        if rest:
+            raise ServiceError(404, "Неизвестный адрес")
+        if self.service.delete(job_id):
+            return self._send_json(200, {"id": job_id, "deleted": True})
+        # Выполняемое задание останавливается на границе окна; готовая часть - в /result
+        self._send_json(202, {"id": job_id, "cancelled": True})
+
+
+class TranscriptionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, max_upload_bytes=DEFAULT_MAX_UPLOAD_MB * 1024 * 1024):
+        super().__init__(address, ServiceRequestHandler)
+        self.service = service
+        self.max_upload_bytes = max_upload_bytes
+
+
+def serve(service, host="127.0.0.1", port=8000, max_upload_mb=DEFAULT_MAX_UPLOAD_MB):
+    """Запускает сервис и блокирует до Ctrl+C"""
+    service.start()
+    server = TranscriptionServer((host, port), service, max_upload_mb * 1024 * 1024)
+    service.log(f"🌐 Сервис транскрибации: http://{host}:{server.server_address[1]}\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
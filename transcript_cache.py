@@ -0,0 +1,104 @@
+"""Дисковый кэш результатов транскрибации.
+
+Ключ - хэш содержимого аудио плюс параметры декодирования (модель, язык,
+метки слов, fp16, режим). Результат хранится как сжатый gzip JSON, при
+превышении лимита размера удаляются записи, к которым дольше всего не
+обращались.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/whisper-transcriber/transcripts")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+ENTRY_SUFFIX = ".json.gz"
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """Потоковый хэш содержимого файла (BLAKE2b), без чтения файла целиком в память"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(audio_hash, **params):
+    payload = json.dumps({"audio": audio_hash, **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError, EOFError):
+            return None
+        try:
+            # Время изменения служит меткой последнего обращения для LRU
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(result, f, ensure_ascii=False, separators=(",", ":"), default=float)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def entries(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Удаляет самые старые записи, пока кэш не уложится в max_bytes"""
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        for _, _, name in self.entries():
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
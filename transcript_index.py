@@ -0,0 +1,169 @@
+"""Полнотекстовый индекс архива транскрипций с метками времени.
+
+Каждый готовый результат записывается в SQLite: файл, модель, язык и
+сегменты с началом и концом в миллисекундах. Текст сегментов
+индексируется FTS5 (внешнее содержимое: текст хранится один раз в
+таблице segments, триггеры держат индекс в согласии с ней). Индекс
+пополняется по одному результату: файл, проиндексированный повторно,
+заменяет свои прежние сегменты, перестраивать весь индекс не нужно. Все
+сегменты результатов, переданных в add_results, пишутся одной транзакцией.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_INDEX_PATH = os.path.expanduser("~/.cache/whisper-transcriber/transcript_index.sqlite")
+DEFAULT_LIMIT = 50
+# Слова запроса: фразы в кавычках и отдельные слова, слово может оканчиваться * (поиск по началу)
+QUERY_TOKEN = re.compile(r'"([^"]+)"|(\S+)')
+FOLD_YO_SQL = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def to_ms(seconds):
+    return int(round((seconds or 0.0) * 1000))
+
+
+def fts_query(text):
+    """Запрос пользователя в синтаксисе FTS5: все слова и фразы должны встретиться в сегменте.
+
+    Слова берутся в кавычки, поэтому знаки препинания и операторы FTS5
+    в запросе не дают синтаксических ошибок; слово* ищет по началу слова.
+    """
+    terms = []
+    for phrase, word in QUERY_TOKEN.findall(text):
+        prefix = False
+        if word:
+            prefix = word.endswith("*") and len(word) > 1
+            phrase = word.rstrip("*")
+        phrase = phrase.replace('"', "").replace("ё", "е").replace("Ё", "Е").strip()
+        if phrase:
+            terms.append(f'"{phrase}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class TranscriptIndex:
+    """Индекс сегментов готовых транскрипций; ключ транскрипции - путь к файлу"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # Индекс можно восстановить повторной индексацией: fsync на каждую транзакцию не нужен
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS transcripts (
+                id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, audio_hash TEXT, model TEXT, language TEXT,
+                duration REAL, indexed REAL NOT NULL)""")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY, transcript_id INTEGER NOT NULL, start_ms INTEGER NOT NULL,
+                end_ms INTEGER NOT NULL, language TEXT, speaker TEXT, text TEXT NOT NULL)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS segments_transcript ON segments (transcript_id, start_ms)")
+            self._db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+                text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""")
+            # unicode61 не сводит ё к е: в индекс попадает текст с е (длина в байтах та же, snippet не сбивается)
+            self._db.execute(f"""CREATE TRIGGER IF NOT EXISTS segments_insert AFTER INSERT ON segments BEGIN
+                INSERT INTO segments_fts (rowid, text) VALUES (new.id, {FOLD_YO_SQL.format('new.text')}); END""")
+            self._db.execute(f"""CREATE TRIGGER IF NOT EXISTS segments_delete AFTER DELETE ON segments BEGIN
+                INSERT INTO segments_fts (segments_fts, rowid, text)
+                VALUES ('delete', old.id, {FOLD_YO_SQL.format('old.text')}); END""")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def add_result(self, path, result, model=None, audio_hash=None):
+        return self.add_results([(path, result, model, audio_hash)])
+
+    def add_results(self, items):
+        """Индексирует результаты одной транзакцией; items - (путь, результат, модель, хэш аудио).
+
+        Возвращает число записанных сегментов.
+        """
+        written = 0
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for path, result, model, audio_hash in items:
+                    written += self._write(path, result, model, audio_hash, now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return written
+
+    def _write(self, path, result, model, audio_hash, now):
+        segments = result.get("segments") or []
+        duration = result.get("duration") or (segments[-1]["end"] if segments else None)
+        row = self._db.execute("SELECT id FROM transcripts WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            transcript_id = self._db.execute(
+                "INSERT INTO transcripts (path, audio_hash, model, language, duration, indexed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, audio_hash, model, result.get("language"), duration, now)).lastrowid
+        else:
+            transcript_id = row["id"]
+            self._db.execute("UPDATE transcripts SET audio_hash = ?, model = ?, language = ?, duration = ?, "
+                             "indexed = ? WHERE id = ?",
+                             (audio_hash, model, result.get("language"), duration, now, transcript_id))
+            self._db.execute("DELETE FROM segments WHERE transcript_id = ?", (transcript_id,))
+        rows = [(transcript_id, to_ms(segment.get("start")), to_ms(segment.get("end")),
+                 segment.get("language") or result.get("language"), segment.get("speaker"),
+                 segment.get("text", "").strip())
+                for segment in segments if segment.get("text", "").strip()]
+        self._db.executemany("INSERT INTO segments (transcript_id, start_ms, end_ms, language, speaker, text) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def remove(self, path):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM segments WHERE transcript_id IN "
+                                 "(SELECT id FROM transcripts WHERE path = ?)", (path,))
+                cursor = self._db.execute("DELETE FROM transcripts WHERE path = ?", (path,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return cursor.rowcount == 1
+
+    def search(self, query, limit=DEFAULT_LIMIT, language=None, model=None, path_prefix=None):
+        """Сегменты, содержащие все слова запроса, от самых релевантных (bm25).
+
+        Каждый сегмент - словарь с path, model, language, speaker, start_ms,
+        end_ms, text и snippet (совпадения в [квадратных скобках]).
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = ("SELECT t.path, t.model, s.language, s.speaker, s.start_ms, s.end_ms, s.text, "
+               "snippet(segments_fts, 0, '[', ']', '…', 16) AS snippet "
+               "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid "
+               "JOIN transcripts t ON t.id = s.transcript_id WHERE segments_fts MATCH ?")
+        params = [match]
+        if language:
+            sql += " AND s.language = ?"
+            params.append(language)
+        if model:
+            sql += " AND t.model = ?"
+            params.append(model)
+        if path_prefix:
+            sql += " AND substr(t.path, 1, ?) = ?"
+            params += [len(path_prefix), path_prefix]
+        sql += " ORDER BY segments_fts.rank, t.path, s.start_ms LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def stats(self):
+        with self._lock:
+            transcripts = self._db.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+            segments = self._db.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {"transcripts": transcripts, "segments": segments}
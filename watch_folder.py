@@ -0,0 +1,416 @@
+"""Режим наблюдения за каталогами: новые записи транскрибируются без участия человека.
+
+Изменения в каталогах приходят от inotify (Linux), а где его нет (Windows,
+сетевые ресурсы, --poll) - от периодического обхода. Файл ставится в очередь
+только после того, как его размер и время изменения перестали меняться
+settle_seconds секунд: копирование с сетевой папки может идти долго.
+Очередь хранится в SQLite: задания переживают перезапуск, одинаковое
+содержимое (по хэшу) транскрибируется один раз, а задания из каталогов с
+большим приоритетом идут первыми.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from media_files import MEDIA_EXTENSIONS
+from transcript_cache import hash_file
+
+DEFAULT_QUEUE_PATH = os.path.expanduser("~/.cache/whisper-transcriber/watch_queue.sqlite")
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_INTERVAL = 2.0
+# Полный обход и при inotify: события теряются при переполнении очереди ядра и на сетевых ФС
+DEFAULT_RESCAN_SECONDS = 300.0
+
+# Маски inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+@dataclass
+class WatchRoot:
+    """Наблюдаемый каталог; priority - больше значит раньше в очереди"""
+    path: str
+    priority: int = 0
+
+
+def is_candidate(path):
+    """Медиафайл, а не временный файл копирования (.part, ~$..., скрытые)"""
+    name = os.path.basename(path)
+    if name.startswith((".", "~")):
+        return False
+    return os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS
+
+
+def is_within(path, root):
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        return False  # Разные диски Windows
+
+
+def scan_media(root):
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for name in filenames:
+            path = os.path.join(directory, name)
+            if is_candidate(path):
+                yield path
+
+
+class WatchQueue:
+    """Постоянная очередь заданий с приоритетами; ключ задания - хэш содержимого файла"""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                hash TEXT PRIMARY KEY, path TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'queued', added REAL NOT NULL, started REAL, finished REAL,
+                error TEXT)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, added)")
+            # Уже виденные файлы: по размеру и времени изменения хэш повторно не считается
+            self._db.execute("""CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL)""")
+            # Задания, прерванные остановкой или сбоем, возвращаются в очередь
+            self._db.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def is_known(self, path, size, mtime_ns):
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (path,)).fetchone()
+        return row is not None and (row["size"], row["mtime_ns"]) == (size, mtime_ns)
+
+    def add(self, path, file_hash, size, mtime_ns, priority=0):
+        """Ставит файл в очередь; False - такое содержимое уже было в очереди"""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                             (path, size, mtime_ns, file_hash))
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (hash, path, priority, added) VALUES (?, ?, ?, ?)",
+                (file_hash, path, priority, time.time()))
+        return cursor.rowcount == 1
+
+    def next(self):
+        """Следующее задание (приоритет, затем порядок поступления), помеченное running; None - пусто"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT * FROM jobs WHERE status = 'queued' "
+                                       "ORDER BY priority DESC, added LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status = 'running', started = ? WHERE hash = ?",
+                                     (time.time(), row["hash"]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return dict(row) if row is not None else None
+
+    def finish(self, file_hash):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'finished', finished = ?, error = NULL WHERE hash = ?",
+                             (time.time(), file_hash))
+
+    def fail(self, file_hash, error):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE hash = ?",
+                             (time.time(), str(error), file_hash))
+
+    def retry_failed(self):
+        with self._lock:
+            cursor = self._db.execute("UPDATE jobs SET status = 'queued', error = NULL, started = NULL, "
+                                      "finished = NULL WHERE status = 'failed'")
+        return cursor.rowcount
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def jobs(self, status=None, limit=100):
+        query = "SELECT * FROM jobs"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY status = 'running' DESC, priority DESC, added LIMIT ?"
+        with self._lock:
+            return [dict(row) for row in self._db.execute(query, params + (limit,)).fetchall()]
+
+
+class PollingWatcher:
+    """Обход каталогов раз в interval секунд; отдает новые и изменившиеся файлы"""
+
+    def __init__(self, roots, interval=DEFAULT_POLL_INTERVAL):
+        self.roots = list(roots)
+        self.interval = interval
+        self._stats = {}
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        changed = set()
+        stats = {}
+        for root in self.roots:
+            for path in scan_media(root):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                stats[path] = (stat.st_size, stat.st_mtime_ns)
+                if self._stats.get(path) != stats[path]:
+                    changed.add(path)
+        self._stats = stats
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """События файловой системы Linux через inotify (ctypes, без сторонних пакетов)"""
+
+    def __init__(self, roots):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify доступен только в Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._watches = {}
+        # Новые подкаталоги: их файлы могли появиться до того, как на каталог встало наблюдение
+        self._new_files = set()
+        for root in roots:
+            self._add_tree(root)
+
+    def _add_tree(self, root):
+        for directory, dirnames, _ in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if directory == root:
+                    raise OSError(error, f"inotify_add_watch {directory}")
+                logging.error(f"Не удалось наблюдать за {directory}: {os.strerror(error)}")
+                continue
+            self._watches[wd] = directory
+
+    def poll(self, timeout):
+        """Изменившиеся пути за timeout секунд; None - события потеряны, нужен полный обход"""
+        changed, self._new_files = self._new_files, set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith("."):
+                        self._add_tree(path)
+                        self._new_files.update(scan_media(path))
+                elif is_candidate(path):
+                    changed.add(path)
+        return None if overflow else changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Debouncer:
+    """Отдает файл, когда его размер и время изменения не менялись settle_seconds секунд"""
+
+    def __init__(self, settle_seconds=DEFAULT_SETTLE_SECONDS):
+        self.settle_seconds = settle_seconds
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def touch(self, path):
+        self._pending.setdefault(path, (None, time.monotonic()))
+
+    def ready(self):
+        now = time.monotonic()
+        settled = []
+        for path, (stat, since) in list(self._pending.items()):
+            try:
+                current = os.stat(path)
+            except OSError:
+                del self._pending[path]  # Удален или переименован до конца копирования
+                continue
+            current = (current.st_size, current.st_mtime_ns)
+            if current != stat:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle_seconds and current[0] > 0:
+                del self._pending[path]
+                settled.append((path, current))
+        return settled
+
+
+class WatchDaemon:
+    """Наблюдение за roots и обработка очереди: process(path, output_dir) транскрибирует файл.
+
+    output_dir - корень дерева результатов (структура подкаталогов повторяет
+    наблюдаемый каталог); None - результаты рядом с исходником.
+    """
+
+    def __init__(self, roots, queue, process, output_dir=None, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True, rescan_seconds=DEFAULT_RESCAN_SECONDS,
+                 log_callback=None):
+        self.roots = [WatchRoot(os.path.abspath(root.path), root.priority) for root in roots]
+        self.queue = queue
+        self.process = process
+        self.output_dir = os.path.abspath(output_dir) if output_dir else None
+        self.debouncer = Debouncer(settle_seconds)
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.rescan_seconds = rescan_seconds
+        self.log_callback = log_callback
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def log(self, text):
+        if self.log_callback:
+            self.log_callback(text)
+        else:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    def root_for(self, path, innermost=True):
+        """Наблюдаемый каталог файла: вложенный (его приоритет) или внешний (структура результатов)"""
+        matches = [root for root in self.roots if is_within(path, root.path)]
+        if not matches:
+            return None
+        return (max if innermost else min)(matches, key=lambda root: len(root.path))
+
+    def output_dir_for(self, path):
+        if self.output_dir is None:
+            return None
+        root = self.root_for(path, innermost=False)
+        relative = os.path.relpath(os.path.dirname(path), root.path) if root else ""
+        return os.path.normpath(os.path.join(self.output_dir, relative))
+
+    def _make_watcher(self):
+        paths = [root.path for root in self.roots]
+        if self.use_inotify:
+            try:
+                watcher = InotifyWatcher(paths)
+                self.log("👀 Наблюдение через inotify\n")
+                return watcher
+            except OSError as e:
+                self.log(f"⚠️ inotify недоступен ({e}), перехожу на периодический обход\n")
+        self.log(f"👀 Наблюдение обходом каталогов раз в {self.poll_interval:g} с\n")
+        return PollingWatcher(paths, self.poll_interval)
+
+    def _enqueue(self, path, stat):
+        if self.output_dir and is_within(path, self.output_dir):
+            return  # Результаты, сохраненные внутрь наблюдаемого каталога
+        if self.queue.is_known(path, *stat):
+            return
+        try:
+            file_hash = hash_file(path)
+        except OSError as e:
+            logging.error(f"Не удалось прочитать {path}: {e}")
+            return
+        root = self.root_for(path)
+        if self.queue.add(path, file_hash, stat[0], stat[1], root.priority if root else 0):
+            self.log(f"📥 В очереди: {path}\n")
+            self._wake.set()
+        else:
+            self.log(f"⏭️ Уже обработано или в очереди (то же содержимое): {path}\n")
+
+    def _worker(self):
+        while not self._stop.is_set():
+            job = self.queue.next()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            counts = self.queue.counts()
+            self.log(f"🎬 {job['path']} (в очереди еще {counts.get('queued', 0)})\n")
+            try:
+                self.process(job["path"], self.output_dir_for(job["path"]))
+            except Exception as e:
+                logging.error(f"Ошибка при транскрибации {job['path']}: {e}")
+                self.log(f"❌ Ошибка при транскрибации {job['path']}: {e}\n")
+                self.queue.fail(job["hash"], e)
+            else:
+                self.queue.finish(job["hash"])
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self):
+        """Блокирует до stop() или Ctrl+C; прерванное задание продолжится при следующем запуске"""
+        watcher = self._make_watcher()
+        worker = threading.Thread(target=self._worker, daemon=True)
+        worker.start()
+        last_rescan = None
+        try:
+            while not self._stop.is_set():
+                if last_rescan is None or time.monotonic() - last_rescan >= self.rescan_seconds:
+                    for root in self.roots:
+                        for path in scan_media(root.path):
+                            self.debouncer.touch(path)
+                    last_rescan = time.monotonic()
+                # Пока файлы дописываются, события ждем недолго, чтобы вовремя проверить их размер
+                timeout = 1.0 if len(self.debouncer) else self.poll_interval
+                changed = watcher.poll(timeout)
+                if changed is None:
+                    self.log("⚠️ Очередь событий inotify переполнена, обхожу каталоги заново\n")
+                    last_rescan = None
+                    continue
+                for path in changed:
+                    self.debouncer.touch(path)
+                for path, stat in self.debouncer.ready():
+                    self._enqueue(path, stat)
+        except KeyboardInterrupt:
+            self.log("\n⏹️ Остановка наблюдения\n")
+        finally:
+            self.stop()
+            watcher.close()
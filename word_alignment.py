@@ -0,0 +1,95 @@
+"""Отложенное выравнивание слов (метки времени слов) для готовых сегментов.
+
+Декодирование по умолчанию не считает метки слов: выравнивание по
+кросс-вниманию с DTW заметно замедляет обработку на CPU, а интерфейсу
+поле words не нужно. Когда метки слов все же требуются (экспорт,
+отдельные сегменты), они досчитываются этим модулем по окнам декодера.
+"""
+import torch
+from whisper.audio import SAMPLE_RATE, N_SAMPLES, N_FRAMES, HOP_LENGTH, FRAMES_PER_SECOND, \
+    log_mel_spectrogram, pad_or_trim
+from whisper.timing import add_word_timestamps
+from whisper.tokenizer import get_tokenizer
+
+from audio_stream import open_audio_source
+from precision import model_autocast
+from stage_timer import NULL_TIMER
+from streaming_decoder import PREPEND_PUNCTUATIONS, APPEND_PUNCTUATIONS
+
+WINDOW_SECONDS = N_SAMPLES / SAMPLE_RATE
+
+
+def group_windows(segments):
+    """Группы сегментов, каждая укладывается в одно 30-секундное окно: [(seek, [сегменты])].
+
+    Сегменты последовательного декодера сохраняют окно, в котором были
+    получены (seek). Сегменты пакетного режима (seek = 0) группируются
+    заново: окно начинается с первого сегмента группы.
+    """
+    windows = []
+    for segment in sorted(segments, key=lambda segment: segment["start"]):
+        seek = segment.get("seek", 0)
+        fits = seek * HOP_LENGTH / SAMPLE_RATE <= segment["start"] <= segment["end"] \
+            <= seek * HOP_LENGTH / SAMPLE_RATE + WINDOW_SECONDS
+        # Окна читаются из потока только вперед
+        if not fits or (windows and seek < windows[-1][0]):
+            seek = int(segment["start"] * FRAMES_PER_SECOND)
+            if windows:
+                window_seek = windows[-1][0]
+                if segment["end"] <= window_seek * HOP_LENGTH / SAMPLE_RATE + WINDOW_SECONDS:
+                    seek = window_seek
+        if windows and windows[-1][0] == seek:
+            windows[-1][1].append(segment)
+        else:
+            windows.append((seek, [segment]))
+    return windows
+
+
+def align_words(model, audio, segments, language, task="transcribe", fp16=False, timer=None):
+    """Добавляет поле words в сегменты (на месте) и уточняет их границы, как whisper.
+
+    audio - путь к файлу или массив отсчетов; окна читаются потоково по
+    возрастанию времени. Выравнивание ставит хуки на слои модели, поэтому
+    одну модель нельзя выравнивать параллельно из нескольких потоков;
+    параллельность дает обработка файлов в отдельных процессах.
+    """
+    timer = timer or NULL_TIMER
+    segments = [segment for segment in segments if "words" not in segment]
+    if not segments:
+        return
+    dtype = torch.float16 if fp16 and model.device.type != "cpu" else torch.float32
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                              language=language, task=task)
+
+    windows = group_windows(segments)
+    source = open_audio_source(audio, start_sample=windows[0][0] * HOP_LENGTH)
+    last_speech_timestamp = 0.0
+    try:
+        for seek, window_segments in windows:
+            with timer.stage("alignment"):
+                window = source.read_window(seek * HOP_LENGTH, N_SAMPLES)
+                mel = log_mel_spectrogram(pad_or_trim(window, N_SAMPLES), model.dims.n_mels)
+                mel = mel.to(model.device).to(dtype)
+                window_end = window_segments[-1]["end"]
+                original_seeks = [segment.get("seek", 0) for segment in window_segments]
+                for segment in window_segments:
+                    segment["seek"] = seek
+                try:
+                    with torch.no_grad(), model_autocast(model):
+                        add_word_timestamps(
+                            segments=window_segments,
+                            model=model,
+                            tokenizer=tokenizer,
+                            mel=mel,
+                            num_frames=min(N_FRAMES, len(window) // HOP_LENGTH),
+                            prepend_punctuations=PREPEND_PUNCTUATIONS,
+                            append_punctuations=APPEND_PUNCTUATIONS,
+                            last_speech_timestamp=last_speech_timestamp,
+                        )
+                finally:
+                    for segment, original_seek in zip(window_segments, original_seeks):
+                        segment["seek"] = original_seek
+            # Окна независимы: метка последней речи берется из конца предыдущего окна по токенам
+            last_speech_timestamp = window_end
+    finally:
+        source.close()